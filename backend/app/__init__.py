@@ -1 +1,7 @@
 # Backend application package
+import os
+
+if os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes"):
+    # Time imports from here on; see app/startup_profile.py
+    from . import startup_profile
+    startup_profile.install()
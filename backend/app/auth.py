@@ -1,18 +1,28 @@
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from .database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import get_async_db
 from .models import User
+from .principal_cache import Principal, principal_cache
 from .schemas import TokenData
 from .config import get_settings
 
 settings = get_settings()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min == max == default, so a hash made with any other work factor needs updating
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
 
@@ -26,16 +36,29 @@ def get_password_hash(password: str) -> str:
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
+    now = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+        expire = now + timedelta(minutes=15)
+    to_encode.update({"exp": expire, "iat": now, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+def user_token_claims(user: User) -> dict:
+    """Claims identifying a user; "uid" lets requests skip the user lookup"""
+    claims = {"sub": user.username}
+    if settings.TOKEN_EMBED_USER_ID:
+        claims["uid"] = user.id
+    return claims
+
+
+async def get_current_principal(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> Principal:
+    """
+    Resolve the caller's id and username. Tokens carrying "uid" need no
+    database access; others are looked up once per TTL and cached.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -49,8 +72,31 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    
-    user = db.query(User).filter(User.username == token_data.username).first()
+
+    user_id = payload.get("uid")
+    if isinstance(user_id, int):
+        principal = principal_cache.from_claims(user_id, token_data.username, payload.get("iat"))
+        if principal is not None:
+            return principal
+
+    key = (token_data.username, payload.get("jti"))
+    principal = principal_cache.get(key)
+    if principal is None:
+        row = (await db.execute(select(User.id, User.username).where(User.username == token_data.username))).first()
+        if row is None or (isinstance(user_id, int) and row.id != user_id):
+            raise credentials_exception
+        principal = Principal(row.id, row.username)
+        principal_cache.put(key, principal)
+    return principal
+
+
+async def get_current_user(principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_async_db)) -> User:
+    """The full User row, for routes that need more than the caller's id"""
+    user = await db.get(User, principal.id)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
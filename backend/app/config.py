@@ -37,6 +37,14 @@ def _normalize_database_url(database_url: str) -> str:
         return database_url.replace("postgresql://", "postgresql+psycopg://", 1)
     return database_url
 
+
+def _async_database_url(database_url: str) -> str:
+    """Same database through an asyncio driver (psycopg 3 supports both modes)"""
+    database_url = _normalize_database_url(database_url)
+    if database_url.startswith("sqlite:"):
+        return database_url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    return database_url
+
 class Settings(BaseSettings):
     SECRET_KEY: str = "your_default_secret_key_change_this"
     ALGORITHM: str = "HS256"
@@ -46,8 +54,52 @@ class Settings(BaseSettings):
         "CORS_ORIGINS",
         ",".join(_default_cors_origins())
     )
+    # Connection pool (ignored for SQLite and when DB_EXTERNAL_POOLER is set)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Postgres statement_timeout in milliseconds; 0 disables it
+    DB_STATEMENT_TIMEOUT_MS: int = 30000
+    # Set when connecting through PgBouncer or another transaction pooler
+    DB_EXTERNAL_POOLER: bool = False
+    # SQLite performance mode: WAL, tuned pragmas, read pool and one writer
+    SQLITE_PERFORMANCE_MODE: bool = True
+    SQLITE_READ_POOL_SIZE: int = 8
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 20000
+    SQLITE_MMAP_SIZE_MB: int = 256
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
     HF_API_TOKEN: str = ""
     HF_MODEL: str = "mistralai/Mistral-7B-Instruct-v0.3"
+    # Overrides the HuggingFace endpoint, e.g. http://127.0.0.1:8001/generate for llm_stub.py
+    HF_API_URL: str = ""
+    LLM_TIMEOUT_SECONDS: float = 60.0
+    LLM_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    LLM_MAX_CONNECTIONS: int = 20
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    LLM_MAX_RETRIES: int = 2
+    LLM_BACKOFF_BASE_SECONDS: float = 1.0
+    LLM_BACKOFF_MAX_SECONDS: float = 30.0
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0
+    # Chatbot reply cache: similar questions over unchanged user data reuse a reply
+    CHAT_CACHE_ENABLED: bool = True
+    CHAT_CACHE_MAX_ENTRIES: int = 2000
+    CHAT_CACHE_TTL_SECONDS: float = 3600.0
+    CHAT_CACHE_SIMILARITY: float = 0.92
+    # bcrypt work factor; hashes made with another value are replaced on login
+    BCRYPT_ROUNDS: int = 12
+    # Dedicated password hashing threads (0 = one per CPU) and how many requests may wait for one
+    PASSWORD_HASH_WORKERS: int = 0
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    # Put the user id in access tokens so most requests skip the user lookup
+    TOKEN_EMBED_USER_ID: bool = True
+    # Principals resolved for tokens without a user id
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60.0
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
 
     class Config:
         env_file = ".env"
@@ -56,6 +108,14 @@ class Settings(BaseSettings):
     def normalized_database_url(self) -> str:
         return _normalize_database_url(self.DATABASE_URL)
 
+    @property
+    def async_database_url(self) -> str:
+        return _async_database_url(self.DATABASE_URL)
+
+    @property
+    def hf_api_url(self) -> str:
+        return self.HF_API_URL or f"https://api-inference.huggingface.co/models/{self.HF_MODEL}"
+
     @property
     def cors_origins_list(self) -> list[str]:
         return _parse_cors_origins(self.CORS_ORIGINS)
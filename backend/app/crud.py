@@ -1,9 +1,46 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
+from sqlalchemy import event, func, and_, or_
+from sqlalchemy.exc import IntegrityError
 from datetime import date, datetime, timedelta
-from typing import List, Optional
-from . import models, schemas
+from functools import wraps
+from inspect import signature
+from typing import Dict, Iterable, List, Optional
+from . import models, schemas, habit_calendar, rollups
+from .database import route_to_writer
 from .auth import get_password_hash, verify_password
+from .principal_cache import principal_cache
+from .response_cache import response_cache
+
+
+def _writes(func):
+    """
+    Run a write, including the reads it makes first, on the serialized writer
+    connection. When it changed a user's rows, drop that user's cached
+    chatbot replies.
+    """
+    params = signature(func)
+
+    @wraps(func)
+    def wrapper(db: Session, *args, **kwargs):
+        route_to_writer(db)
+        db.info.pop("wrote", None)
+        result = func(db, *args, **kwargs)
+        user_id = params.bind(db, *args, **kwargs).arguments.get("user_id")
+        if user_id is not None and db.info.pop("wrote", False):
+            response_cache.invalidate_user(user_id)
+        return result
+    return wrapper
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flushed(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
 
 
 # User CRUD operations
@@ -15,8 +52,10 @@ def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
     return db.query(models.User).filter(models.User.username == username).first()
 
 
-def create_user(db: Session, user: schemas.UserCreate) -> models.User:
-    hashed_password = get_password_hash(user.password)
+@_writes
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None) -> models.User:
+    """Create a user; async callers pass a hash computed off the event loop"""
+    hashed_password = hashed_password or get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         username=user.username,
@@ -28,6 +67,15 @@ def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     return db_user
 
 
+@_writes
+def update_password_hash(db: Session, user_id: int, hashed_password: str) -> None:
+    """Store a rehashed password, e.g. after BCRYPT_ROUNDS changed"""
+    db.query(models.User).filter(models.User.id == user_id).update({"hashed_password": hashed_password})
+    db.commit()
+    # A bulk update fires no after_update event
+    principal_cache.invalidate_user(user_id)
+
+
 def authenticate_user(db: Session, username: str, password: str) -> Optional[models.User]:
     user = get_user_by_username(db, username)
     if not user:
@@ -49,34 +97,50 @@ def get_habit(db: Session, habit_id: int, user_id: int) -> Optional[models.Habit
     ).first()
 
 
+@_writes
 def create_habit(db: Session, habit: schemas.HabitCreate, user_id: int) -> models.Habit:
     db_habit = models.Habit(**habit.model_dump(), user_id=user_id)
     db.add(db_habit)
+    db.flush()
+    # Start with empty derived state so reads never have to backfill it
+    rebuild_habit_streaks(db, [db_habit.id])
+    habit_calendar.rebuild_calendars(db, [db_habit.id])
+    rollups.refresh_active_habits(db, user_id)
     db.commit()
     db.refresh(db_habit)
     return db_habit
 
 
+@_writes
 def update_habit(db: Session, habit_id: int, user_id: int, habit_update: schemas.HabitUpdate) -> Optional[models.Habit]:
     db_habit = get_habit(db, habit_id, user_id)
     if not db_habit:
         return None
     
+    was_active = db_habit.is_active
     update_data = habit_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_habit, field, value)
     
+    if db_habit.is_active != was_active:
+        rollups.apply_habit_activation(db, user_id, habit_id, db_habit.is_active)
+        rollups.refresh_active_habits(db, user_id)
     db.commit()
     db.refresh(db_habit)
     return db_habit
 
 
+@_writes
 def delete_habit(db: Session, habit_id: int, user_id: int) -> bool:
     db_habit = get_habit(db, habit_id, user_id)
     if not db_habit:
         return False
     
+    if db_habit.is_active:
+        db_habit.is_active = False
+        rollups.apply_habit_activation(db, user_id, habit_id, False)
     db.delete(db_habit)
+    rollups.refresh_active_habits(db, user_id)
     db.commit()
     return True
 
@@ -97,6 +161,24 @@ def get_habit_logs(db: Session, habit_id: int, user_id: int, start_date: Optiona
     return query.order_by(models.HabitLog.date.desc()).all()
 
 
+def get_logs_for_habits(db: Session, habit_ids: Iterable[int], start_date: date, end_date: date) -> Dict[int, List[models.HabitLog]]:
+    """Logs for many habits in a date range, grouped by habit, in one query"""
+    habit_ids = list(habit_ids)
+    logs_by_habit: Dict[int, List[models.HabitLog]] = {habit_id: [] for habit_id in habit_ids}
+    if not habit_ids:
+        return logs_by_habit
+
+    logs = db.query(models.HabitLog).filter(
+        models.HabitLog.habit_id.in_(habit_ids),
+        models.HabitLog.date >= start_date,
+        models.HabitLog.date <= end_date
+    ).order_by(models.HabitLog.date.desc()).all()
+
+    for log in logs:
+        logs_by_habit[log.habit_id].append(log)
+    return logs_by_habit
+
+
 def get_habit_log_by_date(db: Session, habit_id: int, log_date: date) -> Optional[models.HabitLog]:
     return db.query(models.HabitLog).filter(
         models.HabitLog.habit_id == habit_id,
@@ -104,6 +186,7 @@ def get_habit_log_by_date(db: Session, habit_id: int, log_date: date) -> Optiona
     ).first()
 
 
+@_writes
 def toggle_habit_log(db: Session, habit_id: int, user_id: int, log_date: date, notes: Optional[str] = None) -> Optional[models.HabitLog]:
     habit = get_habit(db, habit_id, user_id)
     if not habit:
@@ -116,6 +199,10 @@ def toggle_habit_log(db: Session, habit_id: int, user_id: int, log_date: date, n
         setattr(existing_log, 'completed', not existing_log.completed)
         if notes is not None:
             setattr(existing_log, 'notes', notes)
+        _update_habit_streak(db, habit_id, log_date, existing_log.completed)
+        habit_calendar.set_day(db, habit_id, log_date, existing_log.completed)
+        if habit.is_active:
+            rollups.adjust_habits_completed(db, user_id, log_date, 1 if existing_log.completed else -1)
         db.commit()
         db.refresh(existing_log)
         return existing_log
@@ -127,11 +214,16 @@ def toggle_habit_log(db: Session, habit_id: int, user_id: int, log_date: date, n
             notes=notes
         )
         db.add(new_log)
+        _update_habit_streak(db, habit_id, log_date, True)
+        habit_calendar.set_day(db, habit_id, log_date, True)
+        if habit.is_active:
+            rollups.adjust_habits_completed(db, user_id, log_date, 1)
         db.commit()
         db.refresh(new_log)
         return new_log
 
 
+@_writes
 def delete_habit_log(db: Session, log_id: int, user_id: int) -> bool:
     log = db.query(models.HabitLog).join(models.Habit).filter(
         models.HabitLog.id == log_id,
@@ -141,74 +233,478 @@ def delete_habit_log(db: Session, log_id: int, user_id: int) -> bool:
     if not log:
         return False
     
+    habit_id, log_date, was_completed = log.habit_id, log.date, log.completed
+    habit_active = log.habit.is_active
     db.delete(log)
+    if was_completed:
+        _update_habit_streak(db, habit_id, log_date, False)
+        habit_calendar.set_day(db, habit_id, log_date, False)
+        if habit_active:
+            rollups.adjust_habits_completed(db, user_id, log_date, -1)
     db.commit()
     return True
 
 
+def _insert_for_dialect(db: Session):
+    """The dialect-specific INSERT construct that supports ON CONFLICT"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+@_writes
+def bulk_upsert_habit_logs(db: Session, user_id: int, items: List[schemas.HabitLogBulkItem]) -> List[dict]:
+    """
+    Set many (habit, date) logs in a single transaction.
+
+    Ownership is checked for all habits with one query and the current logs
+    are read with one query to classify each item; every change is then
+    written with one multi-row INSERT ... ON CONFLICT (habit_id, date)
+    DO UPDATE. Items referring to habits the user does not own are reported
+    as 'not_found' and skipped. Later items win over earlier ones for the
+    same habit and date.
+    """
+    requested_ids = {item.habit_id for item in items}
+    owned_ids = {habit_id for (habit_id,) in db.query(models.Habit.id).filter(
+        models.Habit.user_id == user_id,
+        models.Habit.id.in_(requested_ids)
+    ).all()}
+
+    dates = {item.date for item in items if item.habit_id in owned_ids}
+    current = {}
+    if owned_ids and dates:
+        for log_id, habit_id, log_date, completed, notes in db.query(
+            models.HabitLog.id, models.HabitLog.habit_id, models.HabitLog.date,
+            models.HabitLog.completed, models.HabitLog.notes
+        ).filter(
+            models.HabitLog.habit_id.in_(owned_ids),
+            models.HabitLog.date.in_(dates)
+        ).all():
+            current[(habit_id, log_date)] = {"id": log_id, "completed": completed, "notes": notes}
+
+    results = []
+    pending = {}
+    for index, item in enumerate(items):
+        result = {"index": index, "habit_id": item.habit_id, "date": item.date, "status": "not_found", "log_id": None}
+        results.append(result)
+        if item.habit_id not in owned_ids:
+            continue
+
+        key = (item.habit_id, item.date)
+        log = current.get(key)
+        if log is None:
+            result["status"] = "created"
+        elif log["completed"] != item.completed or (item.notes is not None and log["notes"] != item.notes):
+            result["status"] = "updated"
+        else:
+            result["status"] = "unchanged"
+            result["log_id"] = log["id"]
+            continue
+
+        notes = item.notes if item.notes is not None else (log or {}).get("notes")
+        current[key] = {"id": None, "completed": item.completed, "notes": notes}
+        pending[key] = {
+            "habit_id": item.habit_id,
+            "date": item.date,
+            "completed": item.completed,
+            "notes": notes,
+            "created_at": datetime.utcnow(),
+        }
+
+    if pending:
+        insert = _insert_for_dialect(db)
+        stmt = insert(models.HabitLog).values(list(pending.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["habit_id", "date"],
+            set_={"completed": stmt.excluded.completed, "notes": stmt.excluded.notes}
+        ).returning(models.HabitLog.id, models.HabitLog.habit_id, models.HabitLog.date)
+        log_ids = {(habit_id, log_date): log_id for log_id, habit_id, log_date in db.execute(stmt)}
+
+        touched_ids = {habit_id for habit_id, _ in pending}
+        touched_dates = [log_date for _, log_date in pending]
+        rebuild_habit_streaks(db, touched_ids)
+        habit_calendar.rebuild_calendars(db, touched_ids)
+        rollups.rebuild_range(db, user_id, min(touched_dates), max(touched_dates))
+        db.commit()
+
+        for result in results:
+            if result["log_id"] is None and result["status"] != "not_found":
+                result["log_id"] = log_ids.get((result["habit_id"], result["date"]))
+
+    return results
+
+
 # Progress calculation functions
 def calculate_streak(db: Session, habit_id: int) -> tuple[int, int]:
     """Calculate current streak and longest streak for a habit"""
-    logs = db.query(models.HabitLog).filter(
-        models.HabitLog.habit_id == habit_id,
-        models.HabitLog.completed == True
-    ).order_by(models.HabitLog.date.desc()).all()
-    
-    if not logs:
-        return 0, 0
-    
-    current_streak = 0
-    longest_streak = 0
-    temp_streak = 0
-    
-    today = date.today()
-    expected_date = today
-    
-    for log in logs:
-        log_date = log.date if isinstance(log.date, date) else log.date
-        if log_date == expected_date:
-            current_streak += 1
-            temp_streak += 1
-            expected_date -= timedelta(days=1)
-        elif log_date < expected_date:
-            if current_streak > 0:
-                break
-            temp_streak = 1
-            expected_date = log_date - timedelta(days=1)
-        
-        longest_streak = max(longest_streak, temp_streak)
-    
-    first_log_date = logs[0].date if isinstance(logs[0].date, date) else logs[0].date
-    if first_log_date < today - timedelta(days=1):
-        current_streak = 0
-    
-    return current_streak, longest_streak
+    stats = get_habit_stats(db, [habit_id])[habit_id]
+    return stats["current_streak"], stats["longest_streak"]
 
 
 def calculate_completion_rate(db: Session, habit_id: int, days: int = 30) -> float:
     """Calculate completion rate for the last N days"""
-    start_date = date.today() - timedelta(days=days)
-    
-    completed_logs = db.query(func.count(models.HabitLog.id)).filter(
-        models.HabitLog.habit_id == habit_id,
-        models.HabitLog.date >= start_date,
-        models.HabitLog.completed == True
-    ).scalar()
-    
-    if days == 0:
-        return 0.0
-    
-    return round((completed_logs / days) * 100, 1)
+    return get_habit_stats(db, [habit_id], days=days)[habit_id]["completion_rate"]
 
 
 def get_total_completions(db: Session, habit_id: int) -> int:
     """Get total number of completions for a habit"""
-    return db.query(func.count(models.HabitLog.id)).filter(
-        models.HabitLog.habit_id == habit_id,
+    return get_habit_stats(db, [habit_id])[habit_id]["total_completions"]
+
+
+def empty_habit_stats() -> Dict[str, float]:
+    """Statistics for a habit that has no completions yet"""
+    return {
+        "current_streak": 0,
+        "longest_streak": 0,
+        "completion_rate": 0.0,
+        "total_completions": 0,
+    }
+
+
+def _summarize_runs(dates: List[date]) -> tuple[Optional[date], Optional[date], int, int]:
+    """
+    Walk ascending completion dates once and return
+    (latest run start, latest run end, longest run, total completions).
+    """
+    run_start = None
+    prev_date = None
+    longest_streak = 0
+    total_completions = 0
+
+    for log_date in dates:
+        total_completions += 1
+        if prev_date is not None and log_date == prev_date:
+            continue
+        if prev_date is None or (log_date - prev_date).days != 1:
+            run_start = log_date
+        longest_streak = max(longest_streak, (log_date - run_start).days + 1)
+        prev_date = log_date
+
+    return run_start, prev_date, longest_streak, total_completions
+
+
+def _current_streak(state: models.HabitStreak, today: date) -> int:
+    """The latest run counts as current while it ends today or yesterday"""
+    if state.last_completed_date is None or state.current_run_start is None:
+        return 0
+    if state.last_completed_date < today - timedelta(days=1):
+        return 0
+    return (state.last_completed_date - state.current_run_start).days + 1
+
+
+def rebuild_habit_streaks(db: Session, habit_ids: Iterable[int]) -> Dict[int, models.HabitStreak]:
+    """
+    Recompute streak state from habit_logs with one ordered scan.
+    Does not commit; callers decide the transaction boundary.
+    """
+    habit_ids = list(habit_ids)
+    if not habit_ids:
+        return {}
+
+    rows = db.query(models.HabitLog.habit_id, models.HabitLog.date).filter(
+        models.HabitLog.habit_id.in_(habit_ids),
         models.HabitLog.completed == True
+    ).order_by(models.HabitLog.habit_id, models.HabitLog.date).all()
+
+    dates_by_habit: Dict[int, List[date]] = {habit_id: [] for habit_id in habit_ids}
+    for habit_id, log_date in rows:
+        dates_by_habit[habit_id].append(log_date)
+
+    existing = {
+        state.habit_id: state
+        for state in db.query(models.HabitStreak).filter(models.HabitStreak.habit_id.in_(habit_ids)).all()
+    }
+
+    states = {}
+    for habit_id, dates in dates_by_habit.items():
+        state = existing.get(habit_id)
+        if state is None:
+            state = models.HabitStreak(habit_id=habit_id)
+            db.add(state)
+        run_start, last_date, longest_streak, total_completions = _summarize_runs(dates)
+        state.current_run_start = run_start
+        state.last_completed_date = last_date
+        state.longest_streak = longest_streak
+        state.total_completions = total_completions
+        states[habit_id] = state
+
+    return states
+
+
+@_writes
+def repair_habit_streaks(db: Session, habit_ids: Optional[Iterable[int]] = None) -> int:
+    """Rebuild streak state for the given habits (all habits by default) and commit"""
+    if habit_ids is None:
+        habit_ids = [habit_id for (habit_id,) in db.query(models.Habit.id).all()]
+    states = rebuild_habit_streaks(db, habit_ids)
+    db.commit()
+    return len(states)
+
+
+def _get_habit_streak(db: Session, habit_id: int) -> Optional[models.HabitStreak]:
+    return db.query(models.HabitStreak).filter(models.HabitStreak.habit_id == habit_id).first()
+
+
+def _update_habit_streak(db: Session, habit_id: int, log_date: date, completed: bool) -> None:
+    """
+    Apply one completion being added or removed to the streak state.
+    Appending to (or undoing the tip of) the latest run is O(1); any other
+    edit falls back to rebuilding this habit from its logs.
+    """
+    state = _get_habit_streak(db, habit_id)
+
+    if state is not None and completed:
+        last_date = state.last_completed_date
+        if last_date is None or log_date > last_date:
+            if last_date is None or (log_date - last_date).days > 1:
+                state.current_run_start = log_date
+            state.last_completed_date = log_date
+            state.total_completions += 1
+            run_length = (log_date - state.current_run_start).days + 1
+            state.longest_streak = max(state.longest_streak, run_length)
+            return
+
+    if state is not None and not completed:
+        last_date = state.last_completed_date
+        run_start = state.current_run_start
+        if last_date is not None and log_date == last_date and run_start < log_date:
+            run_length = (last_date - run_start).days + 1
+            if run_length < state.longest_streak:
+                state.last_completed_date = log_date - timedelta(days=1)
+                state.total_completions -= 1
+                return
+
+    db.flush()
+    rebuild_habit_streaks(db, [habit_id])
+
+
+def get_habit_stats(db: Session, habit_ids: Iterable[int], days: int = 30) -> Dict[int, Dict[str, float]]:
+    """
+    Compute streaks, completion rate and total completions for many habits at once.
+
+    Streaks and totals come from the materialized habit_streaks rows and
+    the completion rate from the habit calendars, so the cost does not
+    depend on how many logs exist. Missing rows are backfilled from logs.
+    """
+    habit_ids = list(habit_ids)
+    stats = {habit_id: empty_habit_stats() for habit_id in habit_ids}
+    if not habit_ids:
+        return stats
+
+    today = date.today()
+
+    states = {
+        state.habit_id: state
+        for state in db.query(models.HabitStreak).filter(models.HabitStreak.habit_id.in_(habit_ids)).all()
+    }
+    missing = [habit_id for habit_id in habit_ids if habit_id not in states]
+    if missing:
+        try:
+            states.update(rebuild_habit_streaks(db, missing))
+            db.commit()
+        except IntegrityError:
+            # Another request backfilled the same habits first
+            db.rollback()
+            states.update({
+                state.habit_id: state
+                for state in db.query(models.HabitStreak).filter(models.HabitStreak.habit_id.in_(missing)).all()
+            })
+
+    for habit_id, state in states.items():
+        stats[habit_id]["current_streak"] = _current_streak(state, today)
+        stats[habit_id]["longest_streak"] = state.longest_streak
+        stats[habit_id]["total_completions"] = state.total_completions
+
+    if days > 0:
+        matrix = habit_calendar.load_matrix(db, habit_ids, today - timedelta(days=days), today)
+        recent = matrix.sum(axis=1)
+        for habit_id, recent_completions in zip(habit_ids, recent):
+            stats[habit_id]["completion_rate"] = round((int(recent_completions) / days) * 100, 1)
+
+    return stats
+
+
+def count_active_habits(db: Session, user_id: int) -> int:
+    """Number of active habits a user is currently tracking"""
+    return db.query(func.count(models.Habit.id)).filter(
+        models.Habit.user_id == user_id,
+        models.Habit.is_active == True
     ).scalar() or 0
 
 
+def get_daily_completion_counts(db: Session, user_id: int, start_date: date, end_date: date) -> Dict[date, int]:
+    """Completed active habits per day in [start_date, end_date], read from the daily rollups"""
+    return {
+        day: rollup.habits_completed
+        for day, rollup in rollups.get_rollups(db, user_id, start_date, end_date).items()
+        if rollup.habits_completed
+    }
+
+
+# Check-in operations
+@_writes
+def record_checkin(db: Session, user_id: int, check_in_date: date) -> models.DailyCheckIn:
+    """Record a check-in for the day if there is none yet"""
+    checkin = db.query(models.DailyCheckIn).filter(
+        models.DailyCheckIn.user_id == user_id,
+        models.DailyCheckIn.check_in_date == check_in_date
+    ).first()
+    if checkin:
+        return checkin
+
+    checkin = models.DailyCheckIn(user_id=user_id, check_in_date=check_in_date)
+    db.add(checkin)
+    try:
+        rollups.set_checked_in(db, user_id, check_in_date)
+        _update_checkin_stats(db, user_id, check_in_date)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        route_to_writer(db)
+        existing = db.query(models.DailyCheckIn).filter(
+            models.DailyCheckIn.user_id == user_id,
+            models.DailyCheckIn.check_in_date == check_in_date
+        ).first()
+        if existing is None:
+            raise
+        # A concurrent request recorded the same day first
+        return existing
+    db.refresh(checkin)
+    return checkin
+
+
+def empty_checkin_stats() -> Dict[str, int]:
+    """Statistics for a user who has never checked in"""
+    return {
+        "total_checkins": 0,
+        "current_streak": 0,
+        "longest_streak": 0,
+        "this_month_checkins": 0,
+    }
+
+
+def rebuild_checkin_stats(db: Session, user_ids: Iterable[int]) -> Dict[int, models.CheckinStreak]:
+    """
+    Recompute check-in run state and monthly counts from daily_checkins with
+    one ordered scan. Does not commit; callers decide the transaction boundary.
+    """
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+
+    rows = db.query(models.DailyCheckIn.user_id, models.DailyCheckIn.check_in_date).filter(
+        models.DailyCheckIn.user_id.in_(user_ids)
+    ).distinct().order_by(models.DailyCheckIn.user_id, models.DailyCheckIn.check_in_date).all()
+
+    dates_by_user: Dict[int, List[date]] = {user_id: [] for user_id in user_ids}
+    for user_id, check_in_date in rows:
+        dates_by_user[user_id].append(check_in_date)
+
+    existing = {
+        state.user_id: state
+        for state in db.query(models.CheckinStreak).filter(models.CheckinStreak.user_id.in_(user_ids)).all()
+    }
+    db.query(models.CheckinMonth).filter(models.CheckinMonth.user_id.in_(user_ids)).delete(synchronize_session=False)
+
+    states = {}
+    for user_id, dates in dates_by_user.items():
+        state = existing.get(user_id)
+        if state is None:
+            state = models.CheckinStreak(user_id=user_id)
+            db.add(state)
+        run_start, last_date, longest_streak, total_checkins = _summarize_runs(dates)
+        state.current_run_start = run_start
+        state.last_checkin_date = last_date
+        state.longest_streak = longest_streak
+        state.total_checkins = total_checkins
+        states[user_id] = state
+
+        months: Dict[tuple, int] = {}
+        for check_in_date in dates:
+            key = (check_in_date.year, check_in_date.month)
+            months[key] = months.get(key, 0) + 1
+        db.add_all(
+            models.CheckinMonth(user_id=user_id, year=year, month=month, checkins=count)
+            for (year, month), count in months.items()
+        )
+
+    return states
+
+
+@_writes
+def repair_checkin_stats(db: Session, user_ids: Optional[Iterable[int]] = None) -> int:
+    """Rebuild check-in stats for the given users (all users by default) and commit"""
+    if user_ids is None:
+        user_ids = [user_id for (user_id,) in db.query(models.User.id).all()]
+    states = rebuild_checkin_stats(db, user_ids)
+    db.commit()
+    return len(states)
+
+
+def _update_checkin_stats(db: Session, user_id: int, check_in_date: date) -> None:
+    """
+    Apply one new check-in day to the run state and its month's count.
+    Days after the latest check-in are O(1); an earlier day falls back to
+    rebuilding this user from daily_checkins. The state row is locked so
+    concurrent check-ins for the same user apply one after the other.
+    """
+    state = db.query(models.CheckinStreak).filter(
+        models.CheckinStreak.user_id == user_id
+    ).with_for_update().first()
+    if state is None or (state.last_checkin_date is not None and check_in_date <= state.last_checkin_date):
+        db.flush()
+        rebuild_checkin_stats(db, [user_id])
+        return
+
+    last_date = state.last_checkin_date
+    if last_date is None or (check_in_date - last_date).days > 1:
+        state.current_run_start = check_in_date
+    state.last_checkin_date = check_in_date
+    state.total_checkins += 1
+    run_length = (check_in_date - state.current_run_start).days + 1
+    state.longest_streak = max(state.longest_streak, run_length)
+
+    month = db.get(models.CheckinMonth, (user_id, check_in_date.year, check_in_date.month))
+    if month is None:
+        db.add(models.CheckinMonth(user_id=user_id, year=check_in_date.year, month=check_in_date.month, checkins=1))
+    else:
+        month.checkins += 1
+
+
+def get_checkin_stats(db: Session, user_id: int) -> Dict[str, int]:
+    """
+    Total, current and longest check-in streak and this month's check-ins,
+    read from the materialized checkin_streaks and checkin_months rows.
+    The current streak counts back from today, so it is 0 until today's
+    check-in. A missing row is backfilled from daily_checkins.
+    """
+    state = db.query(models.CheckinStreak).filter(models.CheckinStreak.user_id == user_id).first()
+    if state is None:
+        route_to_writer(db)
+        try:
+            state = rebuild_checkin_stats(db, [user_id])[user_id]
+            db.commit()
+        except IntegrityError:
+            # Another request backfilled this user first
+            db.rollback()
+            state = db.query(models.CheckinStreak).filter(models.CheckinStreak.user_id == user_id).first()
+
+    stats = empty_checkin_stats()
+    if state is None or not state.total_checkins:
+        return stats
+
+    today = date.today()
+    month = db.get(models.CheckinMonth, (user_id, today.year, today.month))
+    stats["total_checkins"] = state.total_checkins
+    stats["longest_streak"] = state.longest_streak
+    stats["this_month_checkins"] = month.checkins if month else 0
+    if state.last_checkin_date == today:
+        stats["current_streak"] = (today - state.current_run_start).days + 1
+    return stats
+
+
 # Expense CRUD operations
 def get_monthly_budget(db: Session, user_id: int, month: int, year: int) -> Optional[models.MonthlyBudget]:
     return db.query(models.MonthlyBudget).filter(
@@ -218,6 +714,7 @@ def get_monthly_budget(db: Session, user_id: int, month: int, year: int) -> Opti
     ).first()
 
 
+@_writes
 def upsert_monthly_budget(db: Session, user_id: int, month: int, year: int, amount: float) -> models.MonthlyBudget:
     budget = get_monthly_budget(db, user_id, month, year)
     if budget:
@@ -230,6 +727,13 @@ def upsert_monthly_budget(db: Session, user_id: int, month: int, year: int, amou
     return budget
 
 
+def get_expense(db: Session, expense_id: int, user_id: int) -> Optional[models.Expense]:
+    return db.query(models.Expense).filter(
+        models.Expense.id == expense_id,
+        models.Expense.user_id == user_id
+    ).first()
+
+
 def get_expenses_for_month(db: Session, user_id: int, month: int, year: int) -> List[models.Expense]:
     start_date = date(year, month, 1)
     if month == 12:
@@ -251,12 +755,15 @@ def get_expense_by_date(db: Session, user_id: int, expense_date: date) -> Option
     ).first()
 
 
+@_writes
 def upsert_expense_for_date(db: Session, user_id: int, expense_date: date, amount: float, note: Optional[str] = None) -> models.Expense:
     expense = get_expense_by_date(db, user_id, expense_date)
     if expense:
+        previous_amount = expense.amount
         expense.amount = amount
         expense.note = note
     else:
+        previous_amount = 0.0
         expense = models.Expense(
             user_id=user_id,
             date=expense_date,
@@ -265,11 +772,13 @@ def upsert_expense_for_date(db: Session, user_id: int, expense_date: date, amoun
         )
         db.add(expense)
 
+    rollups.adjust_amount_spent(db, user_id, expense_date, amount - previous_amount)
     db.commit()
     db.refresh(expense)
     return expense
 
 
+@_writes
 def create_expense(db: Session, user_id: int, expense_date: date, amount: float, note: Optional[str] = None) -> models.Expense:
     """Create a new expense entry (allows multiple per day)"""
     expense = models.Expense(
@@ -279,11 +788,13 @@ def create_expense(db: Session, user_id: int, expense_date: date, amount: float,
         note=note
     )
     db.add(expense)
+    rollups.adjust_amount_spent(db, user_id, expense_date, amount)
     db.commit()
     db.refresh(expense)
     return expense
 
 
+@_writes
 def update_expense(db: Session, expense_id: int, user_id: int, amount: float, note: Optional[str] = None) -> Optional[models.Expense]:
     """Update an existing expense"""
     expense = db.query(models.Expense).filter(
@@ -292,14 +803,17 @@ def update_expense(db: Session, expense_id: int, user_id: int, amount: float, no
     ).first()
     
     if expense:
+        delta = amount - expense.amount
         expense.amount = amount
         expense.note = note
+        rollups.adjust_amount_spent(db, user_id, expense.date, delta)
         db.commit()
         db.refresh(expense)
     
     return expense
 
 
+@_writes
 def delete_expense(db: Session, expense_id: int, user_id: int) -> bool:
     """Delete an expense"""
     expense = db.query(models.Expense).filter(
@@ -309,6 +823,7 @@ def delete_expense(db: Session, expense_id: int, user_id: int) -> bool:
     
     if expense:
         db.delete(expense)
+        rollups.adjust_amount_spent(db, user_id, expense.date, -expense.amount)
         db.commit()
         return True
     
@@ -322,6 +837,7 @@ def get_daily_budget(db: Session, user_id: int, budget_date: date) -> Optional[m
     ).first()
 
 
+@_writes
 def upsert_daily_budget(db: Session, user_id: int, budget_date: date, amount: float) -> models.DailyBudget:
     daily_budget = get_daily_budget(db, user_id, budget_date)
     if daily_budget:
@@ -334,6 +850,7 @@ def upsert_daily_budget(db: Session, user_id: int, budget_date: date, amount: fl
         )
         db.add(daily_budget)
     
+    rollups.set_daily_budget(db, user_id, budget_date, amount)
     db.commit()
     db.refresh(daily_budget)
     return daily_budget
@@ -1,20 +1,293 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import AsyncIterator, Callable, Dict, Tuple, TypeVar
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+from starlette.concurrency import run_in_threadpool
 from .config import get_settings
 
 settings = get_settings()
 
-database_connect_args = {}
-if settings.normalized_database_url.startswith("sqlite"):
-    database_connect_args["check_same_thread"] = False
 
-engine = create_engine(
-    settings.normalized_database_url,
-    connect_args=database_connect_args
+class PoolMetrics:
+    """Thread-safe counters for connection checkouts and time spent waiting for one"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.timeouts = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_ms_total": round(self.wait_seconds_total * 1000, 2),
+                "wait_ms_avg": round(self.wait_seconds_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 2),
+            }
+
+
+# Pools reported by /health/db, keyed by a short name
+_monitored_pools: Dict[str, Tuple[Engine, PoolMetrics]] = {}
+
+
+def _instrumented_pool(base: type, metrics: PoolMetrics) -> type:
+    """Subclass of a QueuePool class that records how long each checkout waited"""
+
+    class InstrumentedPool(base):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except Exception:
+                metrics.record_wait(time.perf_counter() - started, timed_out=True)
+                raise
+            metrics.record_wait(time.perf_counter() - started)
+            return connection
+
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+
+def _sqlite_performance_mode(database_url: str) -> bool:
+    """WAL and a separate read pool only make sense for file-backed SQLite"""
+    if not database_url.startswith("sqlite") or not settings.SQLITE_PERFORMANCE_MODE:
+        return False
+    url = make_url(database_url)
+    return bool(url.database) and url.database != ":memory:" and url.query.get("mode") != "memory"
+
+
+def _engine_options(database_url: str, queue_pool: type) -> dict:
+    """create_engine keyword arguments for the configured database and pooling mode"""
+    if _sqlite_performance_mode(database_url):
+        # A single connection serializes every write transaction in this process
+        return {
+            "poolclass": queue_pool,
+            "pool_size": 1,
+            "max_overflow": 0,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "connect_args": {"check_same_thread": False},
+        }
+    if database_url.startswith("sqlite"):
+        return {"connect_args": {"check_same_thread": False}}
+
+    connect_args = {}
+    if settings.DB_EXTERNAL_POOLER:
+        # The external pooler owns the connections; transaction pooling cannot
+        # keep server-side prepared statements across transactions
+        connect_args["prepare_threshold"] = None
+        return {"poolclass": NullPool, "connect_args": connect_args}
+
+    if settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+    return {
+        "poolclass": queue_pool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+def _instrument(target_engine: Engine, metrics: PoolMetrics) -> None:
+    @event.listens_for(target_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.increment("connects")
+
+    @event.listens_for(target_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.increment("checkouts")
+
+    @event.listens_for(target_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        metrics.increment("checkins")
+
+    @event.listens_for(target_engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.increment("invalidations")
+
+
+def _apply_sqlite_pragmas(dbapi_connection, writer: bool) -> None:
+    cursor = dbapi_connection.cursor()
+    if writer:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    if not writer:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def _build_engines(database_url: str, name: str, is_async: bool = False):
+    """
+    Create the writer engine and, in SQLite performance mode, a separate
+    read-only engine. Writes (and migrations) go through the writer; WAL lets
+    reads run while the single writer holds its transaction. Without
+    performance mode both names refer to the same engine.
+    """
+    create = create_async_engine if is_async else create_engine
+    queue_pool = AsyncAdaptedQueuePool if is_async else QueuePool
+
+    metrics = PoolMetrics()
+    writer = create(database_url, **_engine_options(database_url, _instrumented_pool(queue_pool, metrics)))
+    writer_sync = writer.sync_engine if is_async else writer
+    _instrument(writer_sync, metrics)
+    _monitored_pools[name] = (writer_sync, metrics)
+    reader = writer
+
+    if _sqlite_performance_mode(database_url):
+        read_metrics = PoolMetrics()
+        reader = create(
+            database_url,
+            poolclass=_instrumented_pool(queue_pool, read_metrics),
+            pool_size=settings.SQLITE_READ_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            connect_args={"check_same_thread": False}
+        )
+        reader_sync = reader.sync_engine if is_async else reader
+        _instrument(reader_sync, read_metrics)
+        _monitored_pools[f"{name}_read"] = (reader_sync, read_metrics)
+
+        @event.listens_for(writer_sync, "connect")
+        def _on_writer_connect(dbapi_connection, connection_record):
+            _apply_sqlite_pragmas(dbapi_connection, writer=True)
+            # Take the write lock at BEGIN so a transaction never has to upgrade
+            # from a read snapshot another process has since written past
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(writer_sync, "begin")
+        def _on_writer_begin(conn):
+            # AUTOCOMMIT connections (index builds) must not open a transaction nothing commits
+            if conn.get_execution_options().get("isolation_level") != "AUTOCOMMIT":
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+        @event.listens_for(reader_sync, "connect")
+        def _on_reader_connect(dbapi_connection, connection_record):
+            _apply_sqlite_pragmas(dbapi_connection, writer=False)
+
+    if settings.DB_EXTERNAL_POOLER and settings.DB_STATEMENT_TIMEOUT_MS > 0 and not database_url.startswith("sqlite"):
+        @event.listens_for(writer_sync, "begin")
+        def _set_statement_timeout(conn):
+            # Session-level SET would leak to other clients of a transaction pooler
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {settings.DB_STATEMENT_TIMEOUT_MS}")
+
+    return writer, reader
+
+
+# Sync engines serve migrations and maintenance commands; request handlers
+# use the async engines below
+engine, read_engine = _build_engines(settings.normalized_database_url, "sync")
+async_engine, async_read_engine = _build_engines(settings.async_database_url, "async", is_async=True)
+
+
+def _pool_status(target_engine: Engine, metrics: PoolMetrics) -> dict:
+    pool = target_engine.pool
+    status = {"pool_class": type(pool).__name__, **metrics.snapshot()}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": pool.overflow(),
+        })
+    return status
+
+
+def get_pool_status() -> dict:
+    """Pool configuration, current occupancy and cumulative checkout/wait metrics per pool"""
+    return {name: _pool_status(target_engine, metrics) for name, (target_engine, metrics) in _monitored_pools.items()}
+
+
+class RoutingSession(Session):
+    """
+    Sends reads to the read pool and writes to the single writer connection.
+    Once a transaction has written, every later statement in it uses the
+    writer too, so crud code always reads its own flushed changes.
+    """
+
+    _writing = False
+    writer_engine: Engine = engine
+    reader_engine: Engine = read_engine
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._writing or self._flushing or isinstance(clause, UpdateBase):
+            self._writing = True
+            return self.writer_engine
+        return self.reader_engine
+
+
+class AsyncRoutingSession(RoutingSession):
+    """RoutingSession for the sync side of an AsyncSession"""
+
+    writer_engine = async_engine.sync_engine
+    reader_engine = async_read_engine.sync_engine
+
+
+def route_to_writer(db) -> None:
+    """Run the rest of the session's transaction, reads included, on the writer"""
+    if isinstance(db, AsyncSession):
+        db = db.sync_session
+    if isinstance(db, RoutingSession):
+        db._writing = True
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _reset_routing(session, transaction):
+    if transaction.parent is None:
+        session._writing = False
+
+
+SessionLocal = sessionmaker(
+    class_=RoutingSession if read_engine is not engine else Session,
+    autocommit=False,
+    autoflush=False,
+    bind=engine
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay loaded after commit: lazy refreshes cannot run outside run_sync
+AsyncSessionLocal = async_sessionmaker(
+    sync_session_class=AsyncRoutingSession if async_read_engine is not async_engine else Session,
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine
+)
 
 Base = declarative_base()
 
@@ -25,3 +298,33 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    Async request session. crud functions are shared with the sync stack and
+    run through `await db.run_sync(crud.fn, ...)`. Only the driver I/O is
+    awaited; the ORM and any Python in between run on the event loop thread,
+    so CPU-heavy reads go through run_in_worker instead.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+T = TypeVar("T")
+
+
+async def run_in_worker(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run `func(db, *args, **kwargs)` with its own sync session on a worker
+    thread. For reads that unpack NumPy calendars or may backfill and commit
+    derived rows (habit_calendar.load_calendars, rollups reads), which would
+    otherwise hold the event loop. Return plain values, not ORM objects.
+    """
+    def call() -> T:
+        db = SessionLocal()
+        try:
+            return func(db, *args, **kwargs)
+        finally:
+            db.close()
+    return await run_in_threadpool(call)
@@ -0,0 +1,117 @@
+"""
+Micro-batching for query embeddings.
+
+Concurrent chat requests each need one query embedded. Encoding them one at
+a time pays the model's per-call overhead for every request and has them
+contend for the CPU. EmbeddingBatcher instead queues texts, and a single
+worker thread collects whatever arrives within a short window (up to a
+maximum batch size) into one encode() call, then resolves each caller's
+future with its own vector. While a batch is encoding, new requests queue
+up and form the next batch.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+
+class EmbeddingBatcher:
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], window_ms: float, max_batch: int):
+        self._encode = encode
+        self.window_seconds = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue: "Queue[Tuple[str, Future, float]]" = Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self.reset_metrics()
+
+    def reset_metrics(self) -> None:
+        with self._metrics_lock:
+            self.batches = 0
+            self.texts = 0
+            self.max_batch_seen = 0
+            self.encode_seconds = 0.0
+            self.wait_seconds = 0.0
+            self.errors = 0
+            self._started_at = time.monotonic()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text; the future resolves to its vector, or None when the model is unavailable"""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future, time.monotonic()))
+        return future
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """Blocking submit() for code already running off the event loop"""
+        return self.submit(text).result()
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window_seconds
+            while len(batch) < self.max_batch:
+                try:
+                    remaining = deadline - time.monotonic()
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch: List[Tuple[str, Future, float]]) -> None:
+        pending = [(text, future, queued_at) for text, future, queued_at in batch if future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+        texts = list(dict.fromkeys(text for text, _, _ in pending))
+
+        started = time.monotonic()
+        try:
+            vectors = self._encode(texts)
+        except Exception as e:
+            with self._metrics_lock:
+                self.errors += 1
+            for _, future, _ in pending:
+                future.set_exception(e)
+            return
+        finished = time.monotonic()
+
+        rows = {text: row for row, text in enumerate(texts)}
+        for text, future, _ in pending:
+            future.set_result(vectors[rows[text]] if vectors.size else None)
+
+        with self._metrics_lock:
+            self.batches += 1
+            self.texts += len(pending)
+            self.max_batch_seen = max(self.max_batch_seen, len(pending))
+            self.encode_seconds += finished - started
+            self.wait_seconds += sum(started - queued_at for _, _, queued_at in pending)
+
+    def status(self) -> dict:
+        with self._metrics_lock:
+            elapsed = time.monotonic() - self._started_at
+            return {
+                "window_ms": self.window_seconds * 1000,
+                "max_batch": self.max_batch,
+                "queued": self._queue.qsize(),
+                "batches": self.batches,
+                "texts": self.texts,
+                "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+                "max_batch_size": self.max_batch_seen,
+                "avg_encode_ms": round(self.encode_seconds * 1000 / self.batches, 2) if self.batches else 0.0,
+                "avg_wait_ms": round(self.wait_seconds * 1000 / self.texts, 2) if self.texts else 0.0,
+                "errors": self.errors,
+                "texts_per_second": round(self.texts / elapsed, 2) if elapsed > 0 else 0.0,
+            }
@@ -0,0 +1,215 @@
+"""
+Bitmap-backed habit completion calendars.
+
+Every habit keeps one row in habit_calendars whose `bits` column holds one
+bit per day since `start_date`. Analytics unpack those bitmaps into a
+(habits x days) NumPy matrix, so streaks, rolling rates, weekday patterns
+and month grids are computed for all habits at once without reading
+habit_logs row by row.
+"""
+
+from datetime import date, timedelta
+from typing import Dict, Iterable, List
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+# ─── Encoding ───────────────────────────────────────────────────
+
+def _to_int(bits: bytes) -> int:
+    return int.from_bytes(bits, "little")
+
+
+def _to_bytes(value: int) -> bytes:
+    return value.to_bytes((value.bit_length() + 7) // 8, "little")
+
+
+def encode_days(start_date: date, days: Iterable[date]) -> bytes:
+    """Pack completion dates into a bitmap anchored at start_date"""
+    value = 0
+    for day in days:
+        value |= 1 << (day - start_date).days
+    return _to_bytes(value)
+
+
+def decode_days(calendar: models.HabitCalendar) -> List[date]:
+    """Expand a calendar back into its completion dates"""
+    bits = np.unpackbits(np.frombuffer(calendar.bits, dtype=np.uint8), bitorder="little")
+    return [calendar.start_date + timedelta(days=int(i)) for i in np.flatnonzero(bits)]
+
+
+# ─── Persistence ────────────────────────────────────────────────
+
+def rebuild_calendars(db: Session, habit_ids: Iterable[int]) -> Dict[int, models.HabitCalendar]:
+    """
+    Recompute calendars from habit_logs with one ordered scan.
+    Does not commit; callers decide the transaction boundary.
+    """
+    habit_ids = list(habit_ids)
+    if not habit_ids:
+        return {}
+
+    created = dict(db.query(models.Habit.id, models.Habit.created_at).filter(
+        models.Habit.id.in_(habit_ids)
+    ).all())
+
+    rows = db.query(models.HabitLog.habit_id, models.HabitLog.date).filter(
+        models.HabitLog.habit_id.in_(habit_ids),
+        models.HabitLog.completed == True
+    ).order_by(models.HabitLog.habit_id, models.HabitLog.date).all()
+
+    dates_by_habit: Dict[int, List[date]] = {habit_id: [] for habit_id in created}
+    for habit_id, log_date in rows:
+        dates_by_habit[habit_id].append(log_date)
+
+    existing = {
+        calendar.habit_id: calendar
+        for calendar in db.query(models.HabitCalendar).filter(models.HabitCalendar.habit_id.in_(habit_ids)).all()
+    }
+
+    calendars = {}
+    for habit_id, dates in dates_by_habit.items():
+        start_date = created[habit_id].date() if created[habit_id] else date.today()
+        if dates:
+            start_date = min(start_date, dates[0])
+
+        calendar = existing.get(habit_id)
+        if calendar is None:
+            calendar = models.HabitCalendar(habit_id=habit_id)
+            db.add(calendar)
+        calendar.start_date = start_date
+        calendar.bits = encode_days(start_date, dates)
+        calendars[habit_id] = calendar
+
+    return calendars
+
+
+def set_day(db: Session, habit_id: int, day: date, completed: bool) -> None:
+    """Flip one day in a habit's calendar, extending it backwards if needed"""
+    calendar = db.query(models.HabitCalendar).filter(models.HabitCalendar.habit_id == habit_id).first()
+    if calendar is None:
+        db.flush()
+        rebuild_calendars(db, [habit_id])
+        return
+
+    value = _to_int(calendar.bits)
+    if day < calendar.start_date:
+        value <<= (calendar.start_date - day).days
+        calendar.start_date = day
+
+    offset = (day - calendar.start_date).days
+    if completed:
+        value |= 1 << offset
+    else:
+        value &= ~(1 << offset)
+    calendar.bits = _to_bytes(value)
+
+
+def load_calendars(db: Session, habit_ids: Iterable[int]) -> Dict[int, models.HabitCalendar]:
+    """Fetch calendars for the given habits, backfilling any that are missing"""
+    habit_ids = list(habit_ids)
+    if not habit_ids:
+        return {}
+
+    calendars = {
+        calendar.habit_id: calendar
+        for calendar in db.query(models.HabitCalendar).filter(models.HabitCalendar.habit_id.in_(habit_ids)).all()
+    }
+    missing = [habit_id for habit_id in habit_ids if habit_id not in calendars]
+    if missing:
+        try:
+            calendars.update(rebuild_calendars(db, missing))
+            db.commit()
+        except IntegrityError:
+            # Another request backfilled the same habits first
+            db.rollback()
+            calendars.update({
+                calendar.habit_id: calendar
+                for calendar in db.query(models.HabitCalendar).filter(models.HabitCalendar.habit_id.in_(missing)).all()
+            })
+    return calendars
+
+
+def completion_matrix(calendars: List[models.HabitCalendar], start_date: date, end_date: date) -> np.ndarray:
+    """Boolean (habits x days) matrix for [start_date, end_date], one row per calendar"""
+    n_days = max((end_date - start_date).days + 1, 0)
+    matrix = np.zeros((len(calendars), n_days), dtype=bool)
+
+    for row, calendar in enumerate(calendars):
+        if not calendar.bits:
+            continue
+        bits = np.unpackbits(np.frombuffer(calendar.bits, dtype=np.uint8), bitorder="little").astype(bool)
+        offset = (calendar.start_date - start_date).days
+        src = max(0, -offset)
+        dst = max(0, offset)
+        length = min(len(bits) - src, n_days - dst)
+        if length > 0:
+            matrix[row, dst:dst + length] = bits[src:src + length]
+
+    return matrix
+
+
+def load_matrix(db: Session, habit_ids: List[int], start_date: date, end_date: date) -> np.ndarray:
+    """Completion matrix with rows in the same order as habit_ids"""
+    calendars = load_calendars(db, habit_ids)
+    return completion_matrix([calendars[habit_id] for habit_id in habit_ids], start_date, end_date)
+
+
+# ─── Vectorized analytics ───────────────────────────────────────
+# Matrix columns are consecutive days; the last column is the most recent.
+
+def _trailing_runs(matrix: np.ndarray) -> np.ndarray:
+    """Length of the run of completed days ending at the last column"""
+    if matrix.shape[1] == 0:
+        return np.zeros(matrix.shape[0], dtype=np.int64)
+    reversed_matrix = matrix[:, ::-1]
+    first_gap = np.argmin(reversed_matrix, axis=1)
+    return np.where(reversed_matrix.all(axis=1), matrix.shape[1], first_gap)
+
+
+def current_streaks(matrix: np.ndarray) -> np.ndarray:
+    """Runs ending on the last day, or the day before when the last day is still open"""
+    if matrix.shape[1] == 0:
+        return np.zeros(matrix.shape[0], dtype=np.int64)
+    return np.where(matrix[:, -1], _trailing_runs(matrix), _trailing_runs(matrix[:, :-1]))
+
+
+def rolling_completion_rates(matrix: np.ndarray, window: int) -> np.ndarray:
+    """Percentage of the trailing `window` days completed, for every habit and day"""
+    cumulative = np.zeros((matrix.shape[0], matrix.shape[1] + 1), dtype=np.int64)
+    np.cumsum(matrix, axis=1, out=cumulative[:, 1:])
+    upper = np.arange(1, matrix.shape[1] + 1)
+    lower = np.maximum(upper - window, 0)
+    return np.round((cumulative[:, upper] - cumulative[:, lower]) / window * 100, 1)
+
+
+def weekday_rates(matrix: np.ndarray, start_date: date) -> np.ndarray:
+    """(habits x 7) completion percentage for Monday..Sunday"""
+    weekdays = (np.arange(matrix.shape[1]) + start_date.weekday()) % 7
+    one_hot = np.eye(7, dtype=np.int64)[weekdays]
+    possible = one_hot.sum(axis=0)
+    completed = matrix.astype(np.int64) @ one_hot
+    return np.round(np.divide(completed * 100, possible, out=np.zeros(completed.shape), where=possible > 0), 1)
+
+
+def month_grid(matrix: np.ndarray, start_date: date, year: int, month: int) -> np.ndarray:
+    """
+    (habits x weeks x 7) Monday-first grid for one month: 1 completed,
+    0 missed, -1 for cells outside the month or outside the matrix window.
+    """
+    month_start = date(year, month, 1)
+    next_month = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    n_days = (next_month - month_start).days
+    lead = month_start.weekday()
+    n_weeks = (lead + n_days + 6) // 7
+
+    grid = np.full((matrix.shape[0], n_weeks * 7), -1, dtype=np.int8)
+    offsets = (month_start - start_date).days + np.arange(n_days)
+    inside = (offsets >= 0) & (offsets < matrix.shape[1])
+    cells = lead + np.arange(n_days)
+    grid[:, cells[inside]] = matrix[:, offsets[inside]]
+    return grid.reshape(matrix.shape[0], n_weeks, 7)
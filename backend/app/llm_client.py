@@ -0,0 +1,325 @@
+"""
+Async client for the HuggingFace Inference API.
+──────────────────────────────────────────────
+  • One pooled keep-alive httpx.AsyncClient per worker
+  • Retries with exponential backoff on 429/5xx and connection errors,
+    waiting with asyncio.sleep so other requests keep running
+  • A global semaphore caps concurrent upstream calls
+  • A circuit breaker stops calling a degraded upstream for a while;
+    callers answer with the local fallback instead
+  • stream() yields tokens as the model produces them; closing the
+    generator closes the upstream connection, which ends generation
+
+Point HF_API_URL at a local stub (see llm_stub.py) to exercise all of this
+without a HuggingFace token or network access.
+"""
+
+import asyncio
+import json
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Optional, TypeVar
+
+import httpx
+
+from .config import get_settings
+
+settings = get_settings()
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+T = TypeVar("T")
+
+
+class LLMError(Exception):
+    """The upstream model could not produce a reply"""
+
+
+class LLMTimeoutError(LLMError):
+    """The upstream model did not answer within the read timeout"""
+
+
+class LLMUnavailableError(LLMError):
+    """The circuit is open, the client is saturated or retries ran out"""
+
+
+# ─── Circuit breaker ────────────────────────────────────────────
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_seconds`. The first call after that is let through as a
+    probe: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def release_probe(self) -> None:
+        """Let another call probe when this one ended without an outcome (e.g. cancelled)"""
+        self._probing = False
+
+
+# ─── Client ─────────────────────────────────────────────────────
+
+class LLMClient:
+    def __init__(
+        self,
+        api_url: str,
+        api_token: str,
+        timeout_seconds: float,
+        connect_timeout_seconds: float,
+        max_connections: int,
+        max_concurrency: int,
+        queue_timeout_seconds: float,
+        max_retries: int,
+        backoff_base_seconds: float,
+        backoff_max_seconds: float,
+        breaker: CircuitBreaker,
+    ):
+        self.api_url = api_url
+        self.api_token = api_token
+        self.timeout = httpx.Timeout(timeout_seconds, connect=connect_timeout_seconds)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.max_concurrency = max_concurrency
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.breaker = breaker
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_token)
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=self.limits,
+                headers={"Authorization": f"Bearer {self.api_token}"},
+            )
+        return self._client
+
+    def _slots(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        """Seconds to wait before retry `attempt` (1-based)"""
+        delay = self.backoff_base_seconds * (2 ** (attempt - 1))
+        if response is not None:
+            # HF reports how long a cold model needs to load; 429/503 may send Retry-After.
+            # Either may be present on its own, so honour the larger of the two.
+            hints = [response.headers.get("retry-after")]
+            try:
+                body = response.json()
+                if isinstance(body, dict):
+                    hints.append(body.get("estimated_time"))
+            except ValueError:
+                pass
+            for hint in hints:
+                try:
+                    delay = max(delay, float(hint)) if hint is not None else delay
+                except (TypeError, ValueError):
+                    pass
+        return min(delay, self.backoff_max_seconds) * random.uniform(0.8, 1.2)
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Hold one of the concurrency slots, if the circuit lets the call through"""
+        semaphore = self._slots()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            raise LLMUnavailableError("too many concurrent LLM requests")
+
+        try:
+            if not self.breaker.allow():
+                raise LLMUnavailableError("circuit open")
+            try:
+                yield
+            finally:
+                self.breaker.release_probe()
+        finally:
+            semaphore.release()
+
+    async def generate(self, payload: dict, parse: Optional[Callable[[object], T]] = None) -> object:
+        """
+        POST a generation payload and return the decoded JSON response, or
+        parse(response) when given. parse raises LLMError for a response it
+        cannot use, which counts as a failed call for the circuit breaker.
+        """
+        async with self._slot():
+            try:
+                result = await self._post_with_retries(payload)
+                if parse is not None:
+                    result = parse(result)
+            except LLMError:
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+        return result
+
+    async def stream(self, payload: dict) -> AsyncIterator[str]:
+        """
+        POST a generation payload with streaming enabled and yield text as it
+        arrives. Retries only happen before the first token.
+        """
+        async with self._slot():
+            try:
+                async for text in self._stream_with_retries({**payload, "stream": True}):
+                    yield text
+            except LLMError:
+                self.breaker.record_failure()
+                raise
+            self.breaker.record_success()
+
+    async def _stream_with_retries(self, payload: dict) -> AsyncIterator[str]:
+        attempt = 0
+        started = False
+        while True:
+            try:
+                async with self._http().stream("POST", self.api_url, json=payload) as response:
+                    if response.status_code != 200:
+                        await response.aread()
+                        if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                            attempt += 1
+                            wait_time = self._backoff(attempt, response)
+                            print(f"[WAIT] HF API returned {response.status_code}, retrying in {wait_time:.1f}s...")
+                            await asyncio.sleep(wait_time)
+                            continue
+                        raise LLMUnavailableError(f"HF API error {response.status_code}: {response.text[:200]}")
+
+                    # Text Generation Inference server-sent events: data: {"token": {...}, ...}
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if not data or data == "[DONE]":
+                            continue
+                        try:
+                            event = json.loads(data)
+                        except ValueError:
+                            print(f"[WARN] Skipping undecodable HF stream line: {data[:200]}")
+                            continue
+                        token = event.get("token") if isinstance(event, dict) else None
+                        if not isinstance(token, dict) or token.get("special") or not isinstance(token.get("text"), str) or not token["text"]:
+                            continue
+                        started = True
+                        yield token["text"]
+                    return
+            except httpx.TimeoutException as e:
+                if isinstance(e, httpx.ConnectTimeout) and attempt < self.max_retries:
+                    attempt += 1
+                    await asyncio.sleep(self._backoff(attempt, None))
+                    continue
+                raise LLMTimeoutError(str(e) or type(e).__name__) from e
+            except httpx.TransportError as e:
+                if not started and attempt < self.max_retries:
+                    attempt += 1
+                    await asyncio.sleep(self._backoff(attempt, None))
+                    continue
+                raise LLMUnavailableError(f"connection failed: {e}") from e
+
+    async def _post_with_retries(self, payload: dict) -> object:
+        attempt = 0
+        while True:
+            try:
+                response = await self._http().post(self.api_url, json=payload)
+            except httpx.TimeoutException as e:
+                if isinstance(e, httpx.ConnectTimeout) and attempt < self.max_retries:
+                    attempt += 1
+                    await asyncio.sleep(self._backoff(attempt, None))
+                    continue
+                raise LLMTimeoutError(str(e) or type(e).__name__) from e
+            except httpx.TransportError as e:
+                if attempt < self.max_retries:
+                    attempt += 1
+                    await asyncio.sleep(self._backoff(attempt, None))
+                    continue
+                raise LLMUnavailableError(f"connection failed: {e}") from e
+
+            if response.status_code == 200:
+                try:
+                    return response.json()
+                except ValueError as e:
+                    # e.g. an HTML error page from a proxy in front of the model
+                    raise LLMUnavailableError(f"HF API returned a non-JSON body: {response.text[:200]}") from e
+
+            if response.status_code in RETRYABLE_STATUS and attempt < self.max_retries:
+                attempt += 1
+                wait_time = self._backoff(attempt, response)
+                print(f"[WAIT] HF API returned {response.status_code}, retrying in {wait_time:.1f}s...")
+                await asyncio.sleep(wait_time)
+                continue
+
+            raise LLMUnavailableError(f"HF API error {response.status_code}: {response.text[:200]}")
+
+    def status(self) -> dict:
+        return {
+            "configured": self.configured,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "max_concurrency": self.max_concurrency,
+        }
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def _default_client() -> LLMClient:
+    return LLMClient(
+        api_url=settings.hf_api_url,
+        api_token=settings.HF_API_TOKEN,
+        timeout_seconds=settings.LLM_TIMEOUT_SECONDS,
+        connect_timeout_seconds=settings.LLM_CONNECT_TIMEOUT_SECONDS,
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        queue_timeout_seconds=settings.LLM_QUEUE_TIMEOUT_SECONDS,
+        max_retries=settings.LLM_MAX_RETRIES,
+        backoff_base_seconds=settings.LLM_BACKOFF_BASE_SECONDS,
+        backoff_max_seconds=settings.LLM_BACKOFF_MAX_SECONDS,
+        breaker=CircuitBreaker(settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS),
+    )
+
+
+llm_client = _default_client()
@@ -1,18 +1,52 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
+from sqlalchemy import text
+
+from . import startup_profile
 from .config import get_settings
+from .database import async_engine, async_read_engine, get_pool_status
+from .llm_client import llm_client
+from .password_hasher import password_hasher
+from .principal_cache import principal_cache
+from .rag_engine import (
+    embedding_batcher_status,
+    embedding_cache_status,
+    knowledge_base_ready,
+    knowledge_base_status,
+    start_background_load,
+)
+from .response_cache import response_cache
 from .routes import auth, habits, logs, progress, journal
 from .routes import checkins, expenses, chatbot
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Schema changes are applied by `python manage.py migrate`, not at import
 settings = get_settings()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the first pooled connection now rather than on the first request
+    with startup_profile.phase("database"):
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    # The chatbot answers from keyword search until the knowledge base is ready
+    start_background_load()
+    yield
+    await llm_client.aclose()
+    # Close pooled async connections so their driver threads exit with the worker
+    await async_engine.dispose()
+    if async_read_engine is not async_engine:
+        await async_read_engine.dispose()
+
+
 app = FastAPI(
     title="Daily Habit Tracker API",
     description="API for tracking daily habits with JWT authentication",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -42,4 +76,52 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
+    """Liveness: the process serves requests, even while the knowledge base is still loading"""
+    return {"status": "healthy", "ready": knowledge_base_ready()}
+
+
+@app.get("/health/ready")
+def readiness_check():
+    """Readiness: 503 until the chatbot knowledge base has finished loading"""
+    body = {"ready": knowledge_base_ready(), "knowledge_base": knowledge_base_status()}
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
+@app.get("/health/startup")
+def startup_health():
+    """Startup phase timings; per-module import times when STARTUP_PROFILE is set"""
+    return startup_profile.report()
+
+
+@app.get("/health/db")
+def database_health():
+    """Connection pool occupancy and checkout/wait metrics for sizing workers"""
+    return get_pool_status()
+
+
+@app.get("/health/llm")
+def llm_health():
+    """Chatbot upstream state: circuit breaker and concurrency limit"""
+    return llm_client.status()
+
+
+@app.get("/health/auth")
+def auth_health():
+    """Password hashing pool: work factor, queue depth, rejections and hash times"""
+    return password_hasher.status()
+
+
+@app.get("/health/embeddings")
+def embeddings_health():
+    """Query embedding batch worker: batch sizes, encode and queue wait times, throughput"""
+    return embedding_batcher_status()
+
+
+@app.get("/health/cache")
+def cache_health():
+    """Hit rates and occupancy of the in-process caches"""
+    return {
+        "chat_replies": response_cache.status(),
+        "query_embeddings": embedding_cache_status(),
+        "principals": principal_cache.status(),
+    }
@@ -0,0 +1,256 @@
+"""
+Versioned schema migrations.
+
+Migrations run once per deploy through `python manage.py migrate`, never at
+app import. Each step is recorded in the schema_version table, so a database
+is only ever upgraded from the version it is at. Steps are idempotent so an
+interrupted run can simply be retried. On Postgres, indexes are built
+CONCURRENTLY so existing tables stay writable during a deploy.
+
+To change the schema, update the models and append a new step to
+MIGRATIONS; never edit or reorder a step that has shipped. Steps spell out
+the indexes they build instead of reading them from the models.
+"""
+
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+
+from . import crud, models, habit_calendar, rollups
+from .database import SessionLocal, Base
+
+# Kept outside Base.metadata so model changes never touch the version table
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Arbitrary key for pg_advisory_lock so only one deploy migrates at a time
+_MIGRATION_LOCK_ID = 72_310_001
+
+def _index(name: str, table_name: str, *columns: str, **kwargs) -> Index:
+    """
+    An index pinned to the migration step that creates it. It is built on
+    a detached table so later model changes never alter what a shipped step
+    does, and it never joins Base.metadata.
+    """
+    table = Table(table_name, MetaData(), *(Column(column) for column in columns))
+    return Index(name, *(table.c[column] for column in columns), **kwargs)
+
+
+# Step 2: composite indexes for tables that may already exist in deployed databases
+HABIT_LOG_INDEXES = [
+    _index("ix_habits_user_active", "habits", "user_id", "is_active"),
+    _index("uq_habit_logs_habit_date", "habit_logs", "habit_id", "date", unique=True),
+    _index("ix_habit_logs_completed_habit_date", "habit_logs", "habit_id", "date",
+           postgresql_where=text("completed"), sqlite_where=text("completed")),
+    _index("ix_habit_logs_completed_date_habit", "habit_logs", "date", "habit_id",
+           postgresql_where=text("completed"), sqlite_where=text("completed")),
+    _index("ix_journal_entries_user_type_date", "journal_entries", "user_id", "entry_type", "date"),
+    _index("ix_expenses_user_date", "expenses", "user_id", "expense_date"),
+    _index("ix_daily_checkins_user_date", "daily_checkins", "user_id", "check_in_date"),
+]
+
+# Step 4: unique (user_id, check_in_date) key, built once duplicates are gone
+CHECKIN_UNIQUE_INDEX = _index("uq_daily_checkins_user_date", "daily_checkins", "user_id", "check_in_date", unique=True)
+
+
+def _dedupe_habit_logs(engine: Engine) -> int:
+    """
+    Keep only the newest log per (habit_id, date) so the unique index can be
+    built, then repair the derived state of the habits that were affected.
+    """
+    with engine.begin() as conn:
+        affected = [row[0] for row in conn.execute(text(
+            "SELECT habit_id FROM habit_logs GROUP BY habit_id, date HAVING COUNT(*) > 1"
+        ))]
+        if not affected:
+            return 0
+        deleted = conn.execute(text(
+            "DELETE FROM habit_logs WHERE id NOT IN "
+            "(SELECT MAX(id) FROM habit_logs GROUP BY habit_id, date)"
+        )).rowcount
+
+    habit_ids = sorted(set(affected))
+    db = SessionLocal()
+    try:
+        user_ids = {user_id for (user_id,) in db.query(models.Habit.user_id).filter(models.Habit.id.in_(habit_ids)).all()}
+        crud.rebuild_habit_streaks(db, habit_ids)
+        habit_calendar.rebuild_calendars(db, habit_ids)
+        for user_id in user_ids:
+            rollups.rebuild_rollups(db, user_id)
+        db.commit()
+    finally:
+        db.close()
+
+    print(f"[DB] Removed {deleted} duplicate habit log(s) across {len(habit_ids)} habit(s)")
+    return deleted
+
+
+def _dedupe_daily_checkins(engine: Engine) -> int:
+    """Keep only the first check-in per (user_id, check_in_date) so the unique index can be built"""
+    with engine.begin() as conn:
+        deleted = conn.execute(text(
+            "DELETE FROM daily_checkins WHERE id NOT IN "
+            "(SELECT MIN(id) FROM daily_checkins GROUP BY user_id, check_in_date)"
+        )).rowcount
+    if deleted:
+        print(f"[DB] Removed {deleted} duplicate check-in(s)")
+    return deleted
+
+
+def _rebuild_all_checkin_stats() -> None:
+    db = SessionLocal()
+    try:
+        user_ids = [user_id for (user_id,) in db.query(models.User.id).order_by(models.User.id).all()]
+        for start in range(0, len(user_ids), 500):
+            crud.rebuild_checkin_stats(db, user_ids[start:start + 500])
+            db.commit()
+    finally:
+        db.close()
+
+
+def _drop_index(engine: Engine, name: str) -> None:
+    concurrently = " CONCURRENTLY" if engine.dialect.name == "postgresql" else ""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f'DROP INDEX{concurrently} IF EXISTS "{name}"'))
+
+
+def _drop_invalid_index(conn, name: str) -> None:
+    """Remove a Postgres index left INVALID by an interrupted CONCURRENTLY build"""
+    invalid = conn.execute(text(
+        "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+        "WHERE c.relname = :name AND NOT i.indisvalid"
+    ), {"name": name}).first()
+    if invalid:
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+
+
+def _create_index_sql(index, engine: Engine) -> str:
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+    if engine.dialect.name == "postgresql":
+        # Build without blocking writes; must run outside a transaction
+        ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+        ddl = ddl.replace("CREATE UNIQUE INDEX", "CREATE UNIQUE INDEX CONCURRENTLY", 1)
+    return ddl
+
+
+def create_indexes(engine: Engine, indexes) -> None:
+    """Create indexes if missing; CONCURRENTLY on Postgres, outside a transaction"""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for index in indexes:
+            if engine.dialect.name == "postgresql":
+                _drop_invalid_index(conn, index.name)
+            conn.execute(text(_create_index_sql(index, engine)))
+
+
+# ─── Migration steps ────────────────────────────────────────────
+
+def _initial_schema(engine: Engine) -> None:
+    # Also adopts databases created by the old create_all-at-import startup
+    Base.metadata.create_all(bind=engine)
+
+
+def _habit_log_indexes(engine: Engine) -> None:
+    _dedupe_habit_logs(engine)
+    create_indexes(engine, HABIT_LOG_INDEXES)
+
+
+def _checkin_stats(engine: Engine) -> None:
+    """Add materialized check-in streak and monthly count tables and backfill them"""
+    Base.metadata.create_all(bind=engine, tables=[models.CheckinStreak.__table__, models.CheckinMonth.__table__])
+    _rebuild_all_checkin_stats()
+
+
+def _checkin_unique_dates(engine: Engine) -> None:
+    """
+    Make (user_id, check_in_date) unique, replacing the plain index on the
+    same columns, and rebuild the stats that duplicate check-ins or racing
+    updates may have skewed.
+    """
+    _dedupe_daily_checkins(engine)
+    create_indexes(engine, [CHECKIN_UNIQUE_INDEX])
+    _drop_index(engine, "ix_daily_checkins_user_date")
+    _rebuild_all_checkin_stats()
+
+
+def _rollup_backfills(engine: Engine) -> None:
+    """
+    Add the per-user rollup backfill marker. Rollups written before it may
+    cover only the days a bulk write touched, so every user is rebuilt in full.
+    """
+    Base.metadata.create_all(bind=engine, tables=[models.RollupBackfill.__table__])
+    db = SessionLocal()
+    try:
+        user_ids = [user_id for (user_id,) in db.query(models.User.id).order_by(models.User.id).all()]
+        for start in range(0, len(user_ids), 500):
+            for user_id in user_ids[start:start + 500]:
+                rollups.backfill_rollups(db, user_id)
+            db.commit()
+    finally:
+        db.close()
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Engine], None]
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial_schema", _initial_schema),
+    Migration(2, "habit_log_indexes", _habit_log_indexes),
+    Migration(3, "checkin_stats", _checkin_stats),
+    Migration(4, "checkin_unique_dates", _checkin_unique_dates),
+    Migration(5, "rollup_backfills", _rollup_backfills),
+]
+
+HEAD_VERSION = MIGRATIONS[-1].version
+
+
+# ─── Runner ─────────────────────────────────────────────────────
+
+def current_version(engine: Engine) -> int:
+    """The highest applied migration, or 0 for an unmanaged database"""
+    schema_version.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def pending_migrations(engine: Engine) -> List[Migration]:
+    version = current_version(engine)
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+
+def migrate(engine: Engine, target: int = HEAD_VERSION) -> List[Migration]:
+    """Apply pending migrations up to target in order; returns the ones applied"""
+    lock = None
+    if engine.dialect.name == "postgresql":
+        lock = engine.connect()
+        lock.execute(text("SELECT pg_advisory_lock(:id)"), {"id": _MIGRATION_LOCK_ID})
+
+    try:
+        applied = []
+        for migration in pending_migrations(engine):
+            if migration.version > target:
+                break
+            print(f"[DB] Applying migration {migration.version:04d} {migration.name}")
+            migration.apply(engine)
+            with engine.begin() as conn:
+                conn.execute(schema_version.insert().values(
+                    version=migration.version,
+                    name=migration.name,
+                    applied_at=datetime.utcnow()
+                ))
+            applied.append(migration)
+        return applied
+    finally:
+        if lock is not None:
+            lock.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _MIGRATION_LOCK_ID})
+            lock.close()
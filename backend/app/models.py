@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Date, Text, Float, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Date, Text, Float, UniqueConstraint, LargeBinary, Index, text
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from datetime import datetime, date
 from typing import List
@@ -20,10 +20,15 @@ class User(Base):
     expenses: Mapped[List["Expense"]] = relationship("Expense", back_populates="user", cascade="all, delete-orphan")
     budgets: Mapped[List["MonthlyBudget"]] = relationship("MonthlyBudget", back_populates="user", cascade="all, delete-orphan")
     daily_budgets: Mapped[List["DailyBudget"]] = relationship("DailyBudget", back_populates="user", cascade="all, delete-orphan")
+    daily_rollups: Mapped[List["UserDailyRollup"]] = relationship("UserDailyRollup", back_populates="user", cascade="all, delete-orphan")
+    checkin_streak: Mapped["CheckinStreak | None"] = relationship("CheckinStreak", back_populates="user", uselist=False, cascade="all, delete-orphan")
+    checkin_months: Mapped[List["CheckinMonth"]] = relationship("CheckinMonth", back_populates="user", cascade="all, delete-orphan")
+    rollup_backfill: Mapped["RollupBackfill | None"] = relationship("RollupBackfill", back_populates="user", uselist=False, cascade="all, delete-orphan")
 
 
 class Habit(Base):
     __tablename__ = "habits"
+    __table_args__ = (Index("ix_habits_user_active", "user_id", "is_active"),)
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
@@ -37,10 +42,20 @@ class Habit(Base):
     
     user: Mapped["User"] = relationship("User", back_populates="habits")
     logs: Mapped[List["HabitLog"]] = relationship("HabitLog", back_populates="habit", cascade="all, delete-orphan")
+    streak: Mapped["HabitStreak | None"] = relationship("HabitStreak", back_populates="habit", uselist=False, cascade="all, delete-orphan")
+    calendar: Mapped["HabitCalendar | None"] = relationship("HabitCalendar", back_populates="habit", uselist=False, cascade="all, delete-orphan")
 
 
 class HabitLog(Base):
     __tablename__ = "habit_logs"
+    __table_args__ = (
+        Index("uq_habit_logs_habit_date", "habit_id", "date", unique=True),
+        # Partial indexes serving the completed-by-date lookups (streaks, rates, progress counts)
+        Index("ix_habit_logs_completed_habit_date", "habit_id", "date",
+              postgresql_where=text("completed"), sqlite_where=text("completed")),
+        Index("ix_habit_logs_completed_date_habit", "date", "habit_id",
+              postgresql_where=text("completed"), sqlite_where=text("completed")),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     habit_id: Mapped[int] = mapped_column(Integer, ForeignKey("habits.id"), nullable=False)
@@ -52,8 +67,35 @@ class HabitLog(Base):
     habit: Mapped["Habit"] = relationship("Habit", back_populates="logs")
 
 
+class HabitStreak(Base):
+    """Materialized streak state, kept in sync with habit_logs by crud"""
+    __tablename__ = "habit_streaks"
+
+    habit_id: Mapped[int] = mapped_column(Integer, ForeignKey("habits.id"), primary_key=True)
+    current_run_start: Mapped[date | None] = mapped_column(Date, nullable=True)  # First day of the latest run
+    last_completed_date: Mapped[date | None] = mapped_column(Date, nullable=True)  # Last day of the latest run
+    longest_streak: Mapped[int] = mapped_column(Integer, default=0)
+    total_completions: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    habit: Mapped["Habit"] = relationship("Habit", back_populates="streak")
+
+
+class HabitCalendar(Base):
+    """Completion history as a day bitmap: bit i is set when start_date + i days was completed"""
+    __tablename__ = "habit_calendars"
+
+    habit_id: Mapped[int] = mapped_column(Integer, ForeignKey("habits.id"), primary_key=True)
+    start_date: Mapped[date] = mapped_column(Date, nullable=False)
+    bits: Mapped[bytes] = mapped_column(LargeBinary, nullable=False, default=b"")  # little-endian bit order
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    habit: Mapped["Habit"] = relationship("Habit", back_populates="calendar")
+
+
 class JournalEntry(Base):
     __tablename__ = "journal_entries"
+    __table_args__ = (Index("ix_journal_entries_user_type_date", "user_id", "entry_type", "date"),)
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
@@ -72,6 +114,7 @@ class JournalEntry(Base):
 
 class DailyCheckIn(Base):
     __tablename__ = "daily_checkins"
+    __table_args__ = (Index("uq_daily_checkins_user_date", "user_id", "check_in_date", unique=True),)
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
@@ -81,8 +124,35 @@ class DailyCheckIn(Base):
     user: Mapped["User"] = relationship("User", back_populates="daily_checkins")
 
 
+class CheckinStreak(Base):
+    """Materialized check-in run state, kept in sync with daily_checkins by crud"""
+    __tablename__ = "checkin_streaks"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    current_run_start: Mapped[date | None] = mapped_column(Date, nullable=True)  # First day of the latest run
+    last_checkin_date: Mapped[date | None] = mapped_column(Date, nullable=True)  # Last day of the latest run
+    longest_streak: Mapped[int] = mapped_column(Integer, default=0)
+    total_checkins: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user: Mapped["User"] = relationship("User", back_populates="checkin_streak")
+
+
+class CheckinMonth(Base):
+    """Days checked in per user per calendar month, kept in sync with daily_checkins by crud"""
+    __tablename__ = "checkin_months"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    year: Mapped[int] = mapped_column(Integer, primary_key=True)
+    month: Mapped[int] = mapped_column(Integer, primary_key=True)
+    checkins: Mapped[int] = mapped_column(Integer, default=0)
+
+    user: Mapped["User"] = relationship("User", back_populates="checkin_months")
+
+
 class Expense(Base):
     __tablename__ = "expenses"
+    __table_args__ = (Index("ix_expenses_user_date", "user_id", "expense_date"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
@@ -122,3 +192,31 @@ class DailyBudget(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user: Mapped["User"] = relationship("User", back_populates="daily_budgets")
+
+
+class UserDailyRollup(Base):
+    """Per-user, per-day aggregates maintained incrementally by crud"""
+    __tablename__ = "user_daily_rollups"
+    __table_args__ = (UniqueConstraint("user_id", "rollup_date", name="uq_user_rollup_day"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    date: Mapped[date] = mapped_column("rollup_date", Date, nullable=False)
+    habits_completed: Mapped[int] = mapped_column(Integer, default=0)  # Completions of currently active habits
+    active_habits: Mapped[int] = mapped_column(Integer, default=0)  # Active habit count when the day was last written
+    checked_in: Mapped[bool] = mapped_column(Boolean, default=False)
+    amount_spent: Mapped[float] = mapped_column(Float, default=0)
+    daily_budget: Mapped[float | None] = mapped_column(Float, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    user: Mapped["User"] = relationship("User", back_populates="daily_rollups")
+
+
+class RollupBackfill(Base):
+    """Marks a user whose daily rollups have been built over their whole history"""
+    __tablename__ = "rollup_backfills"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    backfilled_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    user: Mapped["User"] = relationship("User", back_populates="rollup_backfill")
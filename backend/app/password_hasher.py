@@ -0,0 +1,117 @@
+"""
+Bounded worker pool for bcrypt.
+──────────────────────────────
+Hashing and verifying a password costs ~2^BCRYPT_ROUNDS bcrypt iterations
+of pure CPU. Running that in Starlette's shared threadpool lets a login
+burst occupy every thread and stall unrelated endpoints. PasswordHasher
+runs it on its own small pool instead:
+
+  • PASSWORD_HASH_WORKERS threads (default: one per core). The bcrypt
+    extension releases the GIL, so the threads hash in parallel
+  • At most PASSWORD_HASH_MAX_QUEUE requests wait for a thread; beyond
+    that callers get PasswordHasherBusy, which routes turn into a 429
+    with a Retry-After estimated from the queue and recent hash times
+  • verify() reports a replacement hash when the stored one was made with
+    a different work factor, so changing BCRYPT_ROUNDS migrates users as
+    they log in
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from .auth import pwd_context
+from .config import get_settings
+
+settings = get_settings()
+
+
+class PasswordHasherBusy(Exception):
+    """The hashing queue is full; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Password hashing queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.reset_metrics()
+
+    def reset_metrics(self) -> None:
+        with self._lock:
+            self.completed = 0
+            self.rejected = 0
+            self.rehashed = 0
+            self.busy_seconds = 0.0
+            self.wait_seconds = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """(matches, new hash to store or None when the stored hash is current)"""
+        valid, new_hash = await self._run(pwd_context.verify_and_update, password, hashed_password)
+        if new_hash is not None:
+            with self._lock:
+                self.rehashed += 1
+        return valid, new_hash
+
+    async def _run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusy(self._retry_after())
+            self._pending += 1
+        queued_at = time.monotonic()
+
+        def timed():
+            started = time.monotonic()
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.wait_seconds += started - queued_at
+                    self.busy_seconds += time.monotonic() - started
+                    self.completed += 1
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _retry_after(self) -> int:
+        """Seconds for the current queue to drain at the recent per-hash cost"""
+        per_hash = self.busy_seconds / self.completed if self.completed else 0.25
+        return max(1, math.ceil(self._pending * per_hash / self.workers))
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "rounds": settings.BCRYPT_ROUNDS,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": min(self._pending, self.workers),
+                "queued": max(0, self._pending - self.workers),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "rehashed": self.rehashed,
+                "avg_hash_ms": round(self.busy_seconds * 1000 / self.completed, 2) if self.completed else 0.0,
+                "avg_wait_ms": round(self.wait_seconds * 1000 / self.completed, 2) if self.completed else 0.0,
+            }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
@@ -0,0 +1,129 @@
+"""
+Short-lived cache of authenticated principals.
+
+Every authenticated request used to decode its JWT and then look the user
+up by username, so a dashboard load ran the same query several times.
+Tokens now carry the user id ("uid") and a token id ("jti"); routes that
+only need the caller's id resolve a Principal straight from the claims.
+Older tokens without "uid" are resolved through this cache, keyed by
+(subject, jti), with a database lookup only on a miss.
+
+invalidate_user() runs whenever a User row is updated or deleted through
+the ORM, and from crud for bulk updates that skip ORM events. It drops that
+user's cached principals and marks tokens issued before that moment as
+stale, so they go back to the database once. All of this is per process:
+another worker keeps serving a cached principal for up to
+PRINCIPAL_CACHE_TTL_SECONDS, and keeps trusting the claims of a token with
+"uid" until the token expires (ACCESS_TOKEN_EXPIRE_MINUTES).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import event
+
+from .config import get_settings
+from .models import User
+
+settings = get_settings()
+
+
+class Principal(NamedTuple):
+    """The authenticated caller, as far as most routes need to know"""
+    id: int
+    username: str
+
+
+PrincipalKey = Tuple[str, Optional[str]]  # (subject, jti)
+
+
+class PrincipalCache:
+    def __init__(self, ttl_seconds: float, max_entries: int, token_lifetime_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.token_lifetime_seconds = token_lifetime_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[PrincipalKey, Tuple[Principal, float]]" = OrderedDict()
+        # user id -> wall-clock time of the last change; older than any live token once past the token lifetime
+        self._changed_at: Dict[int, float] = {}
+        self.reset_metrics()
+
+    def reset_metrics(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.stateless = 0
+        self.invalidations = 0
+
+    def get(self, key: PrincipalKey) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: PrincipalKey, principal: Principal) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (principal, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def from_claims(self, user_id: int, username: str, issued_at: Optional[float]) -> Optional[Principal]:
+        """A principal built from token claims alone, unless the user changed after the token was issued"""
+        with self._lock:
+            changed_at = self._changed_at.get(user_id)
+            if changed_at is not None and (issued_at is None or issued_at <= changed_at):
+                return None
+            self.stateless += 1
+        return Principal(user_id, username)
+
+    def invalidate_user(self, user_id: int) -> None:
+        now = time.time()
+        with self._lock:
+            expired = [uid for uid, changed_at in self._changed_at.items() if changed_at <= now - self.token_lifetime_seconds]
+            for uid in expired:
+                del self._changed_at[uid]
+            self._changed_at[user_id] = now
+            stale = [key for key, (principal, _) in self._entries.items() if principal.id == user_id]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def status(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            resolved = lookups + self.stateless
+            return {
+                "entries": len(self._entries),
+                "changed_users": len(self._changed_at),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "stateless": self.stateless,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "db_lookup_rate": round(self.misses / resolved, 3) if resolved else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    token_lifetime_seconds=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target: User) -> None:
+    principal_cache.invalidate_user(target.id)
@@ -8,17 +8,35 @@ Uses:
 
 Flow:
   1. Load Application-Usecase-Guide.md using LangChain MarkdownTextSplitter
-  2. Embed every chunk with SentenceTransformer and store in a FAISS index
+  2. Embed every chunk with SentenceTransformer and store in a FAISS index;
+     fit a TF-IDF index once for servers without an embedding model
   3. At query time, embed the user question and retrieve top-k nearest chunks
   4. Inject those chunks + live user data into a structured prompt
   5. Guard against out-of-scope questions using an intent classifier
+
+With an embedding model loaded, retrieval is hybrid by default: the dense
+FAISS ranking and a BM25 keyword ranking are merged with reciprocal rank
+fusion. Without one it is BM25 alone: fusing BM25 with TF-IDF recalls no
+more of the guide and costs ~30x the query time. RAG_RETRIEVAL selects a
+method explicitly; bench_retrieval.py compares them.
+
+Indexes are persisted as content-addressed builds under FAISS_INDEX_DIR;
+a change to a source document re-embeds only the chunks that changed.
 """
 
+import asyncio
+import hashlib
+import importlib.util
 import os
 import re
 import json
 import pickle
+import shutil
+import sys
+import threading
+import time
 import numpy as np
+from collections import Counter, OrderedDict, defaultdict
 from datetime import date, datetime, timedelta
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
@@ -26,7 +44,8 @@ from pathlib import Path
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
 
-from . import models
+from . import crud, models, habit_calendar, rollups, startup_profile
+from .embedding_batcher import EmbeddingBatcher
 
 # ─── Configuration ──────────────────────────────────────────────
 
@@ -41,6 +60,9 @@ FAISS_INDEX_DIR = os.path.join(
     "faiss_index",
 )
 
+# More markdown documents for the knowledge base, separated by os.pathsep
+EXTRA_SOURCES = [p for p in os.getenv("RAG_EXTRA_SOURCES", "").split(os.pathsep) if p.strip()]
+
 EMBEDDING_MODEL_NAME = os.getenv(
     "EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
 )
@@ -48,15 +70,34 @@ CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "800"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
 TOP_K = int(os.getenv("RAG_TOP_K", "5"))
 SIMILARITY_THRESHOLD = float(os.getenv("RAG_SIMILARITY_THRESHOLD", "0.25"))
+RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL", "auto")  # auto | hybrid | dense | tfidf | bm25
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+EMBEDDING_CACHE_MB = float(os.getenv("RAG_EMBEDDING_CACHE_MB", "16"))
+# Query embeddings from concurrent requests are encoded together (see embedding_batcher.py)
+EMBED_BATCHING = os.getenv("RAG_EMBED_BATCHING", "true").lower() in ("1", "true", "yes")
+EMBED_BATCH_WINDOW_MS = float(os.getenv("RAG_EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_MAX_BATCH = int(os.getenv("RAG_EMBED_MAX_BATCH", "32"))
+BM25_K1 = 1.5
+BM25_B = 0.75
 
 # ─── Global State ───────────────────────────────────────────────
 
 _faiss_index = None        # FAISS index object
+_tfidf_vectorizer = None   # TfidfVectorizer fitted on the chunk corpus
+_tfidf_matrix = None       # sparse (chunks x terms) TF-IDF matrix, rows L2-normalized
+_bm25_index = None         # BM25Index over the chunk contents
 _chunk_store: List[Dict[str, str]] = []   # chunk metadata (title + content)
 _embedder = None           # SentenceTransformer model instance
+_embedder_missing = False  # sentence-transformers failed to import; don't retry per query
 
 # Flags
 _kb_loaded = False
+_kb_lock = threading.Lock()           # one load at a time
+_kb_state = "not_started"             # -> loading -> ready | failed
+_kb_error: Optional[str] = None
+_kb_load_seconds: Optional[float] = None
+_kb_thread: Optional[threading.Thread] = None
+_fallback_chunks: Optional[List[Dict[str, str]]] = None  # regex-chunked sources for keyword search while loading
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -65,8 +106,8 @@ _kb_loaded = False
 
 def _get_embedder():
     """Lazy-load the SentenceTransformer embedding model."""
-    global _embedder
-    if _embedder is not None:
+    global _embedder, _embedder_missing
+    if _embedder is not None or _embedder_missing:
         return _embedder
     try:
         from sentence_transformers import SentenceTransformer
@@ -76,6 +117,7 @@ def _get_embedder():
         return _embedder
     except ImportError:
         print("[ERROR] sentence-transformers not installed. Run: pip install sentence-transformers")
+        _embedder_missing = True
         return None
 
 
@@ -88,25 +130,167 @@ def embed_texts(texts: List[str]) -> np.ndarray:
     return embeddings.astype("float32")
 
 
+class EmbeddingCache:
+    """
+    LRU cache of query embeddings keyed by normalized text, bounded by the
+    bytes its keys and vectors take rather than by entry count.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()  # least recently used first
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(key: str, vector: np.ndarray) -> int:
+        return sys.getsizeof(key) + vector.nbytes
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector: np.ndarray) -> None:
+        size = self._size(key, vector)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= self._size(key, previous)
+            self._entries[key] = vector
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                old_key, old_vector = self._entries.popitem(last=False)
+                self.bytes -= self._size(old_key, old_vector)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def status(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+_query_embeddings = EmbeddingCache(int(EMBEDDING_CACHE_MB * 1024 * 1024))
+_batcher = EmbeddingBatcher(lambda texts: embed_texts(texts), EMBED_BATCH_WINDOW_MS, EMBED_MAX_BATCH)
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def embed_query(query: str) -> Optional[np.ndarray]:
+    """
+    Normalized embedding of one query, or None when no embedding model is
+    available. Served from the query embedding cache when the same text
+    (ignoring case and whitespace) was embedded before; callers must not
+    modify the returned array. Blocks, so call it off the event loop or
+    use embed_query_async.
+    """
+    key = _normalize_query(query)
+    vector = _query_embeddings.get(key)
+    if vector is not None or not _embedder_ready():
+        return vector
+    if EMBED_BATCHING:
+        vector = _batcher.embed(key)
+    else:
+        vectors = embed_texts([key])
+        vector = vectors[0] if vectors.size else None
+    if vector is not None:
+        _query_embeddings.put(key, vector)
+    return vector
+
+
+def _embedder_ready() -> bool:
+    """
+    False while the knowledge base is loading in the background, which is
+    also when the model loads. Otherwise loads the model if needed, so call
+    it from a worker thread, not the event loop.
+    """
+    return _kb_state != "loading" and _get_embedder() is not None
+
+
+async def embed_query_async(query: str) -> Optional[np.ndarray]:
+    """embed_query for async code: waits on the batch worker without holding a thread"""
+    key = _normalize_query(query)
+    vector = _query_embeddings.get(key)
+    if vector is not None or _kb_state == "loading":
+        return vector
+    # Loading SentenceTransformer takes seconds; never do it on the event loop
+    if _embedder is None and (_embedder_missing or not await asyncio.to_thread(_embedder_ready)):
+        return None
+    if not EMBED_BATCHING:
+        return await asyncio.to_thread(embed_query, key)
+    vector = await asyncio.wrap_future(_batcher.submit(key))
+    if vector is not None:
+        _query_embeddings.put(key, vector)
+    return vector
+
+
+def embedding_cache_status() -> dict:
+    return _query_embeddings.status()
+
+
+def embedding_batcher_status() -> dict:
+    return {"enabled": EMBED_BATCHING, "model_loaded": _embedder is not None, **_batcher.status()}
+
+
 # ═══════════════════════════════════════════════════════════════
 #  SECTION 2 — DOCUMENT LOADING & CHUNKING (LangChain)
 # ═══════════════════════════════════════════════════════════════
 
-def _load_and_chunk_document() -> List[Dict[str, str]]:
-    """
-    Load Application-Usecase-Guide.md, split it using LangChain's
-    MarkdownTextSplitter, and return a list of {title, content} chunks.
-    """
+def _knowledge_sources() -> List[Path]:
+    """The guide plus any RAG_EXTRA_SOURCES documents that exist, in a stable order."""
+    sources = []
     guide_path = Path(GUIDE_PATH)
     if not guide_path.exists():
-        alt = Path(__file__).resolve().parent.parent.parent / "about" / "Application-Usecase-Guide.md"
-        if alt.exists():
-            guide_path = alt
+        guide_path = Path(__file__).resolve().parent.parent.parent / "about" / "Application-Usecase-Guide.md"
+    if guide_path.exists():
+        sources.append(guide_path)
+    else:
+        print("[ERROR] Knowledge base file not found!")
+
+    for extra in EXTRA_SOURCES:
+        path = Path(extra.strip())
+        if path.exists():
+            sources.append(path)
         else:
-            print("[ERROR] Knowledge base file not found!")
-            return []
+            print(f"[WARN] Knowledge source not found: {path}")
+    return sources
+
 
-    text = guide_path.read_text(encoding="utf-8")
+def _splitter_name() -> str:
+    return "langchain" if importlib.util.find_spec("langchain") else "regex"
+
+
+def _load_and_chunk_document(path: Path) -> List[Dict[str, str]]:
+    """
+    Load a markdown knowledge document, split it using LangChain's
+    MarkdownTextSplitter, and return a list of {title, content} chunks.
+    """
+    text = path.read_text(encoding="utf-8")
 
     try:
         from langchain.text_splitter import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
@@ -138,7 +322,7 @@ def _load_and_chunk_document() -> List[Dict[str, str]]:
                     continue  # skip tiny fragments
                 chunks.append({"title": section_title, "content": sub})
 
-        print(f"[RAG] Chunked guide into {len(chunks)} pieces (LangChain MarkdownHeaderTextSplitter + RecursiveCharacterTextSplitter)")
+        print(f"[RAG] Chunked {path.name} into {len(chunks)} pieces (LangChain MarkdownHeaderTextSplitter + RecursiveCharacterTextSplitter)")
         return chunks
 
     except ImportError:
@@ -176,72 +360,338 @@ def _fallback_chunk(text: str) -> List[Dict[str, str]]:
 
 
 # ═══════════════════════════════════════════════════════════════
-#  SECTION 3 — FAISS INDEX
+#  SECTION 3 — FAISS & TF-IDF INDEXES
 # ═══════════════════════════════════════════════════════════════
 
-def _build_faiss_index(chunks: List[Dict[str, str]]):
-    """Create a FAISS index from chunk embeddings and persist to disk."""
-    global _faiss_index, _chunk_store
-
+def _build_faiss_index(embeddings: np.ndarray):
+    """Create a FAISS inner-product index over chunk embeddings."""
     try:
         import faiss
     except ImportError:
         print("[ERROR] faiss-cpu not installed. Run: pip install faiss-cpu")
-        return
-
-    texts = [c["content"] for c in chunks]
-    embeddings = embed_texts(texts)
-
-    if embeddings.size == 0:
-        print("[ERROR] No embeddings generated")
-        return
+        return None
 
     dim = embeddings.shape[1]
     # Inner product index (since we normalized the embeddings, IP = cosine similarity)
     index = faiss.IndexFlatIP(dim)
     index.add(embeddings)
 
-    _faiss_index = index
-    _chunk_store = chunks
-
-    # Persist to disk
-    _save_index(index, chunks)
     print(f"[RAG] FAISS index built — {index.ntotal} vectors, dim={dim}")
+    return index
 
 
-def _save_index(index, chunks: List[Dict[str, str]]):
-    """Save FAISS index and chunk metadata to disk."""
+def _build_tfidf_index(chunks: List[Dict[str, str]]):
+    """
+    Fit the TF-IDF vectorizer once over the chunk corpus. Rows of the sparse
+    matrix are L2-normalized, so a query's cosine similarity to every chunk
+    is a single sparse matrix-vector product.
+    """
     try:
-        import faiss
-        os.makedirs(FAISS_INDEX_DIR, exist_ok=True)
-        faiss.write_index(index, os.path.join(FAISS_INDEX_DIR, "index.faiss"))
-        with open(os.path.join(FAISS_INDEX_DIR, "chunks.pkl"), "wb") as f:
-            pickle.dump(chunks, f)
-        print(f"[RAG] Index saved to {FAISS_INDEX_DIR}")
-    except Exception as e:
-        print(f"[WARN] Could not save index: {e}")
+        from sklearn.feature_extraction.text import TfidfVectorizer
+    except ImportError:
+        print("[WARN] scikit-learn not installed, keyword search will use word overlap")
+        return None
 
+    vectorizer = TfidfVectorizer(stop_words="english", max_features=5000, ngram_range=(1, 2))
+    matrix = vectorizer.fit_transform([c["content"] for c in chunks]).tocsr()
+    # Only kept for introspection and can be large; not needed to transform queries
+    if hasattr(vectorizer, "stop_words_"):
+        del vectorizer.stop_words_
+
+    print(f"[RAG] TF-IDF index built — {matrix.shape[0]} chunks, {matrix.shape[1]} terms")
+    return {"vectorizer": vectorizer, "matrix": matrix}
+
+
+_STOP_WORDS: Optional[frozenset] = None  # sklearn's list, imported on first use; sklearn takes ~1s to import
+
+
+def _stop_words() -> frozenset:
+    global _STOP_WORDS
+    if _STOP_WORDS is None:
+        try:
+            from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+            _STOP_WORDS = frozenset(ENGLISH_STOP_WORDS)
+        except ImportError:
+            _STOP_WORDS = frozenset()
+    return _STOP_WORDS
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without English stop words, as used by BM25"""
+    stop_words = _STOP_WORDS if _STOP_WORDS is not None else _stop_words()
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in stop_words and len(t) > 1]
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index: term -> (chunk ids, term frequencies)."""
+
+    def __init__(self, documents: List[List[str]], k1: float = BM25_K1, b: float = BM25_B):
+        n_docs = len(documents)
+        doc_len = np.array([len(doc) for doc in documents], dtype=np.float32)
+        avg_len = float(doc_len.mean()) if n_docs else 0.0
+        # Per-chunk length normalization, precomputed once
+        self.length_norm = k1 * (1 - b + b * doc_len / (avg_len or 1.0))
+        self.k1 = k1
+        self.n_docs = n_docs
+
+        postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        for doc_id, doc in enumerate(documents):
+            for term, tf in Counter(doc).items():
+                postings[term][doc_id] = tf
+
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.idf: Dict[str, float] = {}
+        for term, docs in postings.items():
+            self.postings[term] = (
+                np.fromiter(docs.keys(), dtype=np.int64, count=len(docs)),
+                np.fromiter(docs.values(), dtype=np.float32, count=len(docs)),
+            )
+            self.idf[term] = float(np.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5)))
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for the query; only the query terms' postings are touched"""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            doc_ids, tfs = self.postings[term]
+            scores[doc_ids] += self.idf[term] * tfs * (self.k1 + 1) / (tfs + self.length_norm[doc_ids])
+        return scores
 
-def _load_index_from_disk() -> bool:
-    """Try to load a persisted FAISS index from disk."""
-    global _faiss_index, _chunk_store
-    index_path = os.path.join(FAISS_INDEX_DIR, "index.faiss")
-    chunks_path = os.path.join(FAISS_INDEX_DIR, "chunks.pkl")
 
-    if not (os.path.exists(index_path) and os.path.exists(chunks_path)):
-        return False
+def _build_bm25_index(chunks: List[Dict[str, str]]):
+    """Build the BM25 inverted index; cheap enough to rebuild on every start."""
+    index = BM25Index([tokenize(f"{c['title']} {c['content']}") for c in chunks])
+    print(f"[RAG] BM25 index built — {index.n_docs} chunks, {len(index.postings)} terms")
+    return index
+
+
+# ─── Versioned, content-addressed index builds ─────────────────
+#
+# FAISS_INDEX_DIR/
+#   CURRENT                 id of the active build
+#   builds/<id>/            manifest.json, chunks.pkl, embeddings.npy, tfidf.pkl
+#
+# A build id is the hash of everything the index is derived from: source
+# document hashes, chunker parameters and embedding model. A matching build
+# is loaded as-is. Otherwise the sources are re-chunked and only chunks whose
+# content hash is not in the previous build are embedded again. The new
+# build is written to a temporary directory, renamed into place, and CURRENT
+# is replaced atomically, so readers never see a partially written index.
+
+MANIFEST_FORMAT = 2
+BUILDS_KEPT = 2
+
 
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _dense_available() -> bool:
+    """Whether chunk embeddings can be produced here, without loading the model"""
+    return bool(importlib.util.find_spec("faiss") and importlib.util.find_spec("sentence_transformers"))
+
+
+def _index_spec(sources: List[Path]) -> Dict:
+    return {
+        "format": MANIFEST_FORMAT,
+        # In source order, so two files with the same name never share an entry
+        "sources": [[path.name, _sha256(path.read_bytes())] for path in sources],
+        "chunker": {
+            "splitter": _splitter_name(),
+            "chunk_size": CHUNK_SIZE,
+            "chunk_overlap": CHUNK_OVERLAP,
+        },
+        "embedding_model": EMBEDDING_MODEL_NAME if _dense_available() else None,
+    }
+
+
+def _build_id(spec: Dict) -> str:
+    return _sha256(json.dumps(spec, sort_keys=True).encode())[:16]
+
+
+def _build_dir(build_id: str) -> str:
+    return os.path.join(FAISS_INDEX_DIR, "builds", build_id)
+
+
+def _current_build_id() -> Optional[str]:
     try:
-        import faiss
-        _faiss_index = faiss.read_index(index_path)
-        with open(chunks_path, "rb") as f:
-            _chunk_store = pickle.load(f)
-        print(f"[RAG] Loaded persisted FAISS index — {_faiss_index.ntotal} vectors")
-        return True
+        with open(os.path.join(FAISS_INDEX_DIR, "CURRENT"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _set_current_build(build_id: str) -> None:
+    pointer = os.path.join(FAISS_INDEX_DIR, "CURRENT")
+    tmp = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(build_id)
+    os.replace(tmp, pointer)
+
+
+def _read_manifest(build_id: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(_build_dir(build_id), "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _reusable_embeddings(build_id: Optional[str], model: Optional[str]) -> Dict[str, np.ndarray]:
+    """Chunk content hash -> embedding from a previous build made with the same model"""
+    manifest = _read_manifest(build_id) if build_id else None
+    if not manifest or not model or manifest["spec"].get("embedding_model") != model:
+        return {}
+    try:
+        embeddings = np.load(os.path.join(_build_dir(build_id), "embeddings.npy"))
+    except (OSError, ValueError):
+        return {}
+    return dict(zip(manifest["chunk_hashes"], embeddings))
+
+
+def _embed_chunks(chunks: List[Dict[str, str]], hashes: List[str], reusable: Dict[str, np.ndarray]) -> Optional[np.ndarray]:
+    """Embeddings for every chunk, encoding only the ones without a reusable vector"""
+    missing = [i for i, h in enumerate(hashes) if h not in reusable]
+    fresh = embed_texts([chunks[i]["content"] for i in missing]) if missing else np.array([])
+    if missing and fresh.size == 0:
+        return None
+    vectors = dict(reusable)
+    for i, vector in zip(missing, fresh):
+        vectors[hashes[i]] = vector
+    print(f"[RAG] Embedded {len(missing)} new or changed chunks, reused {len(chunks) - len(missing)}")
+    return np.stack([vectors[h] for h in hashes]).astype("float32")
+
+
+def _write_build(build_id: str, spec: Dict, chunks: List[Dict[str, str]], hashes: List[str],
+                 embeddings: Optional[np.ndarray], tfidf: Optional[Dict]) -> None:
+    """Write a build next to the others and make it current"""
+    target = _build_dir(build_id)
+    tmp = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    with open(os.path.join(tmp, "chunks.pkl"), "wb") as f:
+        pickle.dump(chunks, f)
+    if embeddings is not None:
+        np.save(os.path.join(tmp, "embeddings.npy"), embeddings)
+    if tfidf is not None:
+        with open(os.path.join(tmp, "tfidf.pkl"), "wb") as f:
+            pickle.dump(tfidf, f)
+    with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "build_id": build_id,
+            "spec": spec,
+            "chunk_hashes": hashes,
+            "has_embeddings": embeddings is not None,
+            "built_at": datetime.utcnow().isoformat(),
+        }, f, indent=2)
+
+    # A forced rebuild reuses the build id; move the old directory aside so the new one replaces it
+    previous: Optional[str] = f"{target}.{os.getpid()}.old.tmp"
+    try:
+        os.rename(target, previous)
+    except FileNotFoundError:
+        previous = None
+    try:
+        os.rename(tmp, target)
+    except OSError:
+        # Another worker installed the same build meanwhile; builds are content-addressed
+        shutil.rmtree(tmp, ignore_errors=True)
+    if previous:
+        shutil.rmtree(previous, ignore_errors=True)
+    _set_current_build(build_id)
+    _prune_builds(keep={build_id})
+    print(f"[RAG] Index build {build_id} saved to {FAISS_INDEX_DIR}")
+
+
+def _prune_builds(keep: set) -> None:
+    builds_dir = os.path.join(FAISS_INDEX_DIR, "builds")
+    builds = sorted(
+        (entry for entry in os.scandir(builds_dir) if entry.is_dir() and not entry.name.endswith(".tmp")),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in builds[BUILDS_KEPT:]:
+        if entry.name not in keep:
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def _activate(chunks: List[Dict[str, str]], embeddings: Optional[np.ndarray], tfidf: Optional[Dict]) -> None:
+    """Build every in-memory index for a set of chunks, then swap them all in at once"""
+    global _chunk_store, _faiss_index, _tfidf_vectorizer, _tfidf_matrix, _bm25_index
+
+    faiss_index = _build_faiss_index(embeddings) if embeddings is not None else None
+    if tfidf is None:
+        tfidf = _build_tfidf_index(chunks) or {"vectorizer": None, "matrix": None}
+    bm25_index = _build_bm25_index(chunks)
+
+    _chunk_store, _faiss_index, _tfidf_vectorizer, _tfidf_matrix, _bm25_index = (
+        chunks, faiss_index, tfidf["vectorizer"], tfidf["matrix"], bm25_index,
+    )
+
+
+def _load_build(build_id: str) -> bool:
+    """Load a persisted build into memory; False if it is missing or unreadable."""
+    build_dir = _build_dir(build_id)
+    try:
+        with open(os.path.join(build_dir, "chunks.pkl"), "rb") as f:
+            chunks = pickle.load(f)
+        embeddings_path = os.path.join(build_dir, "embeddings.npy")
+        embeddings = np.load(embeddings_path) if os.path.exists(embeddings_path) else None
+        tfidf = None
+        tfidf_path = os.path.join(build_dir, "tfidf.pkl")
+        if os.path.exists(tfidf_path):
+            with open(tfidf_path, "rb") as f:
+                tfidf = pickle.load(f)
     except Exception as e:
-        print(f"[WARN] Could not load persisted index: {e}")
+        print(f"[WARN] Could not load index build {build_id}: {e}")
         return False
 
+    _activate(chunks, embeddings, tfidf)
+    print(f"[RAG] Loaded index build {build_id} — {len(chunks)} chunks")
+    return True
+
+
+def build_knowledge_index(force: bool = False) -> str:
+    """
+    Bring the persisted index up to date with the sources and load it.
+    Returns the id of the active build.
+    """
+    sources = _knowledge_sources()
+    if not sources:
+        return ""
+    spec = _index_spec(sources)
+    build_id = _build_id(spec)
+    current = _current_build_id()
+
+    if not force and _read_manifest(build_id) and _load_build(build_id):
+        if current != build_id:
+            _set_current_build(build_id)
+        return build_id
+
+    chunks = [chunk for path in sources for chunk in _load_and_chunk_document(path)]
+    if not chunks:
+        return ""
+    hashes = [_sha256(chunk["content"].encode()) for chunk in chunks]
+
+    embeddings = None
+    if spec["embedding_model"]:
+        reusable = {} if force else _reusable_embeddings(current, spec["embedding_model"])
+        embeddings = _embed_chunks(chunks, hashes, reusable)
+        if embeddings is None:
+            # The model could not be loaded after all; record the build as lexical only
+            spec["embedding_model"] = None
+            build_id = _build_id(spec)
+
+    tfidf = _build_tfidf_index(chunks)
+    _activate(chunks, embeddings, tfidf)
+    try:
+        _write_build(build_id, spec, chunks, hashes, embeddings, tfidf)
+    except OSError as e:
+        print(f"[WARN] Could not save index: {e}")
+    return build_id
+
 
 # ═══════════════════════════════════════════════════════════════
 #  SECTION 4 — PUBLIC API: load_knowledge_base, search_chunks
@@ -249,104 +699,208 @@ def _load_index_from_disk() -> bool:
 
 def load_knowledge_base() -> List[Dict[str, str]]:
     """
-    Main entry-point: loads the knowledge base, builds the FAISS index.
-    Called once at application startup.
+    Main entry-point: loads the knowledge base and its FAISS, TF-IDF and
+    BM25 indexes, rebuilding whatever the sources no longer match.
+    The app calls it once from start_background_load(); scripts call it
+    directly.
     """
-    global _kb_loaded, _chunk_store
-
-    if _kb_loaded and _chunk_store:
+    global _kb_loaded, _kb_state, _kb_error, _kb_load_seconds
+
+    with _kb_lock:
+        if _kb_loaded and _chunk_store:
+            return _chunk_store
+
+        _kb_state = "loading"
+        started = time.perf_counter()
+        try:
+            if build_knowledge_index():
+                _kb_loaded = True
+            if _faiss_index is not None:
+                _get_embedder()  # load the query model now rather than on the first question
+        except Exception as e:
+            _kb_state, _kb_error = "failed", f"{type(e).__name__}: {e}"
+            print(f"[ERROR] Knowledge base failed to load: {_kb_error}")
+            return _chunk_store
+        _kb_load_seconds = time.perf_counter() - started
+        _kb_state = "ready" if _kb_loaded else "failed"
+        if not _kb_loaded:
+            _kb_error = "knowledge base sources not found"
+        startup_profile.record_phase("knowledge_base", _kb_load_seconds)
+        if startup_profile.ENABLED:
+            startup_profile.log_report()
         return _chunk_store
 
-    # Try loading pre-built index from disk first
-    if _load_index_from_disk():
-        _kb_loaded = True
-        return _chunk_store
 
-    # Build fresh
-    chunks = _load_and_chunk_document()
-    if not chunks:
-        return []
+def start_background_load() -> None:
+    """Load the knowledge base on a daemon thread so the app can serve requests meanwhile"""
+    global _kb_thread, _kb_state
+
+    with _kb_lock:
+        if _kb_thread is not None or _kb_loaded:
+            return
+        _kb_state = "loading"
+        _kb_thread = threading.Thread(target=load_knowledge_base, name="knowledge-base-loader", daemon=True)
+        _kb_thread.start()
+
+
+def wait_until_loaded(timeout: Optional[float] = None) -> bool:
+    """Block until a background load started by start_background_load() finishes"""
+    thread = _kb_thread
+    if thread is not None:
+        thread.join(timeout)
+    return knowledge_base_ready()
+
 
-    _build_faiss_index(chunks)
-    _kb_loaded = True
-    return _chunk_store
+def knowledge_base_ready() -> bool:
+    return _kb_state == "ready"
 
 
-def search_chunks(query: str, top_k: int = None) -> List[Dict[str, str]]:
+def knowledge_base_status() -> dict:
+    return {
+        "state": _kb_state,
+        "chunks": len(_chunk_store),
+        "load_seconds": round(_kb_load_seconds, 3) if _kb_load_seconds is not None else None,
+        "error": _kb_error,
+        "dense": _faiss_index is not None,
+    }
+
+
+def search_chunks(query: str, top_k: int = None, mode: str = None) -> List[Dict[str, str]]:
     """
-    Semantic search: embed the query and retrieve top-k most similar
-    chunks from the FAISS index.
-    Falls back to TF-IDF / keyword search if FAISS is unavailable.
+    Retrieve the top-k chunks for a query. `mode` or RAG_RETRIEVAL picks
+    the method: "hybrid" fuses the dense FAISS ranking (TF-IDF when no
+    embedding model is available) with the BM25 ranking, "dense" (FAISS,
+    falling back to TF-IDF), "tfidf" or "bm25". "auto" is hybrid when the
+    FAISS index is loaded and bm25 otherwise.
     """
     if top_k is None:
         top_k = TOP_K
+    mode = mode or RETRIEVAL_MODE
 
-    if not _chunk_store:
+    if _kb_state == "not_started":
         load_knowledge_base()
 
-    if not _chunk_store:
-        return []
-
-    # ── FAISS path (primary) ──
-    if _faiss_index is not None:
-        query_vec = embed_texts([query])
-        if query_vec.size == 0:
-            return _tfidf_fallback_search(query, top_k)
-
-        scores, indices = _faiss_index.search(query_vec, min(top_k, _faiss_index.ntotal))
-        results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < 0:
-                continue
-            if score < SIMILARITY_THRESHOLD:
-                continue
-            results.append({
-                "title": _chunk_store[idx]["title"],
-                "content": _chunk_store[idx]["content"],
-                "score": float(score),
-            })
-        return results
+    if not _kb_loaded:
+        # Still loading in the background (or failed): plain keyword overlap
+        return _keyword_fallback(query, top_k)
+
+    if mode == "auto":
+        mode = "hybrid" if _faiss_index is not None else "bm25"
+
+    if mode == "bm25":
+        ranking = _bm25_ranking(query, top_k)
+    elif mode == "tfidf":
+        ranking = _tfidf_ranking(query, top_k)
+    elif mode == "dense":
+        ranking = _dense_ranking(query, top_k)
+        if ranking is None:
+            ranking = _tfidf_ranking(query, top_k)
+    else:
+        ranking = _hybrid_ranking(query, top_k)
+
+    if ranking is None:
+        ranking = _bm25_ranking(query, top_k)
+
+    return [
+        {
+            "title": _chunk_store[idx]["title"],
+            "content": _chunk_store[idx]["content"],
+            "score": score,
+        }
+        for idx, score in ranking
+    ]
 
-    # ── Fallback: TF-IDF ──
-    return _tfidf_fallback_search(query, top_k)
 
+def _keyword_fallback(query: str, top_k: int) -> List[Dict[str, str]]:
+    """Word-overlap search over regex-chunked sources; needs no index and no heavy imports."""
+    global _fallback_chunks
 
-def _tfidf_fallback_search(query: str, top_k: int) -> List[Dict[str, str]]:
-    """TF-IDF based search when FAISS is not available."""
-    try:
-        from sklearn.feature_extraction.text import TfidfVectorizer
-        from sklearn.metrics.pairwise import cosine_similarity
-
-        corpus = [c["content"] for c in _chunk_store]
-        vectorizer = TfidfVectorizer(stop_words="english", max_features=5000, ngram_range=(1, 2))
-        tfidf_matrix = vectorizer.fit_transform(corpus)
-        query_vec = vectorizer.transform([query])
-        scores = cosine_similarity(query_vec, tfidf_matrix).flatten()
-        top_indices = scores.argsort()[-top_k:][::-1]
-        results = []
-        for idx in top_indices:
-            if scores[idx] > 0.01:
-                results.append({
-                    "title": _chunk_store[idx]["title"],
-                    "content": _chunk_store[idx]["content"],
-                    "score": float(scores[idx]),
-                })
-        return results
-    except ImportError:
-        # Pure keyword fallback
-        query_words = set(query.lower().split())
-        scored = []
-        for chunk in _chunk_store:
-            content_words = set(chunk["content"].lower().split())
-            overlap = len(query_words & content_words)
-            if overlap > 0:
-                scored.append((overlap, chunk))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [
-            {"title": c["title"], "content": c["content"], "score": s}
-            for s, c in scored[:top_k]
+    if _fallback_chunks is None:
+        _fallback_chunks = [
+            chunk for path in _knowledge_sources() for chunk in _fallback_chunk(path.read_text(encoding="utf-8"))
         ]
 
+    query_words = set(tokenize(query))
+    scored = []
+    for chunk in _fallback_chunks:
+        overlap = len(query_words & set(tokenize(f"{chunk['title']} {chunk['content']}")))
+        if overlap > 0:
+            scored.append((overlap, chunk))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [
+        {"title": chunk["title"], "content": chunk["content"], "score": float(overlap)}
+        for overlap, chunk in scored[:top_k]
+    ]
+
+
+# Rankings are [(chunk index, score)] best first, already filtered for relevance.
+# Each returns None when its index is not available.
+
+def _top(scores: np.ndarray, top_k: int, min_score: float) -> List[Tuple[int, float]]:
+    top_k = min(top_k, scores.shape[0])
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k] if top_k else []
+    ranked = sorted(candidates, key=lambda idx: -scores[idx])
+    return [(int(idx), float(scores[idx])) for idx in ranked if scores[idx] > min_score]
+
+
+def _dense_ranking(query: str, top_k: int) -> Optional[List[Tuple[int, float]]]:
+    if _faiss_index is None:
+        return None
+    query_vec = embed_query(query)
+    if query_vec is None:
+        return None
+
+    scores, indices = _faiss_index.search(query_vec.reshape(1, -1), min(top_k, _faiss_index.ntotal))
+    return [
+        (int(idx), float(score))
+        for score, idx in zip(scores[0], indices[0])
+        if idx >= 0 and score >= SIMILARITY_THRESHOLD
+    ]
+
+
+def _tfidf_ranking(query: str, top_k: int) -> Optional[List[Tuple[int, float]]]:
+    """TF-IDF cosine similarity over the index fitted in load_knowledge_base."""
+    if _tfidf_vectorizer is None:
+        return None
+    query_vec = _tfidf_vectorizer.transform([query])
+    scores = (_tfidf_matrix @ query_vec.T).toarray().ravel()
+    return _top(scores, top_k, 0.01)
+
+
+def _bm25_ranking(query: str, top_k: int) -> Optional[List[Tuple[int, float]]]:
+    if _bm25_index is None:
+        return None
+    return _top(_bm25_index.scores(query), top_k, 0.0)
+
+
+def _hybrid_ranking(query: str, top_k: int) -> Optional[List[Tuple[int, float]]]:
+    # Fuse deeper candidate lists than we return so agreement below the top-k still counts
+    depth = max(top_k * 4, 20)
+    semantic = _dense_ranking(query, depth)
+    if semantic is None:
+        semantic = _tfidf_ranking(query, depth)
+    rankings = [r for r in (semantic, _bm25_ranking(query, depth)) if r is not None]
+    if not rankings:
+        return None
+    return reciprocal_rank_fusion(rankings)[:top_k]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[int, float]]], k: int = None) -> List[Tuple[int, float]]:
+    """
+    Merge rankings by summing 1 / (k + rank) per chunk. Scores are scaled so
+    a chunk ranked first by every method scores 1.0.
+    """
+    k = RRF_K if k is None else k
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, (idx, _) in enumerate(ranking, 1):
+            fused[idx] += 1.0 / (k + rank)
+    best_possible = len(rankings) / (k + 1)
+    return sorted(
+        ((idx, round(score / best_possible, 4)) for idx, score in fused.items()),
+        key=lambda item: -item[1],
+    )
+
 
 # ═══════════════════════════════════════════════════════════════
 #  SECTION 5 — BOUNDARY / GUARDRAIL — Scope Classifier
@@ -421,9 +975,9 @@ def is_in_scope(query: str) -> Tuple[bool, float]:
     # Semantic check — if FAISS is available, check if the query has
     # reasonable similarity to any knowledge chunk
     if _faiss_index is not None:
-        query_vec = embed_texts([query_lower])
-        if query_vec.size > 0:
-            scores, _ = _faiss_index.search(query_vec, 1)
+        query_vec = embed_query(query_lower)
+        if query_vec is not None:
+            scores, _ = _faiss_index.search(query_vec.reshape(1, -1), 1)
             best_score = float(scores[0][0]) if scores.size > 0 else 0.0
             if best_score >= SIMILARITY_THRESHOLD:
                 return (True, best_score)
@@ -447,6 +1001,8 @@ INTENT_KEYWORDS = {
     "guide": ["how to", "use", "application", "app", "what is", "explain", "guide", "help", "feature", "module"],
 }
 
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
 MONTH_MAP = {
     "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3,
     "apr": 4, "april": 4, "may": 5, "jun": 6, "june": 6,
@@ -518,40 +1074,28 @@ def get_user_context(db: Session, user_id: int, query: str) -> Dict[str, any]:
             models.Habit.is_active == True,
         ).all()
 
-        habits_data = []
-        for h in habits:
-            # Get recent logs (last 30 days)
-            thirty_days_ago = date.today() - timedelta(days=30)
-            logs = db.query(models.HabitLog).filter(
-                models.HabitLog.habit_id == h.id,
-                models.HabitLog.date >= thirty_days_ago,
-            ).all()
-
-            completed_count = sum(1 for l in logs if l.completed)
-            total_days = 30
-
-            # Current streak
-            streak = 0
-            check_date = date.today()
-            while True:
-                log = db.query(models.HabitLog).filter(
-                    models.HabitLog.habit_id == h.id,
-                    models.HabitLog.date == check_date,
-                    models.HabitLog.completed == True,
-                ).first()
-                if log:
-                    streak += 1
-                    check_date -= timedelta(days=1)
-                else:
-                    break
+        # One calendar matrix covers every habit: the last 30 days plus today
+        today = date.today()
+        window_start = today - timedelta(days=30)
+        matrix = habit_calendar.load_matrix(db, [h.id for h in habits], window_start, today)
+        completed_counts = matrix.sum(axis=1)
+        streaks = habit_calendar.current_streaks(matrix)
+        rates_7d = habit_calendar.rolling_completion_rates(matrix, 7)[:, -1]
+        weekday_rates = habit_calendar.weekday_rates(matrix, window_start)
+        total_days = 30
 
+        habits_data = []
+        for row, h in enumerate(habits):
+            completed_count = int(completed_counts[row])
             habits_data.append({
                 "name": h.name,
                 "description": h.description,
                 "icon": h.icon,
-                "current_streak": streak,
+                "current_streak": int(streaks[row]),
                 "completion_rate_30d": round((completed_count / total_days) * 100, 1),
+                "completion_rate_7d": float(rates_7d[row]),
                 "completed_last_30_days": completed_count,
+                "best_weekday": WEEKDAY_NAMES[int(weekday_rates[row].argmax())] if completed_count else None,
                 "target_days_per_week": h.target_days,
                 "created_at": str(h.created_at),
             })
@@ -595,7 +1139,7 @@ def get_user_context(db: Session, user_id: int, query: str) -> Dict[str, any]:
 
         expenses = db.query(models.Expense).filter(
             models.Expense.user_id == user_id,
-        ).order_by(models.Expense.date.desc()).limit(30).all()
+        ).order_by(models.Expense.date.desc()).limit(15).all()
 
         monthly_budget = db.query(models.MonthlyBudget).filter(
             models.MonthlyBudget.user_id == user_id,
@@ -603,7 +1147,8 @@ def get_user_context(db: Session, user_id: int, query: str) -> Dict[str, any]:
             models.MonthlyBudget.year == target_year,
         ).first()
 
-        total_spent = sum(e.amount for e in expenses if e.date.month == target_month and e.date.year == target_year)
+        month_start, month_end = rollups.month_range(target_month, target_year)
+        total_spent = rollups.total_spent(db, user_id, month_start, month_end)
 
         context["data"]["expenses"] = {
             "monthly_budget": monthly_budget.amount if monthly_budget else None,
@@ -634,23 +1179,15 @@ def get_user_context(db: Session, user_id: int, query: str) -> Dict[str, any]:
         ]
 
     if "checkins" in intents:
-        # Get check-in data
-        checkins = db.query(models.DailyCheckIn).filter(
-            models.DailyCheckIn.user_id == user_id,
-        ).order_by(models.DailyCheckIn.check_in_date.desc()).limit(90).all()
-
-        # Calculate streak
-        streak = 0
-        check_date = date.today()
-        checkin_dates = {c.check_in_date for c in checkins}
-        while check_date in checkin_dates:
-            streak += 1
-            check_date -= timedelta(days=1)
+        # Streak and total from the materialized check-in state, recent days from the rollups
+        stats = crud.get_checkin_stats(db, user_id)
+        recent_checkins = rollups.checkin_dates(db, user_id, date.today() - timedelta(days=89), date.today())
 
         context["data"]["checkins"] = {
-            "total": len(checkins),
-            "current_streak": streak,
-            "recent_dates": [str(c.check_in_date) for c in checkins[:30]],
+            "total": stats["total_checkins"],
+            "current_streak": stats["current_streak"],
+            "longest_streak": stats["longest_streak"],
+            "recent_dates": [str(d) for d in reversed(recent_checkins[-30:])],
         }
 
     return context
@@ -718,8 +1255,11 @@ IMPORTANT RULES:
             user_data_context += "\nHabits:\n"
             for h in data["habits"]:
                 user_data_context += f"- {h['icon']} {h['name']}: streak {h['current_streak']} days, "
-                user_data_context += f"30-day rate {h['completion_rate_30d']}%, "
-                user_data_context += f"target {h['target_days_per_week']} days/week\n"
+                user_data_context += f"30-day rate {h['completion_rate_30d']}% (last 7 days {h['completion_rate_7d']}%), "
+                user_data_context += f"target {h['target_days_per_week']} days/week"
+                if h.get("best_weekday"):
+                    user_data_context += f", strongest on {h['best_weekday']}"
+                user_data_context += "\n"
 
         if "journal" in data and data["journal"]:
             user_data_context += "\nRecent Journal Entries:\n"
@@ -743,7 +1283,7 @@ IMPORTANT RULES:
 
         if "checkins" in data:
             ci = data["checkins"]
-            user_data_context += f"\nCheck-ins: {ci['total']} total, current streak {ci['current_streak']} days\n"
+            user_data_context += f"\nCheck-ins: {ci['total']} total, current streak {ci['current_streak']} days, longest {ci['longest_streak']} days\n"
 
     prompt = f"""<s>[INST] {system}{guide_context}{user_data_context}
 
@@ -0,0 +1,243 @@
+"""
+Semantic cache for chatbot replies.
+
+Replies are grouped per user and per data fingerprint: a hash of the user's
+data generation, today's date and whatever parts of the question decide
+which data goes into the prompt (intents, month reference). Inside a group,
+a question matches a cached one when their normalized query embeddings
+have cosine similarity >= CHAT_CACHE_SIMILARITY, found with a FAISS
+inner-product index (NumPy when faiss is not installed). Without an
+embedding model only identical normalized questions match.
+
+crud write paths call invalidate_user() after committing. That bumps the
+user's generation, so every fingerprint computed before the write stops
+matching, and drops the user's cached replies. The cache is per process:
+with several workers, CHAT_CACHE_TTL_SECONDS bounds how long another
+worker can serve a reply computed before a write.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from .config import get_settings
+
+settings = get_settings()
+
+
+class CacheKey(NamedTuple):
+    user_id: int
+    generation: int
+    fingerprint: str
+
+
+class CachedReply(NamedTuple):
+    reply: str
+    sources: List[str]
+
+
+class _Entry:
+    __slots__ = ("key", "text", "reply", "sources", "expires_at")
+
+    def __init__(self, key: CacheKey, text: str, reply: str, sources: List[str], expires_at: float):
+        self.key = key
+        self.text = text
+        self.reply = reply
+        self.sources = sources
+        self.expires_at = expires_at
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", text.lower()).strip().rstrip("?!. ")
+
+
+def _import_faiss():
+    try:
+        import faiss
+        return faiss
+    except ImportError:
+        return None
+
+
+class _Group:
+    """Cached questions for one CacheKey, searchable by text and by embedding"""
+
+    def __init__(self):
+        self.by_text: Dict[str, int] = {}
+        self.vectors: Dict[int, np.ndarray] = {}
+        self._index = None
+
+    def add(self, entry_id: int, text: str, vector: Optional[np.ndarray], faiss) -> None:
+        self.by_text[text] = entry_id
+        if vector is None:
+            return
+        self.vectors[entry_id] = vector
+        if faiss is not None:
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[0]))
+            self._index.add_with_ids(vector.reshape(1, -1), np.array([entry_id], dtype="int64"))
+
+    def remove(self, entry_id: int, text: str) -> None:
+        if self.by_text.get(text) == entry_id:
+            del self.by_text[text]
+        if self.vectors.pop(entry_id, None) is not None and self._index is not None:
+            self._index.remove_ids(np.array([entry_id], dtype="int64"))
+
+    def search(self, text: str, vector: Optional[np.ndarray], threshold: float) -> Optional[int]:
+        """Entry id of an identical question, else of the most similar one above threshold"""
+        if text in self.by_text:
+            return self.by_text[text]
+        if vector is None or not self.vectors:
+            return None
+        if self._index is not None:
+            scores, ids = self._index.search(vector.reshape(1, -1), 1)
+            best_score, best_id = float(scores[0][0]), int(ids[0][0])
+        else:
+            entry_ids = list(self.vectors)
+            scores = np.stack([self.vectors[i] for i in entry_ids]) @ vector
+            best = int(scores.argmax())
+            best_score, best_id = float(scores[best]), entry_ids[best]
+        return best_id if best_id >= 0 and best_score >= threshold else None
+
+    def __len__(self) -> int:
+        return len(self.by_text)
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, similarity_threshold: float, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.enabled = enabled and max_entries > 0
+        self._lock = threading.Lock()
+        self._faiss_module = None  # imported on the first store, not at startup
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()  # least recently used first
+        self._groups: Dict[CacheKey, _Group] = {}
+        self._generations: Dict[int, int] = {}
+        self._next_id = 0
+        self.reset_metrics()
+
+    def reset_metrics(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    # ─── Keys ───────────────────────────────────────────────────
+
+    def key_for(self, user_id: int, *parts) -> CacheKey:
+        """Group key for a user's question; parts are whatever selects the prompt's user data"""
+        with self._lock:
+            generation = self._generations.get(user_id, 0)
+        payload = json.dumps([generation, date.today().isoformat(), *parts], sort_keys=True, default=str)
+        return CacheKey(user_id, generation, hashlib.sha256(payload.encode()).hexdigest()[:16])
+
+    # ─── Lookup / store ─────────────────────────────────────────
+
+    def get(self, key: CacheKey, query: str, vector: Optional[np.ndarray] = None) -> Optional[CachedReply]:
+        if not self.enabled:
+            return None
+        text = normalize_query(query)
+        with self._lock:
+            group = self._groups.get(key)
+            entry_id = group.search(text, vector, self.similarity_threshold) if group else None
+            entry = self._entries.get(entry_id) if entry_id is not None else None
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(entry_id)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return CachedReply(entry.reply, list(entry.sources))
+
+    def put(self, key: CacheKey, query: str, vector: Optional[np.ndarray], reply: str, sources: List[str]) -> None:
+        if not self.enabled:
+            return
+        text = normalize_query(query)
+        with self._lock:
+            if self._generations.get(key.user_id, 0) != key.generation:
+                return  # the user's data changed while this reply was being generated
+
+            group = self._groups.setdefault(key, _Group())
+            if text in group.by_text:
+                self._remove(group.by_text[text])
+                group = self._groups.setdefault(key, _Group())
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(key, text, reply, list(sources), time.monotonic() + self.ttl_seconds)
+            group.add(entry_id, text, vector, self._faiss() if vector is not None else None)
+            self.stores += 1
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Forget a user's replies; call after a write that changes their data commits"""
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            stale = [entry_id for entry_id, entry in self._entries.items() if entry.key.user_id == user_id]
+            for entry_id in stale:
+                self._remove(entry_id)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def _faiss(self):
+        if self._faiss_module is None:
+            self._faiss_module = _import_faiss() or False
+        return self._faiss_module or None
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        group = self._groups.get(entry.key)
+        if group is not None:
+            group.remove(entry_id, entry.text)
+            if not len(group):
+                del self._groups[entry.key]
+
+    # ─── Metrics ────────────────────────────────────────────────
+
+    def status(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold,
+                "vector_search": "faiss" if self._faiss_module else "numpy",
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+response_cache = ResponseCache(
+    max_entries=settings.CHAT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.CHAT_CACHE_TTL_SECONDS,
+    similarity_threshold=settings.CHAT_CACHE_SIMILARITY,
+    enabled=settings.CHAT_CACHE_ENABLED,
+)
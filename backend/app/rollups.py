@@ -0,0 +1,313 @@
+"""
+Per-user daily rollups.
+
+user_daily_rollups keeps one row per user per day with the aggregates the
+dashboard, profile and chatbot read: habits completed, active habits,
+check-in, amount spent and daily budget. crud adjusts the rows inside the
+same transaction as each write, so aggregate reads cost O(days in window)
+instead of scanning raw habit logs, check-ins and expenses.
+"""
+
+from bisect import bisect_right
+from datetime import date, timedelta
+from typing import Callable, Dict, Optional, Set
+
+from sqlalchemy import event, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models, habit_calendar
+
+# Users whose rollups are known to be committed in this process (skips the backfill check)
+_backfilled_users: Set[int] = set()
+_PENDING_BACKFILLS = "rollups_pending_backfills"  # session.info key: users backfilled in the open transaction
+
+
+@event.listens_for(Session, "after_commit")
+def _backfills_committed(session: Session) -> None:
+    _backfilled_users.update(session.info.pop(_PENDING_BACKFILLS, ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _backfills_rolled_back(session: Session) -> None:
+    session.info.pop(_PENDING_BACKFILLS, None)
+
+
+def _count_active_habits(db: Session, user_id: int) -> int:
+    return db.query(func.count(models.Habit.id)).filter(
+        models.Habit.user_id == user_id,
+        models.Habit.is_active == True
+    ).scalar() or 0
+
+
+def _active_habits_on(db: Session, user_id: int) -> Callable[[date], int]:
+    """
+    Active habit count per day: today it is the current count, for a past
+    day the currently active habits created on or before it. Deactivation
+    dates are not recorded, so a habit deactivated since is not counted on
+    the days it was still active.
+    """
+    created_at = [created for (created,) in db.query(models.Habit.created_at).filter(
+        models.Habit.user_id == user_id,
+        models.Habit.is_active == True
+    ).all()]
+    undated = sum(1 for created in created_at if created is None)
+    created = sorted(created.date() for created in created_at if created is not None)
+    today = date.today()
+    return lambda day: len(created_at) if day >= today else undated + bisect_right(created, day)
+
+
+def _new_row(user_id: int, day: date, active_habits: int) -> models.UserDailyRollup:
+    return models.UserDailyRollup(
+        user_id=user_id,
+        date=day,
+        habits_completed=0,
+        active_habits=active_habits,
+        checked_in=False,
+        amount_spent=0.0,
+        daily_budget=None
+    )
+
+
+# ─── Rebuild / backfill ─────────────────────────────────────────
+
+def rebuild_rollups(db: Session, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> int:
+    """
+    Recompute a user's rollups from the raw tables, optionally limited to a
+    date range. Does not commit; callers decide the transaction boundary.
+    """
+    def in_range(column, query):
+        if start_date:
+            query = query.filter(column >= start_date)
+        if end_date:
+            query = query.filter(column <= end_date)
+        return query
+
+    completions = in_range(models.HabitLog.date, db.query(
+        models.HabitLog.date, func.count(models.HabitLog.id)
+    ).join(models.Habit).filter(
+        models.Habit.user_id == user_id,
+        models.Habit.is_active == True,
+        models.HabitLog.completed == True
+    )).group_by(models.HabitLog.date).all()
+
+    checkins = in_range(models.DailyCheckIn.check_in_date, db.query(
+        models.DailyCheckIn.check_in_date
+    ).filter(models.DailyCheckIn.user_id == user_id)).distinct().all()
+
+    spending = in_range(models.Expense.date, db.query(
+        models.Expense.date, func.sum(models.Expense.amount)
+    ).filter(models.Expense.user_id == user_id)).group_by(models.Expense.date).all()
+
+    budgets = in_range(models.DailyBudget.date, db.query(
+        models.DailyBudget.date, models.DailyBudget.amount
+    ).filter(models.DailyBudget.user_id == user_id)).all()
+
+    in_range(models.UserDailyRollup.date, db.query(models.UserDailyRollup).filter(
+        models.UserDailyRollup.user_id == user_id
+    )).delete(synchronize_session=False)
+
+    active_habits = _active_habits_on(db, user_id)
+    rows: Dict[date, models.UserDailyRollup] = {}
+
+    def row(day: date) -> models.UserDailyRollup:
+        if day not in rows:
+            rows[day] = _new_row(user_id, day, active_habits(day))
+        return rows[day]
+
+    for day, count in completions:
+        row(day).habits_completed = count
+    for (day,) in checkins:
+        row(day).checked_in = True
+    for day, amount in spending:
+        row(day).amount_spent = amount or 0.0
+    for day, amount in budgets:
+        row(day).daily_budget = amount
+
+    db.add_all(rows.values())
+    db.flush()
+    return len(rows)
+
+
+def backfill_rollups(db: Session, user_id: int) -> int:
+    """Rebuild a user's whole history and record that it is complete. Does not commit."""
+    days = rebuild_rollups(db, user_id)
+    if db.get(models.RollupBackfill, user_id) is None:
+        db.add(models.RollupBackfill(user_id=user_id))
+    return days
+
+
+def rebuild_range(db: Session, user_id: int, start_date: date, end_date: date) -> None:
+    """Recompute the days a bulk write touched; a user not backfilled yet gets their whole history"""
+    if not _ensure_backfilled(db, user_id):
+        rebuild_rollups(db, user_id, start_date, end_date)
+
+
+def _ensure_backfilled(db: Session, user_id: int) -> bool:
+    """
+    Build rollups for users that predate them. Pending changes are flushed
+    first so the rebuild already reflects them; returns True if it ran.
+    Completion is recorded by a rollup_backfills row, not by rows existing,
+    since a ranged rebuild can leave a user with only some days. It only
+    counts as done for the process once its transaction commits, so a
+    rollback leaves the user to be checked again.
+    """
+    pending = db.info.setdefault(_PENDING_BACKFILLS, set())
+    if user_id in _backfilled_users or user_id in pending:
+        return False
+    db.flush()
+    if db.get(models.RollupBackfill, user_id) is not None:
+        _backfilled_users.add(user_id)
+        return False
+    backfill_rollups(db, user_id)
+    pending.add(user_id)
+    return True
+
+
+# ─── Incremental updates (called from crud write paths) ─────────
+
+def _row_for_update(db: Session, user_id: int, day: date) -> Optional[models.UserDailyRollup]:
+    """The row to adjust, or None when a backfill just recomputed everything"""
+    if _ensure_backfilled(db, user_id):
+        return None
+
+    for pending in db.new:
+        if isinstance(pending, models.UserDailyRollup) and pending.user_id == user_id and pending.date == day:
+            return pending
+
+    rollup = db.query(models.UserDailyRollup).filter(
+        models.UserDailyRollup.user_id == user_id,
+        models.UserDailyRollup.date == day
+    ).first()
+    if rollup is None:
+        rollup = _new_row(user_id, day, _active_habits_on(db, user_id)(day))
+        db.add(rollup)
+    return rollup
+
+
+def adjust_habits_completed(db: Session, user_id: int, day: date, delta: int) -> None:
+    rollup = _row_for_update(db, user_id, day)
+    if rollup is not None:
+        rollup.habits_completed = max((rollup.habits_completed or 0) + delta, 0)
+
+
+def set_checked_in(db: Session, user_id: int, day: date) -> None:
+    rollup = _row_for_update(db, user_id, day)
+    if rollup is not None:
+        rollup.checked_in = True
+
+
+def adjust_amount_spent(db: Session, user_id: int, day: date, delta: float) -> None:
+    rollup = _row_for_update(db, user_id, day)
+    if rollup is not None:
+        rollup.amount_spent = (rollup.amount_spent or 0.0) + delta
+
+
+def set_daily_budget(db: Session, user_id: int, day: date, amount: float) -> None:
+    rollup = _row_for_update(db, user_id, day)
+    if rollup is not None:
+        rollup.daily_budget = amount
+
+
+def refresh_active_habits(db: Session, user_id: int) -> None:
+    """Record today's active habit count after habits are added, removed or (de)activated"""
+    db.flush()
+    rollup = _row_for_update(db, user_id, date.today())
+    if rollup is not None:
+        rollup.active_habits = _count_active_habits(db, user_id)
+
+
+def apply_habit_activation(db: Session, user_id: int, habit_id: int, active: bool) -> None:
+    """Add or remove one habit's completions when it becomes active or inactive"""
+    if _ensure_backfilled(db, user_id):
+        return
+
+    calendar = db.query(models.HabitCalendar).filter(models.HabitCalendar.habit_id == habit_id).first()
+    if calendar is None:
+        calendar = habit_calendar.rebuild_calendars(db, [habit_id]).get(habit_id)
+    days = habit_calendar.decode_days(calendar) if calendar is not None else []
+    if not days:
+        return
+
+    db.flush()
+    existing = {
+        row.date: row
+        for row in db.query(models.UserDailyRollup).filter(
+            models.UserDailyRollup.user_id == user_id,
+            models.UserDailyRollup.date >= days[0],
+            models.UserDailyRollup.date <= days[-1]
+        ).all()
+    }
+    active_habits = _active_habits_on(db, user_id)
+    delta = 1 if active else -1
+    for day in days:
+        rollup = existing.get(day)
+        if rollup is None:
+            rollup = _new_row(user_id, day, active_habits(day))
+            db.add(rollup)
+        rollup.habits_completed = max((rollup.habits_completed or 0) + delta, 0)
+
+
+# ─── Reads ──────────────────────────────────────────────────────
+
+def _prepare_read(db: Session, user_id: int) -> None:
+    try:
+        if _ensure_backfilled(db, user_id):
+            db.commit()
+    except IntegrityError:
+        # Another request backfilled this user first
+        db.rollback()
+
+
+def get_rollups(db: Session, user_id: int, start_date: date, end_date: date) -> Dict[date, models.UserDailyRollup]:
+    """Rollup rows keyed by date; days without activity have no row"""
+    _prepare_read(db, user_id)
+    rows = db.query(models.UserDailyRollup).filter(
+        models.UserDailyRollup.user_id == user_id,
+        models.UserDailyRollup.date >= start_date,
+        models.UserDailyRollup.date <= end_date
+    ).all()
+    return {row.date: row for row in rows}
+
+
+def total_spent(db: Session, user_id: int, start_date: date, end_date: date) -> float:
+    _prepare_read(db, user_id)
+    return db.query(func.sum(models.UserDailyRollup.amount_spent)).filter(
+        models.UserDailyRollup.user_id == user_id,
+        models.UserDailyRollup.date >= start_date,
+        models.UserDailyRollup.date <= end_date
+    ).scalar() or 0.0
+
+
+def checkin_dates(db: Session, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> list[date]:
+    """Checked-in days in ascending order"""
+    _prepare_read(db, user_id)
+    query = db.query(models.UserDailyRollup.date).filter(
+        models.UserDailyRollup.user_id == user_id,
+        models.UserDailyRollup.checked_in == True
+    )
+    if start_date:
+        query = query.filter(models.UserDailyRollup.date >= start_date)
+    if end_date:
+        query = query.filter(models.UserDailyRollup.date <= end_date)
+    return [day for (day,) in query.order_by(models.UserDailyRollup.date).all()]
+
+
+def count_checkins(db: Session, user_id: int, start_date: Optional[date] = None, end_date: Optional[date] = None) -> int:
+    _prepare_read(db, user_id)
+    query = db.query(func.count(models.UserDailyRollup.id)).filter(
+        models.UserDailyRollup.user_id == user_id,
+        models.UserDailyRollup.checked_in == True
+    )
+    if start_date:
+        query = query.filter(models.UserDailyRollup.date >= start_date)
+    if end_date:
+        query = query.filter(models.UserDailyRollup.date <= end_date)
+    return query.scalar() or 0
+
+
+def month_range(month: int, year: int) -> tuple[date, date]:
+    """First and last day of a month"""
+    start_date = date(year, month, 1)
+    next_month = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start_date, next_month - timedelta(days=1)
@@ -1,36 +1,50 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from typing import List
 from .. import crud, schemas, models
-from ..database import get_db
-from ..auth import create_access_token, get_current_user
+from ..database import get_async_db
+from ..auth import create_access_token, get_current_user, user_token_claims
 from ..config import get_settings
+from ..password_hasher import PasswordHasherBusy, password_hasher
 
 router = APIRouter()
 settings = get_settings()
 
 
+def _hasher_busy(e: PasswordHasherBusy) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many sign-in attempts right now, please try again shortly",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
 @router.post("/register", response_model=schemas.UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
     try:
-        db_user = crud.get_user_by_email(db, email=user.email)
+        db_user = await db.run_sync(crud.get_user_by_email, email=user.email)
         if db_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
         
-        db_user = crud.get_user_by_username(db, username=user.username)
+        db_user = await db.run_sync(crud.get_user_by_username, username=user.username)
         if db_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Username already taken"
             )
         
-        return crud.create_user(db=db, user=user)
+        # bcrypt is CPU-bound; hash on the dedicated pool to keep the event loop free
+        try:
+            hashed_password = await password_hasher.hash(user.password)
+        except PasswordHasherBusy as e:
+            raise _hasher_busy(e)
+        return await db.run_sync(crud.create_user, user=user, hashed_password=hashed_password)
     except HTTPException:
         raise
     except Exception as e:
@@ -43,12 +57,21 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Authenticate user and return JWT token"""
     from datetime import date
-    from ..models import DailyCheckIn
     
-    user = crud.authenticate_user(db, form_data.username, form_data.password)
+    user = await db.run_sync(crud.get_user_by_username, form_data.username)
+    if user:
+        try:
+            valid, new_hash = await password_hasher.verify(form_data.password, user.hashed_password)
+        except PasswordHasherBusy as e:
+            raise _hasher_busy(e)
+        if not valid:
+            user = None
+        elif new_hash:
+            # Stored with an older BCRYPT_ROUNDS; replace it now that we know the password
+            await db.run_sync(crud.update_password_hash, user.id, new_hash)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -57,28 +80,16 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
         )
     
     # Auto-record daily check-in on login
-    today = date.today()
-    existing_checkin = db.query(DailyCheckIn).filter(
-        DailyCheckIn.user_id == user.id,
-        DailyCheckIn.check_in_date == today
-    ).first()
-    
-    if not existing_checkin:
-        checkin = DailyCheckIn(
-            user_id=user.id,
-            check_in_date=today
-        )
-        db.add(checkin)
-        db.commit()
+    await db.run_sync(crud.record_checkin, user.id, date.today())
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data=user_token_claims(user), expires_delta=access_token_expires
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=schemas.UserResponse)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: models.User = Depends(get_current_user)):
     """Get current user information"""
     return current_user
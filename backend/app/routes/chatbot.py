@@ -1,6 +1,7 @@
 """
 Chatbot API route for YOU vs YOU.
 POST /api/chat — Send a message and get an AI-powered response.
+POST /api/chat/stream — Same, with the reply streamed as Server-Sent Events.
 
 Architecture (Advanced RAG Pipeline):
   1. User sends a question via POST /api/chat
@@ -10,39 +11,43 @@ Architecture (Advanced RAG Pipeline):
   5. A structured prompt is built with system instructions + retrieved context + user data
   6. The prompt is sent to HuggingFace Inference API (Mistral-7B)
   7. If HF API is unavailable, a comprehensive local fallback generates the response
+
+Replies are cached per user (see response_cache.py): a question similar to
+one answered before, over unchanged user data, skips steps 3-7.
 """
 
-import os
+import json
 import time
-import requests
-from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
-from ..auth import get_current_user
+from ..database import get_async_db, run_in_worker
+from ..auth import Principal, get_current_principal
 from ..rag_engine import (
-    load_knowledge_base,
     search_chunks,
     get_user_context,
     build_prompt,
     is_in_scope,
     get_out_of_scope_response,
+    detect_intents,
+    parse_date_reference,
+    embed_query_async,
 )
-from .. import models
-
-# Load .env so HF_API_TOKEN is available
-load_dotenv()
+from ..llm_client import llm_client, LLMError, LLMTimeoutError
+from ..response_cache import response_cache, CacheKey, CachedReply
 
 router = APIRouter()
 
 # ─── Config ──────────────────────────────────────────────────────
 
-HF_API_TOKEN = os.getenv("HF_API_TOKEN", "")
-HF_MODEL = os.getenv("HF_MODEL", "mistralai/Mistral-7B-Instruct-v0.3")
-HF_API_URL = f"https://api-inference.huggingface.co/models/{HF_MODEL}"
-
 # Simple rate limiting
 _rate_limit: dict = {}  # user_id -> last_request_time
 RATE_LIMIT_SECONDS = 2
@@ -59,25 +64,10 @@ class ChatResponse(BaseModel):
     sources: list[str] = []
 
 
-# ─── Startup ─────────────────────────────────────────────────────
-
-# Pre-load knowledge base on module import
-load_knowledge_base()
-
-
-# ─── Endpoint ────────────────────────────────────────────────────
-
-@router.post("/", response_model=ChatResponse)
-async def chat(
-    request: ChatRequest,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
-):
-    """Send a message to the AI chatbot and get a personalized response."""
-
-    user_id = current_user.id
-    username = current_user.username
+# ─── Endpoints ───────────────────────────────────────────────────
 
+def _validate_message(user_id: int, raw_message: str) -> str:
+    """Apply the per-user rate limit and message checks; returns the trimmed message"""
     # Rate limiting
     now = time.time()
     last_req = _rate_limit.get(user_id, 0)
@@ -88,7 +78,7 @@ async def chat(
         )
     _rate_limit[user_id] = now
 
-    message = request.message.strip()
+    message = raw_message.strip()
     if not message:
         raise HTTPException(status_code=400, detail="Message cannot be empty.")
 
@@ -96,31 +86,67 @@ async def chat(
         raise HTTPException(
             status_code=400, detail="Message too long. Please keep it under 1000 characters."
         )
+    return message
+
+
+async def _build_augmented_prompt(db: AsyncSession, message: str, current_user: Principal) -> Tuple[str, List[str]]:
+    """Retrieve guide chunks and user data and compose the prompt; returns (prompt, sources)"""
+    # ── FAISS vector search on knowledge base ──
+    guide_chunks = await run_in_threadpool(search_chunks, message, top_k=5)
+
+    # ── Get user context from database (NEVER includes passwords) ──
+    user_context = await run_in_worker(get_user_context, current_user.id, message)
+
+    # ── Build augmented prompt ──
+    prompt = build_prompt(message, guide_chunks, user_context, current_user.username)
+
+    # ── Determine sources used ──
+    sources = []
+    if guide_chunks:
+        sources.append("guide")
+    if any(user_context.get("data", {}).get(k) for k in ["habits", "journal", "expenses", "skills", "checkins"]):
+        sources.append("user_data")
+
+    return prompt, sources
+
+
+def _cached_reply(user_id: int, message: str, query_vector: Optional[np.ndarray]) -> Tuple[CacheKey, Optional[CachedReply]]:
+    """Cache key for a question, plus the cached reply if there is one"""
+    # Intents and the month reference decide which user data the prompt includes
+    key = response_cache.key_for(user_id, detect_intents(message), parse_date_reference(message))
+    return key, response_cache.get(key, message, query_vector)
+
+
+@router.post("/", response_model=ChatResponse)
+async def chat(
+    request: ChatRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Send a message to the AI chatbot and get a personalized response."""
+
+    message = _validate_message(current_user.id, request.message)
 
     try:
         # ── Step 1: Scope Guard — reject out-of-boundary questions ──
+        # Embed once, batched with concurrent requests; the scope guard, the
+        # reply cache and retrieval all reuse this vector from the embedding cache
+        query_vector = await embed_query_async(message)
         allowed, confidence = is_in_scope(message)
         if not allowed:
             return ChatResponse(reply=get_out_of_scope_response(), sources=["guardrail"])
 
-        # ── Step 2: FAISS vector search on knowledge base ──
-        guide_chunks = search_chunks(message, top_k=5)
-
-        # ── Step 3: Get user context from database (NEVER includes passwords) ──
-        user_context = get_user_context(db, user_id, message)
-
-        # ── Step 4: Build augmented prompt ──
-        prompt = build_prompt(message, guide_chunks, user_context, username)
+        cache_key, cached = _cached_reply(current_user.id, message, query_vector)
+        if cached:
+            return ChatResponse(reply=cached.reply, sources=cached.sources)
 
-        # ── Step 5: Determine sources used ──
-        sources = []
-        if guide_chunks:
-            sources.append("guide")
-        if any(user_context.get("data", {}).get(k) for k in ["habits", "journal", "expenses", "skills", "checkins"]):
-            sources.append("user_data")
+        # ── Steps 2-5: Retrieval, user data, prompt and sources ──
+        prompt, sources = await _build_augmented_prompt(db, message, current_user)
 
         # ── Step 6: Call HuggingFace Inference API ──
-        reply = await _call_hf_api(prompt)
+        reply, cacheable = await _call_hf_api(prompt)
+        if cacheable:
+            response_cache.put(cache_key, message, query_vector, reply, sources)
 
         return ChatResponse(reply=reply, sources=sources)
 
@@ -134,18 +160,119 @@ async def chat(
         )
 
 
-async def _call_hf_api(prompt: str) -> str:
-    """Call HuggingFace Inference API with the composed prompt."""
+@router.post("/stream")
+async def chat_stream(
+    request: ChatRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """
+    Streaming variant of POST /api/chat as Server-Sent Events:
+    one `sources` event, `token` events as text is generated, then `done`
+    with the full reply. Disconnecting stops the upstream generation.
+    """
 
-    if not HF_API_TOKEN:
-        return _fallback_response(prompt)
+    message = _validate_message(current_user.id, request.message)
+
+    try:
+        # Embed once, batched with concurrent requests; the scope guard, the
+        # reply cache and retrieval all reuse this vector from the embedding cache
+        query_vector = await embed_query_async(message)
+        allowed, confidence = is_in_scope(message)
+        if not allowed:
+            return _event_stream(_stream_text(["guardrail"], get_out_of_scope_response()))
+
+        cache_key, cached = _cached_reply(current_user.id, message, query_vector)
+        if cached:
+            return _event_stream(_stream_text(cached.sources, cached.reply))
+
+        prompt, sources = await _build_augmented_prompt(db, message, current_user)
+    except Exception as e:
+        print(f"[ERROR] Chat error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Sorry, I'm having trouble processing your request right now. Please try again.",
+        )
+
+    # Release the database connection before the long-lived stream starts
+    await db.close()
+
+    def store(reply: str) -> None:
+        response_cache.put(cache_key, message, query_vector, reply, sources)
+
+    return _event_stream(_stream_reply(http_request, prompt, sources, on_complete=store))
+
+
+def _event_stream(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_text(sources: List[str], reply: str) -> AsyncIterator[str]:
+    """A reply that is already complete, as a single token"""
+    yield _sse("sources", {"sources": sources})
+    yield _sse("token", {"text": reply})
+    yield _sse("done", {"reply": reply})
 
-    headers = {
-        "Authorization": f"Bearer {HF_API_TOKEN}",
-        "Content-Type": "application/json",
-    }
 
-    payload = {
+async def _stream_reply(
+    http_request: Request,
+    prompt: str,
+    sources: List[str],
+    on_complete: Optional[Callable[[str], None]] = None,
+) -> AsyncIterator[str]:
+    """Stream a generated reply; on_complete gets it only if the model finished normally"""
+    yield _sse("sources", {"sources": sources})
+
+    if not llm_client.configured:
+        reply = _fallback_response(prompt)
+        yield _sse("token", {"text": reply})
+        yield _sse("done", {"reply": reply})
+        if on_complete:
+            on_complete(reply)
+        return
+
+    parts: List[str] = []
+    completed = False
+    try:
+        async with aclosing(llm_client.stream(_generation_payload(prompt))) as tokens:
+            async for text in tokens:
+                if await http_request.is_disconnected():
+                    print("[INFO] Chat stream client disconnected, cancelling generation")
+                    return
+                parts.append(text)
+                yield _sse("token", {"text": text})
+        completed = True
+    except LLMTimeoutError:
+        print("[ERROR] HF API timeout")
+        if not parts:
+            parts = ["I'm taking too long to think. Please try again in a moment."]
+            yield _sse("token", {"text": parts[0]})
+    except LLMError as e:
+        print(f"[ERROR] HF API stream failed: {e}")
+        if not parts:
+            # Nothing shown yet: answer from the local fallback instead
+            parts = [_fallback_response(prompt)]
+            yield _sse("token", {"text": parts[0]})
+        else:
+            yield _sse("error", {"detail": "The response was interrupted. Please try again."})
+
+    reply = _clean_reply("".join(parts))
+    yield _sse("done", {"reply": reply or "I'm not sure how to answer that. Could you rephrase your question?"})
+    if completed and reply and on_complete:
+        on_complete(reply)
+
+
+def _generation_payload(prompt: str) -> dict:
+    return {
         "inputs": prompt,
         "parameters": {
             "max_new_tokens": 512,
@@ -156,45 +283,49 @@ async def _call_hf_api(prompt: str) -> str:
         },
     }
 
-    try:
-        response = requests.post(HF_API_URL, headers=headers, json=payload, timeout=60)
-
-        if response.status_code == 503:
-            # Model loading — retry once after delay
-            data = response.json()
-            wait_time = min(data.get("estimated_time", 20), 30)
-            print(f"[WAIT] Model loading, waiting {wait_time}s...")
-            time.sleep(wait_time)
-            response = requests.post(HF_API_URL, headers=headers, json=payload, timeout=60)
-
-        if response.status_code != 200:
-            print(f"[ERROR] HF API error {response.status_code}: {response.text}")
-            return _fallback_response(prompt)
-
-        result = response.json()
-
-        if isinstance(result, list) and len(result) > 0:
-            text = result[0].get("generated_text", "").strip()
-        elif isinstance(result, dict):
-            text = result.get("generated_text", "").strip()
-        else:
-            text = str(result).strip()
 
-        # Clean up the response
-        # Remove any remaining instruction tags
-        text = text.replace("[/INST]", "").replace("[INST]", "").replace("<s>", "").replace("</s>", "").strip()
+def _clean_reply(text: str) -> str:
+    # Remove any remaining instruction tags
+    return text.replace("[/INST]", "").replace("[INST]", "").replace("<s>", "").replace("</s>", "").strip()
 
-        if not text:
-            return "I'm not sure how to answer that. Could you rephrase your question?"
 
-        return text
+async def _call_hf_api(prompt: str) -> Tuple[str, bool]:
+    """
+    Call HuggingFace Inference API with the composed prompt.
+    Returns the reply and whether it may be cached (not a stand-in for a failed call).
+    """
+
+    if not llm_client.configured:
+        return _fallback_response(prompt), True
 
-    except requests.exceptions.Timeout:
+    try:
+        text = await llm_client.generate(_generation_payload(prompt), parse=_generated_text)
+    except LLMTimeoutError:
         print("[ERROR] HF API timeout")
-        return "I'm taking too long to think. Please try again in a moment."
-    except Exception as e:
+        return "I'm taking too long to think. Please try again in a moment.", False
+    except LLMError as e:
         print(f"[ERROR] HF API call failed: {e}")
-        return _fallback_response(prompt)
+        return _fallback_response(prompt), False
+
+    # Clean up the response
+    text = _clean_reply(text)
+
+    if not text:
+        return "I'm not sure how to answer that. Could you rephrase your question?", False
+
+    return text, True
+
+
+def _generated_text(result: object) -> str:
+    """The generated text from an Inference API response: [{"generated_text": ...}] or {"generated_text": ...}"""
+    if isinstance(result, list) and result:
+        result = result[0]
+    if not isinstance(result, dict):
+        raise LLMError(f"unexpected HF API response: {str(result)[:200]}")
+    text = result.get("generated_text", "")
+    if not isinstance(text, str):
+        raise LLMError(f"unexpected generated_text type: {type(text).__name__}")
+    return text.strip()
 
 
 def _fallback_response(prompt: str) -> str:
@@ -1,10 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date
 from typing import Optional
-from .. import crud, schemas, models
-from ..database import get_db
-from ..auth import get_current_user
+from .. import crud, schemas, rollups
+from ..database import get_async_db, run_in_worker
+from ..auth import Principal, get_current_principal
 
 router = APIRouter()
 
@@ -17,19 +17,20 @@ def _resolve_month_year(month: Optional[int], year: Optional[int]) -> tuple[int,
 
 
 @router.get("/summary", response_model=schemas.ExpenseSummary)
-def get_monthly_expenses(
+async def get_monthly_expenses(
     month: Optional[int] = None,
     year: Optional[int] = None,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Return expenses, budget, and totals for the requested month."""
     resolved_month, resolved_year = _resolve_month_year(month, year)
 
-    expenses = crud.get_expenses_for_month(db, current_user.id, resolved_month, resolved_year)
-    budget = crud.get_monthly_budget(db, current_user.id, resolved_month, resolved_year)
+    expenses = await db.run_sync(crud.get_expenses_for_month, current_user.id, resolved_month, resolved_year)
+    budget = await db.run_sync(crud.get_monthly_budget, current_user.id, resolved_month, resolved_year)
 
-    total_spent = sum(exp.amount for exp in expenses)
+    month_start, month_end = rollups.month_range(resolved_month, resolved_year)
+    total_spent = await run_in_worker(rollups.total_spent, current_user.id, month_start, month_end)
     budget_amount = budget.amount if budget else 0.0
     saved = max(budget_amount - total_spent, 0)
 
@@ -46,18 +47,18 @@ def get_monthly_expenses(
 
 
 @router.post("/today", response_model=schemas.ExpenseResponse, status_code=status.HTTP_201_CREATED)
-def save_today_expense(
+async def save_today_expense(
     expense: schemas.ExpenseCreate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new expense entry for today. Allows multiple entries per day."""
     today = date.today()
     if expense.date != today:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You can only save today's expense.")
 
-    saved = crud.create_expense(
-        db,
+    saved = await db.run_sync(
+        crud.create_expense,
         user_id=current_user.id,
         expense_date=today,
         amount=expense.amount,
@@ -67,18 +68,15 @@ def save_today_expense(
 
 
 @router.put("/expense/{expense_id}", response_model=schemas.ExpenseResponse)
-def update_expense(
+async def update_expense(
     expense_id: int,
     expense: schemas.ExpenseUpdate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update an existing expense (only today's expenses can be edited)."""
     # First, verify the expense exists and belongs to the user
-    existing = db.query(models.Expense).filter(
-        models.Expense.id == expense_id,
-        models.Expense.user_id == current_user.id
-    ).first()
+    existing = await db.run_sync(crud.get_expense, expense_id, current_user.id)
     
     if not existing:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Expense not found.")
@@ -88,8 +86,8 @@ def update_expense(
     if existing.date != today:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You can only edit today's expenses.")
     
-    updated = crud.update_expense(
-        db,
+    updated = await db.run_sync(
+        crud.update_expense,
         expense_id=expense_id,
         user_id=current_user.id,
         amount=expense.amount,
@@ -103,17 +101,14 @@ def update_expense(
 
 
 @router.delete("/expense/{expense_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_expense(
+async def delete_expense(
     expense_id: int,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete an expense (only today's expenses can be deleted)."""
     # First, verify the expense exists and belongs to the user
-    existing = db.query(models.Expense).filter(
-        models.Expense.id == expense_id,
-        models.Expense.user_id == current_user.id
-    ).first()
+    existing = await db.run_sync(crud.get_expense, expense_id, current_user.id)
     
     if not existing:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Expense not found.")
@@ -123,7 +118,7 @@ def delete_expense(
     if existing.date != today:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You can only delete today's expenses.")
     
-    success = crud.delete_expense(db, expense_id, current_user.id)
+    success = await db.run_sync(crud.delete_expense, expense_id, current_user.id)
     
     if not success:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Expense not found.")
@@ -132,14 +127,14 @@ def delete_expense(
 
 
 @router.put("/budget", response_model=schemas.BudgetResponse)
-def upsert_budget(
+async def upsert_budget(
     payload: schemas.BudgetUpdate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create or update monthly budget for the user."""
-    budget = crud.upsert_monthly_budget(
-        db,
+    budget = await db.run_sync(
+        crud.upsert_monthly_budget,
         user_id=current_user.id,
         month=payload.month,
         year=payload.year,
@@ -149,14 +144,14 @@ def upsert_budget(
 
 
 @router.put("/daily-budget", response_model=schemas.DailyBudgetResponse)
-def upsert_daily_budget(
+async def upsert_daily_budget(
     payload: schemas.DailyBudgetCreate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create or update daily budget for the user."""
-    budget = crud.upsert_daily_budget(
-        db,
+    budget = await db.run_sync(
+        crud.upsert_daily_budget,
         user_id=current_user.id,
         budget_date=payload.date,
         amount=payload.amount,
@@ -165,11 +160,11 @@ def upsert_daily_budget(
 
 
 @router.get("/daily-budget", response_model=Optional[schemas.DailyBudgetResponse])
-def get_daily_budget(
+async def get_daily_budget(
     budget_date: date,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get daily budget for a specific date."""
-    budget = crud.get_daily_budget(db, current_user.id, budget_date)
+    budget = await db.run_sync(crud.get_daily_budget, current_user.id, budget_date)
     return budget
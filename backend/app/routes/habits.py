@@ -1,155 +1,121 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+from typing import Dict, List, Optional
 from .. import crud, schemas, models
-from ..database import get_db
-from ..auth import get_current_user
+from ..database import get_async_db, run_in_worker
+from ..auth import Principal, get_current_principal
 
 router = APIRouter()
 
 
+def _habit_response(habit: models.Habit, stats: Dict[str, float]) -> schemas.HabitResponse:
+    """Combine a habit row with its precomputed statistics"""
+    habit_dict = {
+        "id": habit.id,
+        "user_id": habit.user_id,
+        "name": habit.name,
+        "description": habit.description,
+        "color": habit.color,
+        "icon": habit.icon,
+        "target_days": habit.target_days,
+        "is_active": habit.is_active,
+        "created_at": habit.created_at,
+        **stats
+    }
+    return schemas.HabitResponse(**habit_dict)
+
+
 @router.get("/", response_model=List[schemas.HabitResponse])
-def get_habits(
+async def get_habits(
     skip: int = 0,
     limit: int = 100,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all habits for the current user"""
-    habits = crud.get_user_habits(db, user_id=current_user.id, skip=skip, limit=limit)
-    
-    # Enrich habits with statistics
-    enriched_habits = []
-    for habit in habits:
-        current_streak, longest_streak = crud.calculate_streak(db, habit.id)
-        completion_rate = crud.calculate_completion_rate(db, habit.id, days=30)
-        total_completions = crud.get_total_completions(db, habit.id)
-        
-        habit_dict = {
-            "id": habit.id,
-            "user_id": habit.user_id,
-            "name": habit.name,
-            "description": habit.description,
-            "color": habit.color,
-            "icon": habit.icon,
-            "target_days": habit.target_days,
-            "is_active": habit.is_active,
-            "created_at": habit.created_at,
-            "current_streak": current_streak,
-            "longest_streak": longest_streak,
-            "completion_rate": completion_rate,
-            "total_completions": total_completions
-        }
-        enriched_habits.append(schemas.HabitResponse(**habit_dict))
-    
-    return enriched_habits
+    habits = await db.run_sync(crud.get_user_habits, user_id=current_user.id, skip=skip, limit=limit)
+    stats = await run_in_worker(crud.get_habit_stats, [habit.id for habit in habits], days=30)
+    return [_habit_response(habit, stats[habit.id]) for habit in habits]
+
+
+@router.get("/status", response_model=List[schemas.HabitStatusResponse])
+async def get_habits_status(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get every active habit with its statistics and its logs for a date range (defaults to today)"""
+    start_date = start_date or date.today()
+    end_date = end_date or start_date
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+
+    habits = [habit for habit in await db.run_sync(crud.get_user_habits, user_id=current_user.id) if habit.is_active]
+    habit_ids = [habit.id for habit in habits]
+    stats = await run_in_worker(crud.get_habit_stats, habit_ids, days=30)
+    logs = await db.run_sync(crud.get_logs_for_habits, habit_ids, start_date, end_date)
+
+    return [
+        schemas.HabitStatusResponse(
+            **_habit_response(habit, stats[habit.id]).model_dump(),
+            logs=[schemas.HabitLogResponse.model_validate(log) for log in logs[habit.id]]
+        )
+        for habit in habits
+    ]
 
 
 @router.get("/{habit_id}", response_model=schemas.HabitResponse)
-def get_habit(
+async def get_habit(
     habit_id: int,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific habit by ID"""
-    habit = crud.get_habit(db, habit_id=habit_id, user_id=current_user.id)
+    habit = await db.run_sync(crud.get_habit, habit_id=habit_id, user_id=current_user.id)
     if not habit:
         raise HTTPException(status_code=404, detail="Habit not found")
     
-    current_streak, longest_streak = crud.calculate_streak(db, habit.id)
-    completion_rate = crud.calculate_completion_rate(db, habit.id, days=30)
-    total_completions = crud.get_total_completions(db, habit.id)
-    
-    habit_dict = {
-        "id": habit.id,
-        "user_id": habit.user_id,
-        "name": habit.name,
-        "description": habit.description,
-        "color": habit.color,
-        "icon": habit.icon,
-        "target_days": habit.target_days,
-        "is_active": habit.is_active,
-        "created_at": habit.created_at,
-        "current_streak": current_streak,
-        "longest_streak": longest_streak,
-        "completion_rate": completion_rate,
-        "total_completions": total_completions
-    }
-    
-    return schemas.HabitResponse(**habit_dict)
+    stats = await run_in_worker(crud.get_habit_stats, [habit.id], days=30)
+    return _habit_response(habit, stats[habit.id])
 
 
 @router.post("/", response_model=schemas.HabitResponse, status_code=status.HTTP_201_CREATED)
-def create_habit(
+async def create_habit(
     habit: schemas.HabitCreate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new habit"""
-    db_habit = crud.create_habit(db=db, habit=habit, user_id=current_user.id)
-    
-    habit_dict = {
-        "id": db_habit.id,
-        "user_id": db_habit.user_id,
-        "name": db_habit.name,
-        "description": db_habit.description,
-        "color": db_habit.color,
-        "icon": db_habit.icon,
-        "target_days": db_habit.target_days,
-        "is_active": db_habit.is_active,
-        "created_at": db_habit.created_at,
-        "current_streak": 0,
-        "longest_streak": 0,
-        "completion_rate": 0.0,
-        "total_completions": 0
-    }
-    
-    return schemas.HabitResponse(**habit_dict)
+    db_habit = await db.run_sync(crud.create_habit, habit=habit, user_id=current_user.id)
+    return _habit_response(db_habit, crud.empty_habit_stats())
 
 
 @router.put("/{habit_id}", response_model=schemas.HabitResponse)
-def update_habit(
+async def update_habit(
     habit_id: int,
     habit_update: schemas.HabitUpdate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a habit"""
-    db_habit = crud.update_habit(db, habit_id=habit_id, user_id=current_user.id, habit_update=habit_update)
+    db_habit = await db.run_sync(crud.update_habit, habit_id=habit_id, user_id=current_user.id, habit_update=habit_update)
     if not db_habit:
         raise HTTPException(status_code=404, detail="Habit not found")
     
-    current_streak, longest_streak = crud.calculate_streak(db, db_habit.id)
-    completion_rate = crud.calculate_completion_rate(db, db_habit.id, days=30)
-    total_completions = crud.get_total_completions(db, db_habit.id)
-    
-    habit_dict = {
-        "id": db_habit.id,
-        "user_id": db_habit.user_id,
-        "name": db_habit.name,
-        "description": db_habit.description,
-        "color": db_habit.color,
-        "icon": db_habit.icon,
-        "target_days": db_habit.target_days,
-        "is_active": db_habit.is_active,
-        "created_at": db_habit.created_at,
-        "current_streak": current_streak,
-        "longest_streak": longest_streak,
-        "completion_rate": completion_rate,
-        "total_completions": total_completions
-    }
-    
-    return schemas.HabitResponse(**habit_dict)
+    stats = await run_in_worker(crud.get_habit_stats, [db_habit.id], days=30)
+    return _habit_response(db_habit, stats[db_habit.id])
 
 
 @router.delete("/{habit_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_habit(
+async def delete_habit(
     habit_id: int,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a habit"""
-    success = crud.delete_habit(db, habit_id=habit_id, user_id=current_user.id)
+    success = await db.run_sync(crud.delete_habit, habit_id=habit_id, user_id=current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Habit not found")
     return None
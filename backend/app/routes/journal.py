@@ -1,50 +1,53 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date, datetime, timedelta
 from typing import List, Optional
 from .. import models, schemas
-from ..database import get_db
-from ..auth import get_current_user
+from ..database import get_async_db, route_to_writer
+from ..auth import Principal, get_current_principal
+from ..response_cache import response_cache
 
 router = APIRouter()
 
 
 @router.get("/entries", response_model=List[schemas.JournalEntryResponse])
-def get_journal_entries(
+async def get_journal_entries(
     entry_type: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get journal entries with optional filtering"""
-    query = db.query(models.JournalEntry).filter(
+    query = select(models.JournalEntry).where(
         models.JournalEntry.user_id == current_user.id
     )
     
     if entry_type:
-        query = query.filter(models.JournalEntry.entry_type == entry_type)
+        query = query.where(models.JournalEntry.entry_type == entry_type)
     
     if start_date:
-        query = query.filter(models.JournalEntry.date >= start_date)
+        query = query.where(models.JournalEntry.date >= start_date)
     
     if end_date:
-        query = query.filter(models.JournalEntry.date <= end_date)
+        query = query.where(models.JournalEntry.date <= end_date)
     
-    return query.order_by(models.JournalEntry.date.desc()).all()
+    result = await db.scalars(query.order_by(models.JournalEntry.date.desc()))
+    return result.all()
 
 
 @router.get("/entries/{entry_id}", response_model=schemas.JournalEntryResponse)
-def get_journal_entry(
+async def get_journal_entry(
     entry_id: int,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific journal entry"""
-    entry = db.query(models.JournalEntry).filter(
+    entry = await db.scalar(select(models.JournalEntry).where(
         models.JournalEntry.id == entry_id,
         models.JournalEntry.user_id == current_user.id
-    ).first()
+    ))
     
     if not entry:
         raise HTTPException(
@@ -56,18 +59,18 @@ def get_journal_entry(
 
 
 @router.get("/entry/{entry_type}/{entry_date}", response_model=schemas.JournalEntryResponse)
-def get_journal_entry_by_date(
+async def get_journal_entry_by_date(
     entry_type: str,
     entry_date: date,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a journal entry by type and date"""
-    entry = db.query(models.JournalEntry).filter(
+    entry = await db.scalar(select(models.JournalEntry).where(
         models.JournalEntry.user_id == current_user.id,
         models.JournalEntry.entry_type == entry_type,
         models.JournalEntry.date == entry_date
-    ).first()
+    ))
     
     if not entry:
         # Return empty entry structure
@@ -89,18 +92,19 @@ def get_journal_entry_by_date(
 
 
 @router.post("/entries", response_model=schemas.JournalEntryResponse, status_code=status.HTTP_201_CREATED)
-def create_journal_entry(
+async def create_journal_entry(
     entry: schemas.JournalEntryCreate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new journal entry"""
+    route_to_writer(db)
     # Check if entry already exists for this date and type
-    existing = db.query(models.JournalEntry).filter(
+    existing = await db.scalar(select(models.JournalEntry).where(
         models.JournalEntry.user_id == current_user.id,
         models.JournalEntry.entry_type == entry.entry_type,
         models.JournalEntry.date == entry.date
-    ).first()
+    ))
     
     if existing:
         raise HTTPException(
@@ -120,23 +124,25 @@ def create_journal_entry(
     )
     
     db.add(db_entry)
-    db.commit()
-    db.refresh(db_entry)
+    await db.commit()
+    response_cache.invalidate_user(current_user.id)
+    await db.refresh(db_entry)
     return db_entry
 
 
 @router.put("/entries/{entry_id}", response_model=schemas.JournalEntryResponse)
-def update_journal_entry(
+async def update_journal_entry(
     entry_id: int,
     entry_update: schemas.JournalEntryUpdate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a journal entry"""
-    db_entry = db.query(models.JournalEntry).filter(
+    route_to_writer(db)
+    db_entry = await db.scalar(select(models.JournalEntry).where(
         models.JournalEntry.id == entry_id,
         models.JournalEntry.user_id == current_user.id
-    ).first()
+    ))
     
     if not db_entry:
         raise HTTPException(
@@ -157,23 +163,25 @@ def update_journal_entry(
     
     setattr(db_entry, 'updated_at', datetime.utcnow())
     
-    db.commit()
-    db.refresh(db_entry)
+    await db.commit()
+    response_cache.invalidate_user(current_user.id)
+    await db.refresh(db_entry)
     return db_entry
 
 
 @router.post("/save", response_model=schemas.JournalEntryResponse)
-def save_journal_entry(
+async def save_journal_entry(
     entry: schemas.JournalEntryCreate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create or update a journal entry"""
-    existing = db.query(models.JournalEntry).filter(
+    route_to_writer(db)
+    existing = await db.scalar(select(models.JournalEntry).where(
         models.JournalEntry.user_id == current_user.id,
         models.JournalEntry.entry_type == entry.entry_type,
         models.JournalEntry.date == entry.date
-    ).first()
+    ))
     
     if existing:
         # Update existing entry
@@ -189,8 +197,9 @@ def save_journal_entry(
             setattr(existing, 'feedback', entry.feedback)
         setattr(existing, 'updated_at', datetime.utcnow())
         
-        db.commit()
-        db.refresh(existing)
+        await db.commit()
+        response_cache.invalidate_user(current_user.id)
+        await db.refresh(existing)
         return existing
     else:
         # Create new entry
@@ -206,22 +215,24 @@ def save_journal_entry(
         )
         
         db.add(db_entry)
-        db.commit()
-        db.refresh(db_entry)
+        await db.commit()
+        response_cache.invalidate_user(current_user.id)
+        await db.refresh(db_entry)
         return db_entry
 
 
 @router.delete("/entries/{entry_id}")
-def delete_journal_entry(
+async def delete_journal_entry(
     entry_id: int,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a journal entry"""
-    db_entry = db.query(models.JournalEntry).filter(
+    route_to_writer(db)
+    db_entry = await db.scalar(select(models.JournalEntry).where(
         models.JournalEntry.id == entry_id,
         models.JournalEntry.user_id == current_user.id
-    ).first()
+    ))
     
     if not db_entry:
         raise HTTPException(
@@ -229,6 +240,7 @@ def delete_journal_entry(
             detail="Journal entry not found"
         )
     
-    db.delete(db_entry)
-    db.commit()
+    await db.delete(db_entry)
+    await db.commit()
+    response_cache.invalidate_user(current_user.id)
     return {"message": "Journal entry deleted successfully"}
@@ -1,49 +1,67 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import date
-from .. import crud, schemas, models
-from ..database import get_db
-from ..auth import get_current_user
+from .. import crud, schemas
+from ..database import get_async_db
+from ..auth import Principal, get_current_principal
 
 router = APIRouter()
 
 
 @router.get("/{habit_id}/logs", response_model=List[schemas.HabitLogResponse])
-def get_habit_logs(
+async def get_habit_logs(
     habit_id: int,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all logs for a specific habit"""
-    logs = crud.get_habit_logs(db, habit_id=habit_id, user_id=current_user.id, start_date=start_date, end_date=end_date)
+    logs = await db.run_sync(crud.get_habit_logs, habit_id=habit_id, user_id=current_user.id, start_date=start_date, end_date=end_date)
     return logs
 
 
 @router.post("/{habit_id}/logs", response_model=schemas.HabitLogResponse, status_code=status.HTTP_201_CREATED)
-def toggle_habit_log(
+async def toggle_habit_log(
     habit_id: int,
     log: schemas.HabitLogCreate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Toggle habit completion for a specific date"""
-    db_log = crud.toggle_habit_log(db, habit_id=habit_id, user_id=current_user.id, log_date=log.date, notes=log.notes)
+    db_log = await db.run_sync(crud.toggle_habit_log, habit_id=habit_id, user_id=current_user.id, log_date=log.date, notes=log.notes)
     if not db_log:
         raise HTTPException(status_code=404, detail="Habit not found")
     return db_log
 
 
+@router.post("/logs/bulk", response_model=schemas.HabitLogBulkResponse)
+async def bulk_upsert_habit_logs(
+    payload: schemas.HabitLogBulkRequest,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Create or update many habit logs in one request and one transaction"""
+    results = await db.run_sync(crud.bulk_upsert_habit_logs, user_id=current_user.id, items=payload.items)
+    statuses = [result["status"] for result in results]
+    return schemas.HabitLogBulkResponse(
+        created=statuses.count("created"),
+        updated=statuses.count("updated"),
+        unchanged=statuses.count("unchanged"),
+        failed=statuses.count("not_found"),
+        results=results
+    )
+
+
 @router.delete("/logs/{log_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_habit_log(
+async def delete_habit_log(
     log_id: int,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a habit log"""
-    success = crud.delete_habit_log(db, log_id=log_id, user_id=current_user.id)
+    success = await db.run_sync(crud.delete_habit_log, log_id=log_id, user_id=current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Log not found")
     return None
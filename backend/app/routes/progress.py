@@ -1,138 +1,177 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import date, datetime, timedelta
-from typing import List
-from .. import crud, schemas, models
-from ..database import get_db
-from ..auth import get_current_user
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+from .. import crud, schemas, habit_calendar
+from ..database import get_async_db, run_in_worker
+from ..auth import Principal, get_current_principal
 
 router = APIRouter()
 
 
-@router.get("/", response_model=schemas.OverallProgress)
-def get_overall_progress(
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Get overall progress including daily, weekly, and monthly summaries"""
-    today = date.today()
-    
-    # Get user's habits
-    habits = crud.get_user_habits(db, user_id=current_user.id)
-    active_habits = [h for h in habits if getattr(h, 'is_active', True)]
-    total_habits = len(active_habits)
-    
-    # Daily progress
-    daily_logs = db.query(models.HabitLog).join(models.Habit).filter(
-        models.Habit.user_id == current_user.id,
-        models.HabitLog.date == today,
-        models.HabitLog.completed == True,
-        models.Habit.is_active == True
-    ).count()
-    
-    daily_progress = schemas.DailyProgress(
-        date=today,
+def _rate(completed: int, possible: int) -> float:
+    return round((completed / possible * 100) if possible > 0 else 0, 1)
+
+
+def _month_bounds(month: int, year: int) -> tuple[date, date]:
+    month_start = date(year, month, 1)
+    if month == 12:
+        month_end = date(year + 1, 1, 1) - timedelta(days=1)
+    else:
+        month_end = date(year, month + 1, 1) - timedelta(days=1)
+    return month_start, month_end
+
+
+def build_daily_progress(day: date, total_habits: int, counts: Dict[date, int]) -> schemas.DailyProgress:
+    completed = counts.get(day, 0)
+    return schemas.DailyProgress(
+        date=day,
         total_habits=total_habits,
-        completed_habits=daily_logs,
-        completion_rate=round((daily_logs / total_habits * 100) if total_habits > 0 else 0, 1)
+        completed_habits=completed,
+        completion_rate=_rate(completed, total_habits)
     )
-    
-    # Weekly progress
-    week_start = today - timedelta(days=today.weekday())
-    week_end = week_start + timedelta(days=6)
-    
-    daily_breakdown = []
-    for i in range(7):
-        day = week_start + timedelta(days=i)
-        day_logs = db.query(models.HabitLog).join(models.Habit).filter(
-            models.Habit.user_id == current_user.id,
-            models.HabitLog.date == day,
-            models.HabitLog.completed == True,
-            models.Habit.is_active == True
-        ).count()
-        
-        daily_breakdown.append(schemas.DailyProgress(
-            date=day,
-            total_habits=total_habits,
-            completed_habits=day_logs,
-            completion_rate=round((day_logs / total_habits * 100) if total_habits > 0 else 0, 1)
-        ))
-    
-    weekly_completions = sum(d.completed_habits for d in daily_breakdown)
-    weekly_possible = total_habits * 7
-    
-    weekly_progress = schemas.WeeklyProgress(
+
+
+def build_weekly_progress(week_start: date, week_end: date, total_habits: int, counts: Dict[date, int]) -> schemas.WeeklyProgress:
+    daily_breakdown = [
+        build_daily_progress(week_start + timedelta(days=i), total_habits, counts)
+        for i in range((week_end - week_start).days + 1)
+    ]
+    completions = sum(d.completed_habits for d in daily_breakdown)
+    possible = total_habits * len(daily_breakdown)
+
+    return schemas.WeeklyProgress(
         week_start=week_start,
         week_end=week_end,
         total_habits=total_habits,
-        total_possible_completions=weekly_possible,
-        actual_completions=weekly_completions,
-        completion_rate=round((weekly_completions / weekly_possible * 100) if weekly_possible > 0 else 0, 1),
+        total_possible_completions=possible,
+        actual_completions=completions,
+        completion_rate=_rate(completions, possible),
         daily_breakdown=daily_breakdown
     )
-    
-    # Monthly progress
-    month_start = today.replace(day=1)
-    if today.month == 12:
-        month_end = today.replace(year=today.year + 1, month=1, day=1) - timedelta(days=1)
-    else:
-        month_end = today.replace(month=today.month + 1, day=1) - timedelta(days=1)
-    
+
+
+def build_monthly_progress(month: int, year: int, total_habits: int, counts: Dict[date, int]) -> schemas.MonthlyProgress:
+    month_start, month_end = _month_bounds(month, year)
+
     weekly_breakdown = []
     current_week_start = month_start
-    
     while current_week_start <= month_end:
         current_week_end = min(current_week_start + timedelta(days=6), month_end)
-        
-        week_daily_breakdown = []
-        for i in range((current_week_end - current_week_start).days + 1):
-            day = current_week_start + timedelta(days=i)
-            day_logs = db.query(models.HabitLog).join(models.Habit).filter(
-                models.Habit.user_id == current_user.id,
-                models.HabitLog.date == day,
-                models.HabitLog.completed == True,
-                models.Habit.is_active == True
-            ).count()
-            
-            week_daily_breakdown.append(schemas.DailyProgress(
-                date=day,
-                total_habits=total_habits,
-                completed_habits=day_logs,
-                completion_rate=round((day_logs / total_habits * 100) if total_habits > 0 else 0, 1)
-            ))
-        
-        week_completions = sum(d.completed_habits for d in week_daily_breakdown)
-        week_possible = total_habits * len(week_daily_breakdown)
-        
-        weekly_breakdown.append(schemas.WeeklyProgress(
-            week_start=current_week_start,
-            week_end=current_week_end,
-            total_habits=total_habits,
-            total_possible_completions=week_possible,
-            actual_completions=week_completions,
-            completion_rate=round((week_completions / week_possible * 100) if week_possible > 0 else 0, 1),
-            daily_breakdown=week_daily_breakdown
-        ))
-        
+        weekly_breakdown.append(build_weekly_progress(current_week_start, current_week_end, total_habits, counts))
         current_week_start = current_week_end + timedelta(days=1)
-    
-    monthly_completions = sum(w.actual_completions for w in weekly_breakdown)
-    days_in_month = (month_end - month_start).days + 1
-    monthly_possible = total_habits * days_in_month
-    
-    monthly_progress = schemas.MonthlyProgress(
-        month=today.month,
-        year=today.year,
+
+    completions = sum(w.actual_completions for w in weekly_breakdown)
+    possible = total_habits * ((month_end - month_start).days + 1)
+
+    return schemas.MonthlyProgress(
+        month=month,
+        year=year,
         total_habits=total_habits,
-        total_possible_completions=monthly_possible,
-        actual_completions=monthly_completions,
-        completion_rate=round((monthly_completions / monthly_possible * 100) if monthly_possible > 0 else 0, 1),
+        total_possible_completions=possible,
+        actual_completions=completions,
+        completion_rate=_rate(completions, possible),
         weekly_breakdown=weekly_breakdown
     )
-    
+
+
+@router.get("/", response_model=schemas.OverallProgress)
+async def get_overall_progress(
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get overall progress including daily, weekly, and monthly summaries"""
+    today = date.today()
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=6)
+    month_start, month_end = _month_bounds(today.month, today.year)
+
+    # One query covers the current week and month together
+    total_habits = await db.run_sync(crud.count_active_habits, current_user.id)
+    counts = await run_in_worker(
+        crud.get_daily_completion_counts, current_user.id, min(week_start, month_start), max(week_end, month_end)
+    )
+
     return schemas.OverallProgress(
-        daily=daily_progress,
-        weekly=weekly_progress,
-        monthly=monthly_progress
+        daily=build_daily_progress(today, total_habits, counts),
+        weekly=build_weekly_progress(week_start, week_end, total_habits, counts),
+        monthly=build_monthly_progress(today.month, today.year, total_habits, counts)
+    )
+
+
+@router.get("/monthly", response_model=schemas.MonthlyProgress)
+async def get_monthly_progress(
+    month: Optional[int] = Query(None, ge=1, le=12),
+    year: Optional[int] = Query(None, ge=1, le=9999),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the progress summary for any month (defaults to the current one)"""
+    today = date.today()
+    if month is None:
+        month = today.month
+    if year is None:
+        year = today.year
+
+    month_start, month_end = _month_bounds(month, year)
+    total_habits = await db.run_sync(crud.count_active_habits, current_user.id)
+    counts = await run_in_worker(crud.get_daily_completion_counts, current_user.id, month_start, month_end)
+    return build_monthly_progress(month, year, total_habits, counts)
+
+
+@router.get("/daily", response_model=List[schemas.DailyProgress])
+async def get_daily_progress_range(
+    start_date: date,
+    end_date: date,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get per-day progress for an arbitrary date range"""
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    if (end_date - start_date).days > 366:
+        raise HTTPException(status_code=400, detail="Date range cannot exceed one year")
+
+    total_habits = await db.run_sync(crud.count_active_habits, current_user.id)
+    counts = await run_in_worker(crud.get_daily_completion_counts, current_user.id, start_date, end_date)
+    return [
+        build_daily_progress(start_date + timedelta(days=i), total_habits, counts)
+        for i in range((end_date - start_date).days + 1)
+    ]
+
+
+@router.get("/calendar", response_model=schemas.MonthlyCalendar)
+async def get_monthly_calendar(
+    month: Optional[int] = Query(None, ge=1, le=12),
+    year: Optional[int] = Query(None, ge=1, le=9999),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a Monday-first completion grid per active habit for one month"""
+    today = date.today()
+    if month is None:
+        month = today.month
+    if year is None:
+        year = today.year
+
+    habits = [h for h in await db.run_sync(crud.get_user_habits, user_id=current_user.id) if h.is_active]
+    month_start, month_end = _month_bounds(month, year)
+    # Stop at today: days that have not happened yet are -1 in the grid and not counted in the rates
+    matrix = await run_in_worker(habit_calendar.load_matrix, [h.id for h in habits], month_start, min(month_end, today))
+    grids = habit_calendar.month_grid(matrix, month_start, year, month)
+    weekday_rates = habit_calendar.weekday_rates(matrix, month_start)
+
+    return schemas.MonthlyCalendar(
+        month=month,
+        year=year,
+        habits=[
+            schemas.HabitMonthGrid(
+                habit_id=habit.id,
+                name=habit.name,
+                icon=habit.icon,
+                weeks=grids[row].tolist(),
+                weekday_rates=weekday_rates[row].tolist()
+            )
+            for row, habit in enumerate(habits)
+        ]
     )
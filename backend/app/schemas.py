@@ -86,6 +86,37 @@ class HabitLogResponse(HabitLogBase):
         from_attributes = True
 
 
+class HabitLogBulkItem(BaseModel):
+    habit_id: int
+    date: date
+    completed: bool = True
+    notes: Optional[str] = None
+
+
+class HabitLogBulkRequest(BaseModel):
+    items: List[HabitLogBulkItem] = Field(..., min_length=1, max_length=1000)
+
+
+class HabitLogBulkResult(BaseModel):
+    index: int
+    habit_id: int
+    date: date
+    status: str  # 'created', 'updated', 'unchanged' or 'not_found'
+    log_id: Optional[int] = None
+
+
+class HabitLogBulkResponse(BaseModel):
+    created: int
+    updated: int
+    unchanged: int
+    failed: int
+    results: List[HabitLogBulkResult]
+
+
+class HabitStatusResponse(HabitResponse):
+    logs: List[HabitLogResponse] = []
+
+
 # Progress schemas
 class DailyProgress(BaseModel):
     date: date
@@ -114,6 +145,20 @@ class MonthlyProgress(BaseModel):
     weekly_breakdown: List[WeeklyProgress]
 
 
+class HabitMonthGrid(BaseModel):
+    habit_id: int
+    name: str
+    icon: str
+    weeks: List[List[int]]  # Monday-first rows: 1 completed, 0 missed, -1 outside the month or not yet reached
+    weekday_rates: List[float]  # Monday..Sunday completion percentage over the month's elapsed days
+
+
+class MonthlyCalendar(BaseModel):
+    month: int
+    year: int
+    habits: List[HabitMonthGrid]
+
+
 class OverallProgress(BaseModel):
     daily: DailyProgress
     weekly: WeeklyProgress
@@ -0,0 +1,162 @@
+"""
+Startup profiling.
+─────────────────
+With STARTUP_PROFILE=1 the app package wraps __import__ as soon as it is
+imported and records how long every newly imported module took, with and
+without the imports it triggered itself (like `python -X importtime`).
+The lifespan hook adds the database warm-up and the background knowledge
+base load as phases. The report is printed as one JSON line once the
+knowledge base is ready and served at GET /health/startup.
+
+Phases are always recorded; only import timing needs the flag, since the
+wrapper slows every import down a little.
+
+    python -m app.startup_profile [--top 25]
+
+imports the app, runs its startup, and prints the same report, indented.
+"""
+
+import builtins
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+ENABLED = os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes")
+
+# Optional dependencies a worker should only import when it needs them
+HEAVY_MODULES = ("sklearn", "scipy", "faiss", "langchain", "langchain_text_splitters", "sentence_transformers", "torch")
+
+_process_started = time.perf_counter()
+_original_import = builtins.__import__
+_stack = threading.local()
+_imports: List[Tuple[str, float, float]] = []  # (module, self seconds, cumulative seconds)
+_phases: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level == 0 and not fromlist and name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    frames = getattr(_stack, "frames", None)
+    if frames is None:
+        frames = _stack.frames = []
+    before = set(sys.modules)
+    frames.append(0.0)
+    started = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - started
+        children = frames.pop()
+        if frames:
+            frames[-1] += elapsed
+        # importlib moves a module to the end of sys.modules once it has
+        # executed, so the last new entry is the one this statement imported
+        module = next((name for name in reversed(list(sys.modules)) if name not in before), None)
+        if module is not None:
+            with _lock:
+                _imports.append((module, elapsed - children, elapsed))
+
+
+def install() -> None:
+    """Start timing imports; a no-op when already installed"""
+    if builtins.__import__ is not _timed_import:
+        builtins.__import__ = _timed_import
+
+
+def uninstall() -> None:
+    if builtins.__import__ is _timed_import:
+        builtins.__import__ = _original_import
+
+
+def record_phase(name: str, seconds: float) -> None:
+    with _lock:
+        _phases[name] = seconds
+
+
+class phase:
+    """Context manager timing one startup phase"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_phase(self.name, time.perf_counter() - self._started)
+        return False
+
+
+def report(top: int = 25) -> dict:
+    with _lock:
+        imports = list(_imports)
+        phases = dict(_phases)
+
+    by_package: Dict[str, float] = defaultdict(float)
+    for module, self_seconds, _ in imports:
+        by_package[module.split(".")[0]] += self_seconds
+    slowest = sorted(imports, key=lambda record: record[1], reverse=True)[:top]
+
+    return {
+        "import_profiling": bool(imports),
+        "seconds_since_start": round(time.perf_counter() - _process_started, 3),
+        "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in phases.items()},
+        "imports": {
+            "modules": len(imports),
+            "total_ms": round(sum(record[1] for record in imports) * 1000, 1),
+            "by_package_ms": {
+                package: round(seconds * 1000, 1)
+                for package, seconds in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top]
+            },
+            "slowest": [
+                {"module": module, "self_ms": round(self_s * 1000, 1), "cumulative_ms": round(cum_s * 1000, 1)}
+                for module, self_s, cum_s in slowest
+            ],
+        },
+        "heavy_modules_loaded": sorted(name for name in HEAVY_MODULES if name in sys.modules),
+    }
+
+
+def log_report() -> None:
+    print("[STARTUP] " + json.dumps(report(), separators=(",", ":")))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Profile backend imports and startup phases")
+    parser.add_argument("--top", type=int, default=25, help="modules and packages to list")
+    args = parser.parse_args(argv)
+
+    install()
+    with phase("import_app"):
+        from .main import app
+    from . import migrations, rag_engine
+    from .database import engine
+
+    with phase("schema_check"):
+        pending = migrations.pending_migrations(engine)
+    if pending:
+        print(f"[STARTUP] {len(pending)} pending migration(s); run python manage.py migrate", file=sys.stderr)
+
+    async def start_and_stop():
+        async with app.router.lifespan_context(app):
+            await asyncio.to_thread(rag_engine.wait_until_loaded)
+
+    asyncio.run(start_and_stop())
+    uninstall()
+    print(json.dumps(report(args.top), indent=2))
+
+
+if __name__ == "__main__":
+    # Under -m this file runs as __main__; use the app.startup_profile copy the app records into
+    from app.startup_profile import main as _main
+    _main()
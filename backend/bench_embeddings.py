@@ -0,0 +1,94 @@
+"""
+Throughput benchmark for query embedding with and without micro-batching.
+
+Simulates concurrent chat requests, each embedding one distinct question,
+and reports queries per second and per-query latency:
+
+    python bench_embeddings.py [--clients 32] [--queries 20] [--window-ms 5] [--max-batch 32]
+
+Uses the configured SentenceTransformer model. On machines without it, pass
+--simulate BASE_MS,PER_TEXT_MS to stand in a model whose encode() costs a
+fixed overhead plus a per-text amount and uses the whole CPU while running.
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from app import rag_engine
+from app.embedding_batcher import EmbeddingBatcher
+
+
+def simulated_encoder(base_ms: float, per_text_ms: float) -> Callable[[List[str]], np.ndarray]:
+    cpu = threading.Lock()  # one encode at a time, like a model saturating every core
+
+    def encode(texts: List[str]) -> np.ndarray:
+        with cpu:
+            time.sleep((base_ms + per_text_ms * len(texts)) / 1000)
+        vectors = np.random.rand(len(texts), 384).astype("float32")
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    return encode
+
+
+def run(embed_one: Callable[[str], Optional[np.ndarray]], clients: int, queries: int) -> dict:
+    latencies: List[float] = []
+    lock = threading.Lock()
+
+    def client(client_id: int) -> None:
+        for i in range(queries):
+            started = time.perf_counter()
+            embed_one(f"client {client_id} question {i} about habits and streaks")
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "qps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare batched and per-request query embedding")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent requests")
+    parser.add_argument("--queries", type=int, default=20, help="questions per client")
+    parser.add_argument("--window-ms", type=float, default=rag_engine.EMBED_BATCH_WINDOW_MS)
+    parser.add_argument("--max-batch", type=int, default=rag_engine.EMBED_MAX_BATCH)
+    parser.add_argument("--simulate", metavar="BASE_MS,PER_TEXT_MS", help="use a stand-in model")
+    args = parser.parse_args()
+
+    if args.simulate:
+        base_ms, per_text_ms = (float(part) for part in args.simulate.split(","))
+        encode = simulated_encoder(base_ms, per_text_ms)
+    else:
+        if rag_engine.embed_texts(["warm up"]).size == 0:
+            raise SystemExit("No embedding model available; install sentence-transformers or pass --simulate")
+        encode = rag_engine.embed_texts
+
+    batcher = EmbeddingBatcher(encode, args.window_ms, args.max_batch)
+    single = run(lambda text: encode([text])[0], args.clients, args.queries)
+    batched = run(batcher.embed, args.clients, args.queries)
+    stats = batcher.status()
+
+    print(f"\n{args.clients} clients x {args.queries} queries, window {args.window_ms} ms, max batch {args.max_batch}\n")
+    print(f"{'mode':<10} {'qps':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for name, result in (("single", single), ("batched", batched)):
+        print(f"{name:<10} {result['qps']:>9.1f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f}")
+    print(f"\nbatches {stats['batches']}, avg size {stats['avg_batch_size']}, "
+          f"avg encode {stats['avg_encode_ms']} ms, avg queue wait {stats['avg_wait_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
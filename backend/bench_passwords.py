@@ -0,0 +1,74 @@
+"""
+Sustained login throughput of the bcrypt worker pool.
+
+Fires concurrent password verifications at a PasswordHasher for a fixed
+time, the way a burst of logins would, and reports logins per second,
+logins per second per core, latency and how many were turned away:
+
+    python bench_passwords.py [--rounds 12] [--workers 0] [--max-queue 64] [--clients 64] [--seconds 10]
+
+--workers 0 uses one thread per CPU. Compare a few --rounds values to pick
+a work factor the servers can sustain at the expected login peak.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from passlib.context import CryptContext
+
+from app import password_hasher as hasher_module
+from app.password_hasher import PasswordHasher, PasswordHasherBusy
+
+
+async def client(hasher: PasswordHasher, stored: str, deadline: float, latencies: list, rejected: list) -> None:
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            valid, _ = await hasher.verify("correct horse battery staple", stored)
+            assert valid
+            latencies.append((time.perf_counter() - started) * 1000)
+        except PasswordHasherBusy as e:
+            rejected.append(e.retry_after)
+            await asyncio.sleep(0.05)
+
+
+async def run(args: argparse.Namespace) -> None:
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=args.rounds)
+    hasher_module.pwd_context = context  # verify with the benchmarked work factor
+    hasher = PasswordHasher(workers=args.workers, max_queue=args.max_queue)
+    stored = context.hash("correct horse battery staple")
+
+    latencies: list = []
+    rejected: list = []
+    started = time.monotonic()
+    deadline = started + args.seconds
+    await asyncio.gather(*(client(hasher, stored, deadline, latencies, rejected) for _ in range(args.clients)))
+    elapsed = time.monotonic() - started
+
+    cores = min(hasher.workers, os.cpu_count() or 1)
+    latencies.sort()
+    rate = len(latencies) / elapsed
+    print(f"\nbcrypt rounds {args.rounds}, {hasher.workers} workers on {os.cpu_count()} CPUs, "
+          f"queue {args.max_queue}, {args.clients} clients, {elapsed:.1f}s\n")
+    print(f"logins/sec            {rate:.1f}")
+    print(f"logins/sec per core   {rate / cores:.1f}")
+    print(f"p50 latency ms        {statistics.median(latencies):.1f}")
+    print(f"p95 latency ms        {latencies[int(len(latencies) * 0.95) - 1]:.1f}")
+    print(f"rejected with 429     {len(rejected)}" + (f" (Retry-After up to {max(rejected)}s)" if rejected else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure sustained bcrypt login throughput")
+    parser.add_argument("--rounds", type=int, default=hasher_module.settings.BCRYPT_ROUNDS)
+    parser.add_argument("--workers", type=int, default=hasher_module.settings.PASSWORD_HASH_WORKERS)
+    parser.add_argument("--max-queue", type=int, default=hasher_module.settings.PASSWORD_HASH_MAX_QUEUE)
+    parser.add_argument("--clients", type=int, default=64, help="concurrent login attempts")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Retrieval benchmark for the chatbot knowledge base.
+
+Runs a fixed set of paraphrased questions with known relevant guide sections
+through every retrieval method and reports recall, MRR and latency:
+
+    python bench_retrieval.py [--top-k 5] [--repeat 20]
+
+"keyword" is the word-overlap loop search_chunks used before BM25. "dense"
+is skipped when faiss or sentence-transformers are not installed; "hybrid"
+then fuses TF-IDF with BM25 instead.
+"""
+
+import argparse
+import statistics
+import time
+from typing import Callable, Dict, List, Set
+
+from app import rag_engine
+
+# (question, titles of the guide sections that answer it)
+QUERIES = [
+    ("how do I keep my streak going after I miss a day", {"Page 8: Habit completion and streak use case"}),
+    ("what should I set up on day one so I don't give up", {"Page 4: First-day setup that prevents future drop-off"}),
+    ("how to write a good end of week reflection", {"Page 14: Weekly journal use case with examples", "Page 30: Weekly review playbook"}),
+    ("ideas for something new to learn this month", {"Page 18: How to choose your monthly skill", "Appendix B: Monthly skill ideas catalog"}),
+    ("how can I stop overspending and keep more money", {"Page 26: How users can save money with this app", "Appendix C: Money-saving challenge examples", "Page 42: Advanced money discipline with behavior mapping"}),
+    ("set a budget for the whole month and see what I saved", {"Page 24: Monthly budget and savings use case"}),
+    ("I typed the wrong amount for a purchase, can I fix or remove it", {"Page 25: Editing and deleting expenses responsibly"}),
+    ("what does the percentage on my habits mean", {"Page 9: Using completion rates for performance insight"}),
+    ("what to do at night to wrap up my day", {"Page 29: Evening closure routine use case"}),
+    ("plan my morning in the app", {"Page 28: Morning routine use case"}),
+    ("I'm a student with exams coming up", {"Page 32: Use case for students preparing exams"}),
+    ("workflow for freelancers and content creators", {"Page 34: Use case for creators and freelancers"}),
+    ("why does the app record that I opened it each day", {"Page 44: Using profile check-ins as identity anchor"}),
+    ("how do I create an account and sign in", {"Page 5: Registration and login use case"}),
+    ("what can I see on the home screen", {"Page 6: Dashboard as your daily command center"}),
+    ("how to design habits that actually stick", {"Page 7: Habit creation strategies that actually work", "Page 40: Advanced habit architecture"}),
+    ("questions to answer when I don't know what to write", {"Page 37: Journal prompts library for practical reflection"}),
+    ("a three month plan to change my life", {"Page 47: 90-day transformation protocol"}),
+    ("what should my first month look like", {"Page 46: 30-day starter protocol"}),
+    ("find recurring patterns in my old entries", {"Page 16: Journal Library deep use case"}),
+    ("grade myself on the skill when the month ends", {"Page 20: End-of-month skill review use case"}),
+    ("mark today's practice for my skill", {"Page 19: Daily Progress Garden use case"}),
+    ("see all the skills I worked on this year", {"Page 21: Year View use case for skill history"}),
+    ("see how my week went on the progress chart", {"Page 10: Weekly progress view use case"}),
+    ("look at the whole month of habit progress", {"Page 11: Monthly progress view use case"}),
+    ("share my progress with a friend who keeps me accountable", {"Page 45: Team or accountability partner use case"}),
+    ("what do people usually get wrong when using the app", {"Page 39: Common mistakes and corrections"}),
+    ("I want to focus on workouts and eating well", {"Page 35: Use case for health and fitness focus"}),
+    ("busy office job with lots of meetings", {"Page 33: Use case for office professionals"}),
+    ("a scorecard to rate how my month went", {"Appendix D: Review scorecard", "Page 31: Monthly reset playbook"}),
+]
+
+
+def keyword_overlap(query: str, top_k: int) -> List[Dict]:
+    """The previous keyword fallback: count shared whitespace-separated words"""
+    query_words = set(query.lower().split())
+    scored = []
+    for chunk in rag_engine._chunk_store:
+        overlap = len(query_words & set(chunk["content"].lower().split()))
+        if overlap > 0:
+            scored.append((overlap, chunk))
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [c for _, c in scored[:top_k]]
+
+
+def methods() -> Dict[str, Callable[[str, int], List[Dict]]]:
+    available = {"keyword": keyword_overlap}
+    if rag_engine._tfidf_vectorizer is not None:
+        available["tfidf"] = lambda q, k: rag_engine.search_chunks(q, k, mode="tfidf")
+    available["bm25"] = lambda q, k: rag_engine.search_chunks(q, k, mode="bm25")
+    if rag_engine._faiss_index is not None and rag_engine.embed_query("warm up") is not None:
+        available["dense"] = lambda q, k: rag_engine.search_chunks(q, k, mode="dense")
+    available["hybrid"] = lambda q, k: rag_engine.search_chunks(q, k, mode="hybrid")
+    return available
+
+
+def evaluate(search: Callable[[str, int], List[Dict]], top_k: int, repeat: int) -> Dict[str, float]:
+    recalls, reciprocal_ranks, hits, timings = [], [], 0, []
+    for query, relevant in QUERIES:
+        results = search(query, top_k)
+        titles = [r["title"] for r in results]
+        found: Set[str] = relevant & set(titles)
+        recalls.append(len(found) / len(relevant))
+        hits += bool(found)
+        first = next((rank for rank, title in enumerate(titles, 1) if title in relevant), None)
+        reciprocal_ranks.append(1 / first if first else 0.0)
+
+        for _ in range(repeat):
+            started = time.perf_counter()
+            search(query, top_k)
+            timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    return {
+        "recall": statistics.mean(recalls),
+        "hit_rate": hits / len(QUERIES),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "mean_ms": statistics.mean(timings),
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare knowledge base retrieval methods")
+    parser.add_argument("--top-k", type=int, default=rag_engine.TOP_K)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per query")
+    args = parser.parse_args()
+
+    if not rag_engine.load_knowledge_base():
+        raise SystemExit("Knowledge base could not be loaded")
+
+    print(f"\n{len(QUERIES)} queries, {len(rag_engine._chunk_store)} chunks, top-{args.top_k}\n")
+    print(f"{'method':<8} {'recall':>7} {'hit@k':>7} {'MRR':>7} {'mean ms':>9} {'p95 ms':>9}")
+    for name, search in methods().items():
+        result = evaluate(search, args.top_k, args.repeat)
+        print(
+            f"{name:<8} {result['recall']:>7.3f} {result['hit_rate']:>7.3f} {result['mrr']:>7.3f} "
+            f"{result['mean_ms']:>9.3f} {result['p95_ms']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
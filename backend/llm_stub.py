@@ -0,0 +1,84 @@
+"""
+Local stand-in for the HuggingFace Inference API, for exercising the LLM
+client's retries, concurrency limit and circuit breaker.
+
+Usage:
+    python llm_stub.py [--port 8001] [--mode ok|slow|loading|error|flaky] [--delay SECONDS]
+
+Then start the backend with HF_API_URL=http://127.0.0.1:8001/generate and
+any non-empty HF_API_TOKEN.
+
+Modes:
+    ok       answer after --delay seconds (streamed requests: one word per --delay)
+    slow     like ok, but the default delay is 90s (exceeds the client timeout)
+    loading  503 with estimated_time, like a cold HuggingFace model
+    error    500 on every call
+    flaky    503 on two of every three calls
+"""
+import argparse
+import asyncio
+import json
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="LLM stub")
+config = {"mode": "ok", "delay": 0.2, "calls": 0, "streamed_tokens": 0, "cancelled_streams": 0}
+
+
+@app.post("/generate")
+@app.post("/models/{model:path}")
+async def generate(request: Request, model: str = ""):
+    payload = await request.json()
+    config["calls"] += 1
+    call = config["calls"]
+    mode = config["mode"]
+
+    if mode == "loading" or (mode == "flaky" and call % 3 != 0):
+        return JSONResponse({"error": "Model is currently loading", "estimated_time": 2.0}, status_code=503)
+    if mode == "error":
+        return JSONResponse({"error": "Internal error"}, status_code=500)
+
+    question = payload.get("inputs", "").split("User question:")[-1].replace("[/INST]", "").strip()
+    reply = f"(stub reply #{call}) You asked: {question[:200]}"
+    if payload.get("stream"):
+        return StreamingResponse(_stream_tokens(reply), media_type="text/event-stream")
+
+    await asyncio.sleep(config["delay"])
+    return [{"generated_text": reply}]
+
+
+async def _stream_tokens(reply: str):
+    """Text Generation Inference style token events, --delay seconds apart"""
+    words = reply.split(" ")
+    sent = 0
+    try:
+        for i, word in enumerate(words):
+            await asyncio.sleep(config["delay"])
+            text = word if i == 0 else f" {word}"
+            yield f"data: {json.dumps({'token': {'id': i, 'text': text, 'special': False}})}\n\n"
+            sent += 1
+        yield f"data: {json.dumps({'token': {'id': len(words), 'text': '</s>', 'special': True}, 'generated_text': reply})}\n\n"
+    finally:
+        config["streamed_tokens"] += sent
+        if sent < len(words):
+            config["cancelled_streams"] += 1
+            print(f"[stub] client went away after {sent}/{len(words)} tokens")
+
+
+@app.get("/stats")
+def stats():
+    return config
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HuggingFace Inference API stub")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--mode", choices=["ok", "slow", "loading", "error", "flaky"], default="ok")
+    parser.add_argument("--delay", type=float, help="Seconds before answering")
+    args = parser.parse_args()
+
+    config["mode"] = args.mode
+    config["delay"] = args.delay if args.delay is not None else (90.0 if args.mode == "slow" else 0.2)
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
@@ -0,0 +1,122 @@
+"""
+Maintenance commands for the Daily Habit Tracker backend.
+
+Usage:
+    python manage.py migrate [--to VERSION] [--status]
+    python manage.py repair-streaks [--habit-id ID ...]
+    python manage.py repair-checkin-stats [--user-id ID ...]
+    python manage.py rebuild-calendars [--habit-id ID ...]
+    python manage.py rebuild-rollups [--user-id ID ...]
+    python manage.py rebuild-kb [--force]
+"""
+import argparse
+
+from app import crud, habit_calendar, migrations, models, rag_engine, rollups
+from app.database import SessionLocal, engine
+
+
+def migrate(args: argparse.Namespace) -> None:
+    """Apply pending schema migrations, or report the current version"""
+    if args.status:
+        version = migrations.current_version(engine)
+        print(f"Schema version {version} (head {migrations.HEAD_VERSION})")
+        for migration in migrations.pending_migrations(engine):
+            print(f"  pending {migration.version:04d} {migration.name}")
+        return
+
+    applied = migrations.migrate(engine, args.to or migrations.HEAD_VERSION)
+    version = migrations.current_version(engine)
+    print(f"Applied {len(applied)} migration(s); schema version {version}")
+
+
+def repair_streaks(args: argparse.Namespace) -> None:
+    """Recompute materialized habit streak state from habit_logs"""
+    migrations.migrate(engine)
+    db = SessionLocal()
+    try:
+        repaired = crud.repair_habit_streaks(db, args.habit_id or None)
+        print(f"Repaired streak state for {repaired} habit(s)")
+    finally:
+        db.close()
+
+
+def repair_checkin_stats(args: argparse.Namespace) -> None:
+    """Recompute materialized check-in streaks and monthly counts from daily_checkins"""
+    migrations.migrate(engine)
+    db = SessionLocal()
+    try:
+        repaired = crud.repair_checkin_stats(db, args.user_id or None)
+        print(f"Repaired check-in stats for {repaired} user(s)")
+    finally:
+        db.close()
+
+
+def rebuild_calendars(args: argparse.Namespace) -> None:
+    """Recompute habit completion bitmaps from habit_logs"""
+    migrations.migrate(engine)
+    db = SessionLocal()
+    try:
+        habit_ids = args.habit_id or [habit_id for (habit_id,) in db.query(models.Habit.id).all()]
+        rebuilt = habit_calendar.rebuild_calendars(db, habit_ids)
+        db.commit()
+        print(f"Rebuilt completion calendars for {len(rebuilt)} habit(s)")
+    finally:
+        db.close()
+
+
+def rebuild_rollups(args: argparse.Namespace) -> None:
+    """Recompute per-user daily rollups from the raw tables"""
+    migrations.migrate(engine)
+    db = SessionLocal()
+    try:
+        user_ids = args.user_id or [user_id for (user_id,) in db.query(models.User.id).all()]
+        days = sum(rollups.backfill_rollups(db, user_id) for user_id in user_ids)
+        db.commit()
+        print(f"Rebuilt {days} daily rollup row(s) for {len(user_ids)} user(s)")
+    finally:
+        db.close()
+
+
+def rebuild_kb(args: argparse.Namespace) -> None:
+    """Bring the chatbot knowledge-base index up to date with its sources"""
+    build_id = rag_engine.build_knowledge_index(force=args.force)
+    if not build_id:
+        raise SystemExit("Knowledge base sources not found")
+    print(f"Knowledge base index {build_id} is current ({len(rag_engine._chunk_store)} chunks)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Daily Habit Tracker maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Apply pending schema migrations")
+    migrate_parser.add_argument("--to", type=int, help="Stop at this schema version")
+    migrate_parser.add_argument("--status", action="store_true", help="Show the schema version and pending migrations")
+    migrate_parser.set_defaults(func=migrate)
+
+    repair_parser = subparsers.add_parser("repair-streaks", help="Rebuild habit streak state from logs")
+    repair_parser.add_argument("--habit-id", type=int, action="append", help="Only repair this habit (repeatable)")
+    repair_parser.set_defaults(func=repair_streaks)
+
+    checkin_parser = subparsers.add_parser("repair-checkin-stats", help="Rebuild check-in streak state from check-ins")
+    checkin_parser.add_argument("--user-id", type=int, action="append", help="Only repair this user (repeatable)")
+    checkin_parser.set_defaults(func=repair_checkin_stats)
+
+    calendar_parser = subparsers.add_parser("rebuild-calendars", help="Rebuild habit completion bitmaps from logs")
+    calendar_parser.add_argument("--habit-id", type=int, action="append", help="Only rebuild this habit (repeatable)")
+    calendar_parser.set_defaults(func=rebuild_calendars)
+
+    rollup_parser = subparsers.add_parser("rebuild-rollups", help="Rebuild per-user daily rollups")
+    rollup_parser.add_argument("--user-id", type=int, action="append", help="Only rebuild this user (repeatable)")
+    rollup_parser.set_defaults(func=rebuild_rollups)
+
+    kb_parser = subparsers.add_parser("rebuild-kb", help="Rebuild the chatbot knowledge-base index")
+    kb_parser.add_argument("--force", action="store_true", help="Re-chunk and re-embed everything")
+    kb_parser.set_defaults(func=rebuild_kb)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 import uvicorn
-from app.main import app
+from app.database import engine
+from app.migrations import migrate
 
 if __name__ == "__main__":
+    # Bring the local database up to date once, before the reloader starts workers
+    migrate(engine)
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
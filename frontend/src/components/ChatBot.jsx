@@ -23,6 +23,8 @@ const ChatBot = () => {
   const [loading, setLoading] = useState(false);
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
+  // Aborting the fetch closes the stream; the server then stops generating
+  const abortRef = useRef(null);
 
   useEffect(() => {
     if (messagesEndRef.current) {
@@ -36,37 +38,72 @@ const ChatBot = () => {
     }
   }, [isOpen]);
 
+  useEffect(() => {
+    if (!isOpen && abortRef.current) {
+      abortRef.current.abort();
+    }
+  }, [isOpen]);
+
+  useEffect(() => () => abortRef.current?.abort(), []);
+
   if (!isAuthenticated) return null;
 
-  const handleSend = async () => {
-    const msg = input.trim();
-    if (!msg || loading) return;
+  // Replace the last (streaming) bot message
+  const updateLastBot = (patch) => {
+    setMessages(prev => [...prev.slice(0, -1), { ...prev[prev.length - 1], ...patch }]);
+  };
 
-    setInput('');
-    setMessages(prev => [...prev, { type: 'user', text: msg }]);
+  const ask = async (text) => {
+    setMessages(prev => [...prev, { type: 'user', text }]);
     setLoading(true);
 
+    const controller = new AbortController();
+    abortRef.current = controller;
+    let started = false;
+    const start = (patch) => {
+      if (!started) {
+        started = true;
+        setLoading(false);
+        setMessages(prev => [...prev, { type: 'bot', text: '', ...patch }]);
+      } else {
+        updateLastBot(patch);
+      }
+    };
+
     try {
-      const response = await chatService.sendMessage(msg);
-      setMessages(prev => [
-        ...prev,
-        {
-          type: 'bot',
-          text: response.reply,
-          sources: response.sources,
-        },
-      ]);
+      const response = await chatService.streamMessage(text, {
+        signal: controller.signal,
+        onSources: (sources) => start({ sources }),
+        onToken: (_, reply) => start({ text: reply }),
+      });
+      start({ text: response.reply, sources: response.sources });
     } catch (error) {
+      if (controller.signal.aborted) return;
       const errorMsg =
         error.response?.status === 429
           ? 'Please wait a moment before sending another message.'
           : 'Sorry, something went wrong. Please try again.';
-      setMessages(prev => [...prev, { type: 'bot', text: errorMsg }]);
+      if (started && error.partialReply) {
+        updateLastBot({ text: `${error.partialReply}\n\n${errorMsg}` });
+      } else if (started) {
+        updateLastBot({ text: errorMsg });
+      } else {
+        setMessages(prev => [...prev, { type: 'bot', text: errorMsg }]);
+      }
     } finally {
+      if (abortRef.current === controller) abortRef.current = null;
       setLoading(false);
     }
   };
 
+  const handleSend = () => {
+    const msg = input.trim();
+    if (!msg || loading || abortRef.current) return;
+
+    setInput('');
+    ask(msg);
+  };
+
   const handleKeyDown = (e) => {
     if (e.key === 'Enter' && !e.shiftKey) {
       e.preventDefault();
@@ -75,19 +112,9 @@ const ChatBot = () => {
   };
 
   const handleQuickAction = (text) => {
-    setInput(text);
-    // Auto-send
-    setMessages(prev => [...prev, { type: 'user', text }]);
-    setLoading(true);
-    chatService.sendMessage(text)
-      .then(response => {
-        setMessages(prev => [...prev, { type: 'bot', text: response.reply, sources: response.sources }]);
-      })
-      .catch(() => {
-        setMessages(prev => [...prev, { type: 'bot', text: 'Sorry, something went wrong. Please try again.' }]);
-      })
-      .finally(() => setLoading(false));
+    if (loading || abortRef.current) return;
     setInput('');
+    ask(text);
   };
 
   // Format bot messages with markdown-like formatting
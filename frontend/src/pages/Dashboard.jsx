@@ -23,19 +23,14 @@ const Dashboard = () => {
   const fetchData = async () => {
     try {
       const [habitsData, progressData] = await Promise.all([
-        habitService.getHabits(),
+        habitService.getHabitsStatus(today, today),
         progressService.getOverallProgress()
       ]);
       setHabits(habitsData);
       setProgress(progressData);
 
-      const logsPromises = habitsData.map(habit =>
-        habitService.getHabitLogs(habit.id, today, today)
-          .then(logs => ({ habitId: habit.id, completed: logs.some(log => log.completed) }))
-      );
-      const logsData = await Promise.all(logsPromises);
       const logsMap = {};
-      logsData.forEach(({ habitId, completed }) => { logsMap[habitId] = completed; });
+      habitsData.forEach(habit => { logsMap[habit.id] = habit.logs.some(log => log.completed); });
       setTodayLogs(logsMap);
     } catch (error) {
       console.error('Failed to fetch data:', error);
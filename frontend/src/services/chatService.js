@@ -1,8 +1,80 @@
 import api from './api';
 
+// Split a Server-Sent Events buffer into complete events and the unfinished rest
+function parseEvents(buffer) {
+  const chunks = buffer.split('\n\n');
+  const rest = chunks.pop();
+  const events = chunks.map((chunk) => {
+    let event = 'message';
+    let data = '';
+    for (const line of chunk.split('\n')) {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data += line.slice(5).trim();
+    }
+    return { event, data: data ? JSON.parse(data) : null };
+  });
+  return { events, rest };
+}
+
 export const chatService = {
   async sendMessage(message) {
     const response = await api.post('/chat/', { message });
     return response.data;
   },
+
+  /**
+   * Stream a reply token by token. Calls onSources once, then onToken for
+   * each piece of text, and resolves with { reply, sources } when done.
+   * Errors carry `response.status` like axios errors do, so callers can
+   * treat both the same way.
+   */
+  async streamMessage(message, { onSources, onToken, signal } = {}) {
+    const token = localStorage.getItem('token');
+    const response = await fetch(`${api.defaults.baseURL}/chat/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      body: JSON.stringify({ message }),
+      signal,
+    });
+
+    if (!response.ok || !response.body) {
+      const error = new Error(`Chat stream failed with status ${response.status}`);
+      error.response = { status: response.status };
+      throw error;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let reply = '';
+    let sources = [];
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      const parsed = parseEvents(buffer);
+      buffer = parsed.rest;
+      for (const { event, data } of parsed.events) {
+        if (event === 'sources') {
+          sources = data.sources;
+          onSources?.(sources);
+        } else if (event === 'token') {
+          reply += data.text;
+          onToken?.(data.text, reply);
+        } else if (event === 'done') {
+          return { reply: data.reply, sources };
+        } else if (event === 'error') {
+          const error = new Error(data.detail || 'Chat stream interrupted');
+          error.partialReply = reply;
+          throw error;
+        }
+      }
+    }
+    return { reply, sources };
+  },
 };
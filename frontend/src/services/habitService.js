@@ -6,6 +6,15 @@ export const habitService = {
     return response.data;
   },
 
+  async getHabitsStatus(startDate, endDate) {
+    const params = {};
+    if (startDate) params.start_date = startDate;
+    if (endDate) params.end_date = endDate;
+
+    const response = await api.get('/habits/status', { params });
+    return response.data;
+  },
+
   async getHabit(habitId) {
     const response = await api.get(`/habits/${habitId}`);
     return response.data;
@@ -43,6 +52,11 @@ export const habitService = {
     return response.data;
   },
 
+  async bulkUpsertLogs(items) {
+    const response = await api.post('/habits/logs/bulk', { items });
+    return response.data;
+  },
+
   async deleteHabitLog(logId) {
     await api.delete(`/habits/logs/${logId}`);
   }
@@ -4,5 +4,22 @@ export const progressService = {
   async getOverallProgress() {
     const response = await api.get('/progress/');
     return response.data;
+  },
+
+  async getMonthlyProgress(month, year) {
+    const response = await api.get('/progress/monthly', { params: { month, year } });
+    return response.data;
+  },
+
+  async getMonthlyCalendar(month, year) {
+    const response = await api.get('/progress/calendar', { params: { month, year } });
+    return response.data;
+  },
+
+  async getDailyProgress(startDate, endDate) {
+    const response = await api.get('/progress/daily', {
+      params: { start_date: startDate, end_date: endDate }
+    });
+    return response.data;
   }
 };